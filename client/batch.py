@@ -0,0 +1,443 @@
+# batch.py
+"""
+Headless batch client: generate images for a long list of prompts.
+
+Speaks the same protocol as client.py (protocol.py) without Qt:
+
+  python batch.py prompts.txt --out data/ --in-flight 32 --connections 4
+  cat prompts.txt | python batch.py - --out data/
+
+Prompts come from a text file (one per line), a .jsonl file (each
+object's "prompt", "text", "title" or "body") or stdin ("-"). A prompt
+that appears several times is generated several times (one result per
+line), e.g. for more samples of the same structure.
+
+Flow:
+  --in-flight workers take prompts from a queue → the connection with the
+  fewest requests in flight (--connections, tagged requests with length
+  framing, pipelined in order with line framing) → reply → images written
+  to disk (on a thread) → one manifest line.
+
+Output under --out:
+  manifest.jsonl        one line per finished prompt: {"i", "prompt",
+                        "status": "ok"|"error", "files", "mime", "ms"[,
+                        "sizes" (raw pixels), "error"]}
+  images/ab/<key>-<n>.<ext>
+                        key = SHA-256 of the line number and prompt; the
+                        first two hex digits pick one of 256 directories,
+                        so no directory gets more than a few hundred files
+                        per hundred thousand images.
+
+Resume: prompts already in the manifest with status "ok" (same line
+number and text) are skipped, so an interrupted run is continued by
+running the same command again; errors are tried again. Image files are
+written under a temporary name and renamed, and the manifest line comes
+after them, so an interruption never leaves a half-written image counted
+as done.
+
+Failures: BUSY replies wait for the server's retry_after_ms and retry
+(they are not counted against --retries); a dropped connection is
+re-opened with exponential backoff and its requests are sent again (up to
+--retries times each); a request without a reply after --timeout seconds
+is cancelled and retried. An ERROR reply is final for this run.
+
+Progress (prompts and images per second, MB/s, ETA) goes to stderr every
+--progress seconds; the totals are printed at the end (--json: one line).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+from protocol import DEFAULT_MAX_FRAME, RAW_MIME, Frame, Kind, make_framer, unpack_images
+
+READ_CHUNK = 256 * 1024
+RECONNECT_MIN_S = 0.5
+RECONNECT_MAX_S = 30.0
+EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/tiff": ".tif",
+              "image/webp": ".webp", RAW_MIME: ".raw"}
+
+
+def load_prompts(path: str) -> List[str]:
+    """Prompt strings from a text or JSON-lines file, or stdin for "-"."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    prompts = []
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                obj = json.loads(line)
+                line = next((obj[k] for k in ("prompt", "text", "title", "body") if obj.get(k)), "")
+            if line:
+                prompts.append(" ".join(line.split()))  # one line on the wire
+    return prompts
+
+
+def prompt_key(index: int, prompt: str) -> str:
+    return hashlib.sha256(f"{index}\n{prompt}".encode("utf-8")).hexdigest()[:20]
+
+
+class Retry(Exception):
+    """The request should be sent again after `delay` seconds."""
+
+    def __init__(self, reason: str, delay: float = 0.0, counts: bool = True):
+        super().__init__(reason)
+        self.delay = delay
+        self.counts = counts  # False for BUSY: not held against --retries
+
+
+class Stats:
+    def __init__(self, total: int):
+        self.total = total        # prompts to do in this run
+        self.skipped = 0          # already done (resume)
+        self.ok = 0
+        self.errors = 0
+        self.images = 0
+        self.bytes = 0            # image bytes written
+        self.busy = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.latencies = []       # seconds per successful request
+        self.start = time.perf_counter()
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        done = self.ok + self.errors
+        rate = done / elapsed if elapsed else 0.0
+        eta = (self.total - done) / rate if rate else float("inf")
+        return (f"{done}/{self.total} prompts ({self.errors} errors), {self.images} images, "
+                f"{rate:.1f} prompts/s, {self.images / elapsed:.1f} img/s, "
+                f"{self.bytes / 1e6 / elapsed:.1f} MB/s, busy {self.busy}, "
+                f"retries {self.retries}, ETA {eta:.0f}s")
+
+
+class Conn:
+    """One pooled connection. request() resolves to the reply frame.
+
+    Untagged replies answer the oldest pending request; tagged ones carry
+    their request's id. When the socket drops every pending request fails
+    with ConnectionError and the next request() reconnects.
+    """
+
+    def __init__(self, host: str, port: int, framing: str, api_key: str,
+                 max_frame: int, stats: Stats):
+        self.host, self.port = host, port
+        self.framing = framing
+        self.api_key = api_key
+        self.max_frame = max_frame
+        self.stats = stats
+        self.tagged = framing == "length"
+        self.pending: Dict[int, asyncio.Future] = {}  # request id -> reply, oldest first
+        self.load = 0             # requests assigned here, including those not yet sent
+        self.next_id = 0
+        self.writer = None
+        self.failures = 0         # connect failures in a row
+        self._lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        async with self._lock:
+            while self.writer is None:
+                try:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                except OSError as e:
+                    delay = min(RECONNECT_MAX_S, RECONNECT_MIN_S * 2 ** self.failures)
+                    self.failures += 1
+                    print(f"connect {self.host}:{self.port}: {e}; retrying in {delay:.1f}s",
+                          file=sys.stderr)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+                self.failures = 0
+                self.framer = make_framer(self.framing, self.max_frame)
+                if self.api_key and self.tagged:
+                    writer.write(self.framer.encode(
+                        Kind.HELLO, json.dumps({"api_key": self.api_key}).encode("utf-8")))
+                self.writer = writer
+                self.read_task = asyncio.create_task(self.read_loop(reader, writer))
+
+    async def request(self, prompt: str, timeout: float) -> Frame:
+        await self.open()
+        request_id = self.next_id
+        self.next_id += 1
+        reply = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = reply
+        self.writer.write(self.framer.encode(Kind.TEXT, prompt.encode("utf-8"),
+                                             request_id if self.tagged else None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(reply), timeout or None)
+        except asyncio.TimeoutError:
+            if self.tagged:
+                self.pending.pop(request_id, None)
+                if self.writer is not None:
+                    self.writer.write(self.framer.encode(Kind.CANCEL, b"", request_id))
+            else:
+                # The server still answers in order: drop this connection's backlog
+                self._drop(ConnectionError("reply timed out"))
+            raise Retry(f"no reply after {timeout:g}s") from None
+
+    async def read_loop(self, reader, writer) -> None:
+        error: Exception = ConnectionError("connection closed by the server")
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                for frame in self.framer.feed(data):
+                    if frame.kind in (Kind.PONG, Kind.CHUNK):
+                        continue
+                    key = frame.id if frame.id is not None else next(iter(self.pending), None)
+                    reply = self.pending.pop(key, None)
+                    if reply is not None and not reply.done():
+                        reply.set_result(frame)
+        except Exception as e:  # framing error or socket error
+            error = ConnectionError(str(e))
+        if self.writer is writer:
+            self._drop(error)
+
+    def _drop(self, error: Exception) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.stats.reconnects += 1
+        pending, self.pending = self.pending, {}
+        for reply in pending.values():
+            if not reply.done():
+                reply.set_exception(error)
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.read_task.cancel()
+
+
+class Batch:
+    """Generates every prompt into `out`, resuming from its manifest."""
+
+    def __init__(self, out: str, host: str = "localhost", port: int = 12345,
+                 framing: str = "length", api_key: str = "", connections: int = 4,
+                 in_flight: int = 16, retries: int = 3, timeout: float = 300.0,
+                 max_frame: int = DEFAULT_MAX_FRAME, progress: float = 5.0):
+        self.out = out
+        self.in_flight = max(1, in_flight)
+        self.connections = max(1, min(connections, self.in_flight))
+        self.retries = retries
+        self.timeout = timeout
+        self.progress = progress
+        self.conn_args = (host, port, framing, api_key, max_frame)
+        self.manifest_path = os.path.join(out, "manifest.jsonl")
+        self.stats = Stats(0)
+
+    def done(self) -> Dict[int, str]:
+        """Line number -> prompt of the prompts the manifest has as "ok"."""
+        done: Dict[int, str] = {}
+        try:
+            f = open(self.manifest_path, encoding="utf-8")
+        except FileNotFoundError:
+            return done
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # cut off by an interruption
+                if rec.get("status") == "ok":
+                    done[rec["i"]] = rec["prompt"]
+                else:
+                    done.pop(rec.get("i"), None)
+        return done
+
+    async def run(self, prompts: List[str]) -> Stats:
+        os.makedirs(os.path.join(self.out, "images"), exist_ok=True)
+        done = self.done()
+        todo = [(i, p) for i, p in enumerate(prompts) if done.get(i) != p]
+        self.stats = stats = Stats(len(todo))
+        stats.skipped = len(prompts) - len(todo)
+        if stats.skipped:
+            print(f"resuming: {stats.skipped} of {len(prompts)} prompts already done",
+                  file=sys.stderr)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in todo:
+            queue.put_nowait(item)
+        self.pool = [Conn(*self.conn_args, stats) for _ in range(self.connections)]
+        self.manifest = open(self.manifest_path, "a", encoding="utf-8")
+        reporter = asyncio.create_task(self._report()) if self.progress > 0 else None
+        try:
+            await asyncio.gather(*(self._worker(queue) for _ in range(self.in_flight)))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            for conn in self.pool:
+                await conn.close()
+            self.manifest.close()
+        return stats
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            index, prompt = queue.get_nowait()
+            await self._generate(index, prompt)
+
+    async def _generate(self, index: int, prompt: str) -> None:
+        stats = self.stats
+        attempts = 0
+        while True:
+            conn = min(self.pool, key=lambda c: c.load)
+            conn.load += 1  # counted before the first await, or every worker picks the same one
+            start = time.perf_counter()
+            try:
+                frame = await conn.request(prompt, self.timeout)
+                rec = await asyncio.to_thread(self._save, index, prompt, frame)
+                break
+            except (Retry, ConnectionError) as e:
+                retry = e if isinstance(e, Retry) else Retry(str(e))
+            finally:
+                conn.load -= 1
+            if not retry.counts:
+                stats.busy += 1
+            else:
+                attempts += 1
+                stats.retries += 1
+                if attempts > self.retries:
+                    rec = {"i": index, "prompt": prompt, "status": "error",
+                           "error": f"gave up after {attempts} attempts: {retry}"}
+                    break
+            await asyncio.sleep(retry.delay)
+        if rec["status"] == "ok":
+            stats.ok += 1
+            stats.images += len(rec["files"])
+            stats.bytes += rec.pop("bytes")
+            stats.latencies.append(time.perf_counter() - start)
+            rec["ms"] = round((time.perf_counter() - start) * 1000)
+        else:
+            stats.errors += 1
+        self.manifest.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.manifest.flush()
+
+    def _save(self, index: int, prompt: str, frame: Frame) -> dict:
+        """Write one reply's images (worker thread); the manifest record for it.
+
+        Raises Retry for BUSY; the record's "bytes" is taken out by the caller.
+        """
+        if frame.kind == Kind.BUSY:
+            try:
+                retry_ms = json.loads(frame.payload).get("retry_after_ms", 1000)
+            except (ValueError, AttributeError):
+                retry_ms = 1000
+            raise Retry("server busy", retry_ms / 1000 * random.uniform(1.0, 1.5), counts=False)
+        if frame.kind == Kind.ERROR:
+            return {"i": index, "prompt": prompt, "status": "error",
+                    "error": bytes(frame.payload).decode("utf-8", errors="replace")}
+        sizes = None
+        if frame.kind == Kind.IMAGES:
+            header, images = unpack_images(frame.payload)
+            mime = header["mime"]
+            if mime == RAW_MIME:
+                sizes = [{k: f[k] for k in ("w", "h", "c") if k in f} for f in header["frames"]]
+        else:
+            try:
+                data = json.loads(frame.payload)
+                images = [base64.b64decode(b) for b in data["images_base64"]]
+                mime = data.get("mime") or "image/png"
+            except (ValueError, KeyError, TypeError):
+                text = bytes(frame.payload[:500]).decode("utf-8", errors="replace")
+                return {"i": index, "prompt": prompt, "status": "error",
+                        "error": f"reply has no images: {text}"}
+        ext = EXTENSIONS.get(mime) or mimetypes.guess_extension(mime) or ".bin"
+        key = prompt_key(index, prompt)
+        shard = os.path.join("images", key[:2])
+        os.makedirs(os.path.join(self.out, shard), exist_ok=True)
+        files, written = [], 0
+        for n, image in enumerate(images):
+            name = os.path.join(shard, f"{key}-{n}{ext}")
+            path = os.path.join(self.out, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(image)
+            os.replace(path + ".tmp", path)
+            files.append(name)
+            written += len(image)
+        rec = {"i": index, "prompt": prompt, "status": "ok", "files": files, "mime": mime,
+               "bytes": written}
+        if sizes is not None:
+            rec["sizes"] = sizes
+        return rec
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress)
+            print(self.stats.line(), file=sys.stderr)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def report(args, stats: Stats) -> None:
+    elapsed = time.perf_counter() - stats.start
+    lat = sorted(stats.latencies)
+    ms = lambda v: round(v * 1000, 1)
+    out = {
+        "prompts": stats.total, "skipped": stats.skipped, "ok": stats.ok,
+        "errors": stats.errors, "unfinished": stats.total - stats.ok - stats.errors,
+        "images": stats.images, "elapsed_s": round(elapsed, 2),
+        "prompts_per_s": round(stats.ok / elapsed, 2) if elapsed else 0.0,
+        "images_per_s": round(stats.images / elapsed, 2) if elapsed else 0.0,
+        "mb_written": round(stats.bytes / 1e6, 2),
+        "busy": stats.busy, "retries": stats.retries, "reconnects": stats.reconnects,
+        "p50_ms": ms(percentile(lat, 0.50)), "p99_ms": ms(percentile(lat, 0.99)),
+    }
+    if args.json:
+        print(json.dumps(out))
+        return
+    for k, v in out.items():
+        print(f"{k:>15}: {v}")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Generate images for many prompts, headless.")
+    p.add_argument("prompts", help='text file (one prompt per line), .jsonl, or "-" for stdin')
+    p.add_argument("--out", "-o", required=True, help="output directory (resumed if it exists)")
+    p.add_argument("--host", default=os.getenv("SERVER_HOST", "localhost"))
+    p.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "12345")))
+    p.add_argument("--framing", choices=["length", "line"],
+                   default=os.getenv("SERVER_FRAMING", "length"))
+    p.add_argument("--api-key", default=os.getenv("SERVER_API_KEY", ""),
+                   help="identify as this client (HELLO frame, length framing)")
+    p.add_argument("--connections", "-c", type=int, default=4)
+    p.add_argument("--in-flight", "-k", type=int, default=16,
+                   help="requests in flight over all connections")
+    p.add_argument("--retries", type=int, default=3,
+                   help="resends per prompt after a lost connection or timeout")
+    p.add_argument("--timeout", type=float, default=300, help="seconds per request (0 = none)")
+    p.add_argument("--max-frame-mb", type=float, default=DEFAULT_MAX_FRAME / 2**20)
+    p.add_argument("--progress", type=float, default=5, help="seconds between progress lines")
+    p.add_argument("--json", action="store_true", help="print the totals as one JSON line")
+    args = p.parse_args(argv)
+
+    prompts = load_prompts(args.prompts)
+    if not prompts:
+        p.error(f"no prompts in {args.prompts}")
+    batch = Batch(args.out, args.host, args.port, args.framing, args.api_key,
+                  args.connections, args.in_flight, args.retries, args.timeout,
+                  int(args.max_frame_mb * 2**20), args.progress)
+    try:
+        stats = asyncio.run(batch.run(prompts))
+    except KeyboardInterrupt:
+        stats = batch.stats
+        print("interrupted: run the same command again to resume", file=sys.stderr)
+    report(args, stats)
+    return 0 if stats.errors == 0 and stats.ok + stats.errors == stats.total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,43 @@
-import sys, os, json, base64
+import sys, os, json
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QTextEdit, QPushButton, QWidget,
-    QVBoxLayout, QHBoxLayout, QScrollArea, QSizePolicy, QMessageBox
+    QVBoxLayout, QHBoxLayout, QMessageBox, QCheckBox, QSplitter
 )
-    # Make sure you have QMessageBox/QScrollArea in the import if not already included
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
-from PyQt5.QtNetwork import QTcpSocket
+    # Make sure you have QMessageBox in the import if not already included
+
+from decode import THUMB_SIZE, Decoder, Source
+from gallery import GalleryModel, GalleryView
+from history import History, HistoryPanel
+from connection import Connection
+from protocol import RAW_MIME, Kind, unpack_images
 
 class MainWindow(QMainWindow):
     """
-    Sends text to a server via TCP, receives JSON with images_base64,
-    and displays the images on screen (without saving them to files).
+    Sends text to a server via TCP, receives the generated images (IMAGES
+    frames, or JSON with images_base64) and displays them on screen. With
+    the history on (the default), every image and its thumbnail is also
+    written under CLIENT_CACHE_DIR. With CLIENT_CACHE_MAX_MB=0 images only
+    go to the decoder's spool, an unlinked temp file (decode.py).
+
+    With length framing, requests are tagged with ids, so several
+    generations (e.g. one per line in batch mode) run in parallel over the
+    one socket and are shown as they finish. A new submission cancels the
+    requests of the previous one that are still running.
+
+    The connection (connection.py) is made in the background, so the
+    window comes up at once, and it is made again after a server restart
+    or a failed heartbeat; prompts still unanswered are sent again.
+
+    Images are shown in a virtualized gallery (gallery.py): each reply
+    adds tiles at once, only the tiles in view are decoded and thumbnailed
+    (on a thread pool, decode.py), and double-clicking a tile opens it at
+    full resolution. Memory doesn't grow with the number of images.
+
+    Results are kept in an on-disk history (history.py): a prompt that was
+    generated before is shown from the cache without asking the server,
+    unless "Refresh cached" is checked (or Regenerate is used in the
+    history panel), in which case the cached images are shown at once and
+    replaced if the server's new answer differs.
     """
 
     def __init__(self):
@@ -21,47 +47,79 @@ class MainWindow(QMainWindow):
         server_host = os.getenv("SERVER_HOST", "localhost")
         server_port = int(os.getenv("SERVER_PORT", "12345"))
 
-        self.socket = QTcpSocket()
-        self.socket.connectToHost(server_host, server_port)
-        self.socket.waitForConnected(3000)
-        self.socket.errorOccurred.connect(self._on_socket_error)
-        self.socket.readyRead.connect(self.on_ready_read)  # <<< New: listening for server response
-
-        # Buffer for partial messages until '\n' arrives from the server
-        self._rx_buf = b""
+        # Non-blocking connect, reconnect and heartbeats (connection.py);
+        # SERVER_FRAMING=length|line, SERVER_API_KEY sent in a HELLO (length framing)
+        self.conn = Connection(server_host, server_port, os.getenv("SERVER_FRAMING", "length"),
+                               os.getenv("SERVER_API_KEY", ""), self)
+        self.conn.frames.connect(self.on_frames)
+        self.conn.lost.connect(self._on_lost)
+        self.conn.status.connect(self._on_connection_status)
+        self._tagged = self.conn.tagged  # multiplexed requests
+        self._pending = {}  # request id -> prompt, oldest first
 
         # ----- UI -----
         self.setWindowTitle("Text → Image (display)")
         self.resize(1000, 700)
 
-        central = QWidget(self)
-        self.setCentralWidget(central)
+        central = QWidget()
         root = QVBoxLayout(central)
 
         self.label = QLabel("Type any text you want, and it will turn into a picture:")
         self.text_edit = QTextEdit()
         self.button = QPushButton("Create Image")
         self.button.clicked.connect(self.on_click)
-
-        # Scrollable display area for images
-        self.scroll = QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.images_container = QWidget()
-        self.images_layout = QHBoxLayout(self.images_container)
-        self.images_layout.setContentsMargins(8, 8, 8, 8)
-        self.images_layout.setSpacing(12)
-        self.scroll.setWidget(self.images_container)
+        self.batch = QCheckBox("One request per line")
+        self.refresh = QCheckBox("Refresh cached")
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self._cancel_pending)
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.button, stretch=1)
+        buttons.addWidget(self.batch)
+        buttons.addWidget(self.refresh)
+        buttons.addWidget(self.cancel_button)
+
+        # ----- Decoding (CLIENT_DECODE_THREADS, default one per core) -----
+        self.decoder = Decoder(int(os.getenv("CLIENT_DECODE_THREADS", "0")), THUMB_SIZE, self)
+        self.decoder.parsed.connect(self._on_parsed)
+        self.decoder.stored_all.connect(self._on_stored)
+        self._generation = 0      # bumped by _clear_images(); stale parses are dropped
+        self._shown = {}          # prompt -> Sources in the gallery, this submission
+
+        # On-disk history (CLIENT_CACHE_DIR, CLIENT_CACHE_MAX_MB, CLIENT_CACHE_SETTINGS)
+        self.history = History.from_env(f"{server_host}:{server_port}")
+        self.decoder.history = self.history
+
+        # Gallery of results: decodes visible tiles only (CLIENT_THUMB_CACHE thumbnails)
+        self.gallery = GalleryModel(self.decoder, parent=self)
+        self.gallery.error.connect(self._on_decode_failed)
+        self.view = GalleryView(self.gallery)
 
         root.addWidget(self.label)
         root.addWidget(self.text_edit, stretch=0)
-        root.addWidget(self.button, stretch=0)
-        root.addWidget(self.scroll, stretch=1)
+        root.addLayout(buttons)
+        root.addWidget(self.view, stretch=1)
 
         # Small status bar at the bottom
         self.status = QLabel("")
         self.status.setStyleSheet("color: #666;")
         root.addWidget(self.status)
 
+        if self.history is None:
+            self.refresh.hide()
+            self.setCentralWidget(central)
+        else:
+            self.history_panel = HistoryPanel(self.history)
+            self.history_panel.show_prompt.connect(self._show_history)
+            splitter = QSplitter()
+            splitter.addWidget(self.history_panel)
+            splitter.addWidget(central)
+            splitter.setStretchFactor(1, 1)
+            splitter.setSizes([240, 760])
+            self.setCentralWidget(splitter)
+
+        self.conn.open()
+
     # ---------- UI Actions ----------
 
     def on_click(self) -> None:
@@ -69,98 +127,189 @@ class MainWindow(QMainWindow):
         if not txt:
             QMessageBox.information(self, "Empty", "Please type some text 🙂")
             return
-        # Send text to server
-        self.button.setEnabled(False)
-        self.status.setText("Generating…")
+        if self.batch.isChecked():
+            prompts = [line.strip() for line in txt.splitlines() if line.strip()]
+        elif not self._tagged:
+            prompts = [" ".join(txt.splitlines())]  # one prompt per line on the wire
+        else:
+            prompts = [txt]
+
+        # Results of the previous submission are stale now
+        self._cancel_pending()
         self._clear_images()
 
-        self.socket.write(txt.encode("utf-8"))
+        # Cached prompts are shown at once; the rest (and all with "Refresh cached") are sent
+        cached = 0
+        for prompt in prompts:
+            if self._show_cached(prompt):
+                cached += 1
+                if not self.refresh.isChecked():
+                    continue
+            self._send(prompt)
+        if cached:
+            self.status.setText(f"{cached} of {len(prompts)} from history")
         self.text_edit.clear()
-
-    def _on_socket_error(self, e):
-        QMessageBox.critical(self, "Socket error", f"Socket error: {e}")
-        self.button.setEnabled(True)
-        self.status.setText("")
+        self._update_state()
+
+    def _send(self, prompt: str):
+        # Prompts are idempotent: resent if the connection drops before the reply
+        request_id = self.conn.send(Kind.TEXT, prompt.encode("utf-8"))
+        self._pending[request_id] = prompt
+
+    def _show_cached(self, prompt: str) -> bool:
+        """Show the history's result for `prompt`; False if there is none."""
+        entry = self.history.lookup(prompt) if self.history is not None else None
+        if entry is None:
+            return False
+        self._show(prompt, self.history.sources(entry))
+        return True
+
+    def _show_history(self, prompt: str, revalidate: bool):
+        """History panel: show a cached prompt, and regenerate it if asked."""
+        if not self.button.isEnabled():
+            return  # line framing: wait for the running request
+        self._cancel_pending()
+        self._clear_images()
+        if not self._show_cached(prompt) or revalidate:
+            self._send(prompt)
+        self._update_state()
+
+    def _cancel_pending(self):
+        """Drop requests whose results are no longer wanted (the server is told if tagged)."""
+        for request_id in self._pending:
+            self.conn.cancel(request_id)
+        self._pending.clear()
+        self._update_state()
+
+    def _update_state(self):
+        """Buttons and status for the requests still in flight."""
+        # Line framing answers in order with no ids: one submission at a time.
+        self.button.setEnabled(self._tagged or not self._pending)
+        self.cancel_button.setEnabled(bool(self._pending))
+        if self._pending and not self.status.text().startswith(
+                ("Server busy", "Error", "Disconnected", "Connecting")):
+            self.status.setText(f"Generating… ({len(self._pending)} running)")
+
+    def _on_connection_status(self, text):
+        self.status.setText(text)
+        self._update_state()  # connected again: back to the progress text
+
+    def _on_lost(self, request_ids):
+        """Requests that can't be resent after a reconnect."""
+        for request_id in request_ids:
+            self._pending.pop(request_id, None)
+        self._update_state()
 
     # ---------- Networking ----------
 
-    def on_ready_read(self):
+    def on_frames(self, frames):
         """
-        Reads from the socket until a newline is reached, decodes JSON,
-        and displays images.
-        The server terminates each response with '\n',
-        which indicates the end of a message.
+        Handles the complete replies the connection decoded (binary IMAGES
+        frames, or JSON with images_base64) and displays images. Every
+        reply carries the id of its request (connection.py matches
+        line-framed replies by order); replies to cancelled requests never
+        get here.
         """
-        self._rx_buf += bytes(self.socket.readAll())
-        if b"\n" not in self._rx_buf:
-            return  # Wait for full message
-
-        parts = self._rx_buf.split(b"\n")
-        complete_msgs = parts[:-1]
-        self._rx_buf = parts[-1]  # Keep remainder for next read
-
-        for raw in complete_msgs:
-            line = raw.decode("utf-8", errors="replace").strip()
-            if not line:
+        self.status.setText("")
+        for frame in frames:
+            prompt = self._pending.pop(frame.id, None)
+            if prompt is None:
+                continue  # reply to a cancelled (stale) request
+            tag = (self._generation, prompt)
+            if frame.kind == Kind.IMAGES:
+                self._display_frames(tag, frame.payload)
                 continue
-
-            if line.startswith("LLM_ERROR"):
-                self._show_error_text(line)
+            if frame.kind == Kind.TEXT:
+                # {"images_base64": [...]}: decoded and parsed on the decoder's threads
+                self.decoder.parse(tag, frame.payload)
                 continue
-
-            try:
-                data = json.loads(line)
-            except Exception as ex:
-                self._show_error_text(f"Response is not JSON:\n{line}\n\n{ex}")
+            line = frame.payload.decode("utf-8", errors="replace").strip()
+            if frame.kind == Kind.ERROR:
+                self._show_error_text(f"LLM_ERROR: {line}")
                 continue
-
-            imgs = data.get("images_base64") or []
-            if not isinstance(imgs, list) or not imgs:
-                self._show_error_text(f"No images in response:\n{data}")
+            if frame.kind == Kind.BUSY:
+                self._show_busy(line)
                 continue
 
-            self._display_images(imgs)
+        self._update_state()
 
-        self.button.setEnabled(True)
-        self.status.setText("")
+    def _show_busy(self, line: str):
+        """Server shed the request (overload): say when to retry, no modal dialog."""
+        try:
+            info = json.loads(line)
+        except Exception:
+            info = {"message": line}
+        retry_s = info.get("retry_after_ms", 0) / 1000
+        self.status.setText(f"Server busy: {info.get('message', '')} "
+                            f"- try again in {retry_s:.1f}s")
 
     # ---------- Image Display ----------
 
     def _clear_images(self):
-        while self.images_layout.count():
-            item = self.images_layout.takeAt(0)
-            w = item.widget()
-            if w is not None:
-                w.deleteLater()
-
-    def _display_images(self, b64_list):
-        for b64img in b64_list:
-            try:
-                img_bytes = base64.b64decode(b64img)
-                qimg = QImage.fromData(img_bytes)
-                if qimg.isNull():
-                    raise ValueError("QImage is null")
-
-                pm = QPixmap.fromImage(qimg)
-
-                # If the image is too wide — resize it proportionally
-                max_w = 420
-                if pm.width() > max_w:
-                    pm = pm.scaledToWidth(max_w, Qt.SmoothTransformation)
-
-                lbl = QLabel()
-                lbl.setPixmap(pm)
-                lbl.setAlignment(Qt.AlignCenter)
-                lbl.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
-                lbl.setStyleSheet("border:1px solid #ddd; padding:6px; background:#fff;")
-                self.images_layout.addWidget(lbl)
-            except Exception as ex:
-                self._show_error_text(f"Failed to decode image: {ex}")
-
-        # Add spacer at the end
-        spacer = QWidget()
-        spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        self.images_layout.addWidget(spacer)
+        self.decoder.clear()
+        self._generation += 1
+        self._shown.clear()
+        if self.history is not None:
+            self.history.pinned.clear()
+        self.gallery.clear()
+
+    def _display_frames(self, tag, payload: bytes):
+        """Show an IMAGES frame: stored straight from the received buffer."""
+        try:
+            header, views = unpack_images(payload)
+        except Exception as ex:
+            self._show_error_text(f"Bad image frame: {ex}")
+            return
+        raw = header["mime"] == RAW_MIME
+        self.decoder.store_all(tag, [Source(view, raw=info if raw else None)
+                                     for info, view in zip(header["frames"], views)])
+
+    def _on_parsed(self, tag, imgs, error):
+        if error:
+            if tag[0] == self._generation:
+                self._show_error_text(error)
+            return
+        self.decoder.store_all(tag, [Source(b64img, b64=True) for b64img in imgs])
+
+    def _on_stored(self, tag, sources, error):
+        """A reply's images are on disk: record them in the history and show them."""
+        generation, prompt = tag
+        current = generation == self._generation
+        if error:
+            if current:
+                self._show_error_text(error)
+            return
+        changed = True
+        if self.history is not None and prompt is not None \
+                and all(s.path is not None for s in sources):
+            changed = self.history.record(prompt, sources)
+            self.history_panel.reload()
+        if not current:
+            return
+        if prompt not in self._shown:
+            self._show(prompt, sources)
+        elif changed:
+            # Revalidated: the server's answer differs from the cached one
+            self._shown[prompt] = sources
+            self.gallery.clear()
+            for shown in self._shown.values():
+                self.gallery.add(shown)
+            self.status.setText("Updated from the server")
+        else:
+            self.status.setText("Cached result is up to date")
+
+    def _show(self, prompt, sources):
+        """Add a prompt's images to the gallery; they are decoded once they scroll into view."""
+        if prompt is not None:
+            self._shown[prompt] = sources
+        if self.history is not None:
+            self.history.pinned.update(History.sha(s) for s in sources if s.path is not None)
+        self.gallery.add(sources)
+        self.status.setText(f"{self.gallery.rowCount()} images")
+
+    def _on_decode_failed(self, error):
+        # Status line only: with thousands of tiles, a dialog per bad image is too much
+        self.status.setText(error)
 
     def _show_error_text(self, msg: str):
         self.status.setText("Error")
@@ -0,0 +1,205 @@
+# connection.py
+"""
+Connection manager: the client's one socket to the relay.
+
+- connect is non-blocking: the window comes up at once and requests made
+  before the connection is up are sent as soon as it is;
+- a lost connection (error, server restart, failed heartbeat) is
+  re-established with exponential backoff: RECONNECT_MIN_S doubling up to
+  CLIENT_RECONNECT_MAX_S (default 30), with jitter so that many clients
+  don't all come back at the same instant; an attempt that hasn't
+  connected after CLIENT_CONNECT_TIMEOUT seconds (default 5) is aborted;
+- heartbeat (length framing): when nothing has been received for
+  CLIENT_PING_INTERVAL seconds (default 5) a PING goes out, which the
+  server answers with a PONG straight from its socket thread, even while
+  every worker is busy. Silence for CLIENT_PING_TIMEOUT seconds (default
+  15) means the connection is half-open and it is dropped. Line framing
+  has no PING; it only gets TCP keepalive;
+- requests still unanswered when the connection drops are sent again on
+  the new one if they are idempotent (a prompt just generates again), and
+  reported through `lost` otherwise.
+
+Every request has an id, and replies come out of `frames` with the id of
+their request, in both framings: tagged frames carry it, and line-framed
+replies answer the oldest outstanding request.
+"""
+from __future__ import annotations
+import json
+import os
+import random
+import time
+from typing import Dict, NamedTuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtNetwork import QAbstractSocket, QTcpSocket
+
+from protocol import Kind, make_framer
+
+RECONNECT_MIN_S = 0.5
+
+
+class _Request(NamedTuple):
+    kind: int
+    payload: bytes
+    idempotent: bool
+    cancelled: bool = False  # line framing: reply still expected, then dropped
+
+
+class Connection(QObject):
+    """Socket with reconnect, heartbeats and resubmission of requests in flight."""
+
+    frames = pyqtSignal(list)       # complete reply frames, .id set to their request
+    lost = pyqtSignal(list)         # request ids that were in flight and can't be resent
+    status = pyqtSignal(str)        # human-readable connection state ("" when connected)
+
+    def __init__(self, host: str, port: int, framing: str = "length",
+                 api_key: str = "", parent=None):
+        super().__init__(parent)
+        self.host, self.port = host, port
+        self.framing = framing
+        self.api_key = api_key
+        self.framer = make_framer(framing)
+        self.tagged = self.framer.mode == "length"  # multiplexed requests
+        self.ping_interval = float(os.getenv("CLIENT_PING_INTERVAL", "5"))
+        self.ping_timeout = float(os.getenv("CLIENT_PING_TIMEOUT", "15"))
+        self.connect_timeout = float(os.getenv("CLIENT_CONNECT_TIMEOUT", "5"))
+        self.reconnect_max = float(os.getenv("CLIENT_RECONNECT_MAX_S", "30"))
+        self._requests: Dict[int, _Request] = {}  # unanswered, oldest first
+        self._next_id = 0
+        self._attempts = 0        # failed attempts since the server last sent anything
+        self._last_rx = 0.0       # time.monotonic() of the last byte received
+
+        self.socket = QTcpSocket(self)
+        self.socket.connected.connect(self._on_connected)
+        self.socket.readyRead.connect(self._on_ready_read)
+        self.socket.disconnected.connect(self._on_disconnected)
+        self.socket.errorOccurred.connect(self._on_error)
+
+        self._retry = QTimer(self)
+        self._retry.setSingleShot(True)
+        self._retry.timeout.connect(self.open)
+        self._connect_timer = QTimer(self)
+        self._connect_timer.setSingleShot(True)
+        self._connect_timer.timeout.connect(self._on_connect_timeout)
+        self._heartbeat = QTimer(self)
+        self._heartbeat.timeout.connect(self._beat)
+
+    @property
+    def is_connected(self) -> bool:
+        return self.socket.state() == QAbstractSocket.ConnectedState
+
+    def open(self) -> None:
+        """Start a (non-blocking) connection attempt."""
+        if self.socket.state() != QAbstractSocket.UnconnectedState:
+            return
+        self.status.emit(f"Connecting to {self.host}:{self.port}…")
+        self.socket.connectToHost(self.host, self.port)
+        self._connect_timer.start(int(self.connect_timeout * 1000))
+
+    # ---------- requests ----------
+
+    def send(self, kind: int, payload: bytes, idempotent: bool = True) -> int:
+        """Queue a request; written now if connected, else once the connection is up."""
+        request_id = self._next_id
+        self._next_id += 1
+        self._requests[request_id] = _Request(kind, payload, idempotent)
+        if self.is_connected:
+            self._write(request_id)
+        return request_id
+
+    def cancel(self, request_id: int) -> None:
+        """Give up on a request: CANCEL with tags, else its reply is dropped when it comes."""
+        request = self._requests.get(request_id)
+        if request is None:
+            return
+        if self.tagged:
+            del self._requests[request_id]
+            if self.is_connected:
+                self.socket.write(self.framer.encode(Kind.CANCEL, b"", request_id))
+        else:
+            self._requests[request_id] = request._replace(cancelled=True)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for r in self._requests.values() if not r.cancelled)
+
+    def _write(self, request_id: int) -> None:
+        request = self._requests[request_id]
+        self.socket.write(self.framer.encode(request.kind, request.payload,
+                                             request_id if self.tagged else None))
+
+    # ---------- socket ----------
+
+    def _on_connected(self):
+        self._connect_timer.stop()
+        self._last_rx = time.monotonic()
+        self.framer = make_framer(self.framing)  # nothing of the old stream carries over
+        if not self.tagged:
+            self.socket.setSocketOption(QAbstractSocket.KeepAliveOption, 1)
+            # Untagged replies answer requests in order: the cancelled ones are not resent
+            self._requests = {i: r for i, r in self._requests.items() if not r.cancelled}
+        elif self.ping_interval > 0:
+            self._heartbeat.start(int(self.ping_interval * 1000))
+        # Identify by API key (per-client limits on the server); length framing only
+        if self.api_key and self.tagged:
+            self.socket.write(self.framer.encode(
+                Kind.HELLO, json.dumps({"api_key": self.api_key}).encode("utf-8")))
+        for request_id in self._requests:
+            self._write(request_id)
+        self.status.emit("")
+
+    def _on_ready_read(self):
+        self._last_rx = time.monotonic()
+        self._attempts = 0  # the server answers: the next drop retries quickly again
+        out = []
+        for frame in self.framer.feed(self.socket.readAll().data()):
+            if frame.kind == Kind.PONG:
+                continue
+            if frame.id is None:
+                if not self._requests:
+                    continue  # nothing asked: not a reply
+                frame = frame._replace(id=next(iter(self._requests)))
+            request = self._requests.get(frame.id)
+            if request is None:
+                continue  # reply to a cancelled request
+            if frame.kind != Kind.CHUNK:
+                del self._requests[frame.id]  # final reply
+            if not request.cancelled:
+                out.append(frame)
+        if out:
+            self.frames.emit(out)
+
+    def _on_disconnected(self):
+        self._drop("connection closed by the server")
+
+    def _on_error(self, _error):
+        self._drop(self.socket.errorString())
+
+    def _on_connect_timeout(self):
+        self._drop("connect timed out")
+
+    def _beat(self):
+        idle = time.monotonic() - self._last_rx
+        if idle > self.ping_timeout:
+            self._drop(f"no reply from the server for {idle:.0f}s")
+        elif idle >= self.ping_interval and self.is_connected:
+            self.socket.write(self.framer.encode(Kind.PING, b""))
+
+    def _drop(self, reason: str):
+        """Connection lost (or never made): keep what can be resent, retry later."""
+        if self._retry.isActive():
+            return  # already handled (error + disconnected both fire)
+        delay = min(self.reconnect_max, RECONNECT_MIN_S * 2 ** self._attempts)
+        delay *= random.uniform(0.5, 1.0)
+        self._attempts += 1
+        self._retry.start(int(delay * 1000))  # before abort(), which emits disconnected
+        self._heartbeat.stop()
+        self._connect_timer.stop()
+        self.socket.abort()
+        lost = [i for i, r in self._requests.items() if not r.idempotent]
+        for request_id in lost:
+            del self._requests[request_id]
+        if lost:
+            self.lost.emit(lost)
+        waiting = f" ({self.in_flight} requests waiting)" if self.in_flight else ""
+        self.status.emit(f"Disconnected: {reason}. Reconnecting in {delay:.1f}s{waiting}")
@@ -0,0 +1,270 @@
+# decode.py
+"""
+Image decoding off the GUI thread.
+
+The Decoder runs every expensive step on a QThreadPool: JSON parsing of
+line-framed replies, base64 decoding, QImage.fromData (PNG/JPEG) or
+wrapping raw pixels, and the SmoothTransformation thumbnail. The result
+goes back to the GUI thread through a queued signal. Only the small
+thumbnail reaches the GUI thread, already converted to a format
+QPixmap.fromImage() can take without another conversion. QImage, unlike
+QPixmap, may be used from any thread.
+
+A full-resolution image lives only while its worker scales it, so at most
+CLIENT_DECODE_THREADS of them are in memory at once (default: one per
+core), however large the batch. Jobs not yet started are dropped by
+clear() when the gallery is cleared.
+
+Received images are moved out of memory into a Spool (an unlinked temp
+file) by store(), or into the history cache (history.py) when the Decoder
+has one; the Source then only holds the image's place on disk. A Source
+with a `thumb` path gets its thumbnail from that file, written the first
+time it is decoded, so cached results are not decoded again.
+Thumbnail jobs run newest-request-first and are skipped if the tile has
+scrolled away by the time a thread is free (see gallery.py).
+"""
+from __future__ import annotations
+import base64
+import itertools
+import json
+import os
+import struct
+import tempfile
+import threading
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage
+
+THUMB_SIZE = 256
+STORE_PRIORITY = 1 << 30  # spooling goes before thumbnails (newer thumbnails first)
+_THUMB_HEADER = struct.Struct("<4sIIIIII")  # magic, full w, h, thumb w, h, bytes/line, format
+_THUMB_MAGIC = b"SEMT"
+# Raw frames (RAW_MIME): channel count -> QImage format of the tightly packed rows
+_RAW_FORMATS = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_RGBA8888}
+
+
+class Source(NamedTuple):
+    """One image as received: encoded bytes, a base64 string, or raw pixels."""
+    data: object                # bytes / memoryview, or str when b64
+    b64: bool = False
+    raw: Optional[dict] = None  # {"w", "h", "c"} for image/x-raw-uint8 frames
+    span: Optional[Tuple[int, int]] = None  # (offset, length) in the Spool; data is None
+    path: Optional[str] = None              # file holding the bytes; data is None
+    thumb: Optional[str] = None             # stored thumbnail (may not exist yet)
+
+
+class Spool:
+    """Append-only temporary file holding encoded images (deleted on exit)."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self._file = tempfile.TemporaryFile(prefix="sem-gallery-", dir=directory)
+        self._lock = threading.Lock()
+        self._end = 0
+
+    def put(self, data) -> Tuple[int, int]:
+        with self._lock:
+            offset = self._end
+            self._file.seek(offset)
+            self._file.write(data)
+            self._end += len(data)
+        return offset, len(data)
+
+    def get(self, span: Tuple[int, int]) -> bytes:
+        with self._lock:
+            self._file.seek(span[0])
+            return self._file.read(span[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._file.truncate(0)
+            self._end = 0
+
+
+def decode(source: Source, spool: Optional[Spool] = None) -> QImage:
+    """Full-resolution QImage of `source` (null if it can't be decoded)."""
+    if source.span is not None:
+        data = spool.get(source.span)
+    elif source.path is not None:
+        with open(source.path, "rb") as f:
+            data = f.read()
+    else:
+        data = base64.b64decode(source.data) if source.b64 else source.data
+    if source.raw is not None:
+        info = source.raw
+        w, h, c = info["w"], info["h"], info.get("c", 1)
+        fmt = _RAW_FORMATS.get(c)
+        if fmt is None or len(data) < w * h * c:
+            return QImage()  # unsupported channel count or truncated frame
+        # Raw pixels: wrap the buffer, then copy() so the QImage owns its data
+        return QImage(data, w, h, w * c, fmt).copy()
+    return QImage.fromData(data)
+
+
+def thumbnail(img: QImage, size: int = THUMB_SIZE) -> QImage:
+    """Copy scaled down to fit a size×size tile, in a pixmap-ready format."""
+    if img.width() > size or img.height() > size:
+        img = img.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return img.convertToFormat(QImage.Format_ARGB32_Premultiplied if img.hasAlphaChannel()
+                               else QImage.Format_RGB32)
+
+
+def save_thumbnail(path: str, thumb: QImage, w: int, h: int) -> None:
+    """Write `thumb` (of a w×h image) as raw pixels, ready to load without decoding."""
+    bits = thumb.constBits()
+    bits.setsize(thumb.sizeInBytes())
+    header = _THUMB_HEADER.pack(_THUMB_MAGIC, w, h, thumb.width(), thumb.height(),
+                                thumb.bytesPerLine(), int(thumb.format()))
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(bits)
+    os.replace(tmp, path)
+
+
+def load_thumbnail(path: str) -> Optional[Tuple[QImage, int, int]]:
+    """(thumbnail, full w, full h) saved by save_thumbnail(), or None."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _THUMB_HEADER.size:
+        return None
+    magic, w, h, tw, th, bpl, fmt = _THUMB_HEADER.unpack_from(data)
+    if magic != _THUMB_MAGIC or len(data) != _THUMB_HEADER.size + bpl * th:
+        return None
+    return QImage(data[_THUMB_HEADER.size:], tw, th, bpl, QImage.Format(fmt)).copy(), w, h
+
+
+class _Job(QRunnable):
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        self.fn(*self.args)
+
+
+class Decoder(QObject):
+    """Decodes images and parses JSON replies on a thread pool."""
+
+    ready = pyqtSignal(int, QImage, int, int)  # tile, thumbnail, full width, full height
+    failed = pyqtSignal(int, str)              # tile, error
+    skipped = pyqtSignal(int)                  # tile no longer wanted when its turn came
+    full = pyqtSignal(int, QImage)             # tile, full-resolution image (or null)
+    stored = pyqtSignal(int, object)           # tile, spooled Source
+    stored_all = pyqtSignal(object, object, str)  # tag, spooled Sources (None on error), error
+    parsed = pyqtSignal(object, object, str)   # tag, list of base64 images, error
+
+    def __init__(self, threads: int = 0, thumb_size: int = THUMB_SIZE, parent=None):
+        super().__init__(parent)
+        self.thumb_size = thumb_size
+        self.spool = Spool()
+        self.history = None  # history.History: store there instead of the spool
+        self.pool = QThreadPool(self)
+        if threads > 0:
+            self.pool.setMaxThreadCount(threads)
+        self._order = itertools.count()
+
+    def decode(self, tile: int, source: Source,
+               wanted: Optional[Callable[[int], bool]] = None) -> None:
+        """Thumbnail `source` for `tile`; emits ready, failed or skipped.
+
+        Later requests run first; `wanted(tile)` is asked again (on the
+        worker) just before decoding.
+        """
+        priority = min(next(self._order), STORE_PRIORITY - 1)
+        self.pool.start(_Job(self._decode, tile, source, wanted), priority)
+
+    def decode_full(self, tile: int, source: Source) -> None:
+        """Full-resolution image of `source`; emits full (null QImage on failure)."""
+        self.pool.start(_Job(self._decode_full, tile, source), STORE_PRIORITY + 1)
+
+    def store(self, tile: int, source: Source) -> None:
+        """Move `source` into the spool; emits stored with the spooled Source."""
+        self.pool.start(_Job(self._store, tile, source), STORE_PRIORITY)
+
+    def store_all(self, tag, sources) -> None:
+        """store() every image of one reply; emits stored_all once all are on disk."""
+        self.pool.start(_Job(self._store_all, tag, sources), STORE_PRIORITY)
+
+    def parse(self, tag, payload: bytes) -> None:
+        """Parse a {"images_base64": [...]} reply; emits parsed (nothing if blank)."""
+        self.pool.start(_Job(self._parse, tag, payload))
+
+    def clear(self) -> None:
+        """Drop the jobs that haven't started and empty the spool (the tiles are gone)."""
+        self.pool.clear()
+        self.spool.clear()
+
+    # ---------- worker threads ----------
+
+    def _decode(self, tile, source, wanted):
+        if wanted is not None and not wanted(tile):
+            self.skipped.emit(tile)
+            return
+        if source.thumb is not None:
+            stored = load_thumbnail(source.thumb)
+            if stored is not None:
+                self.ready.emit(tile, *stored)
+                return
+        try:
+            img = decode(source, self.spool)
+            if img.isNull():
+                raise ValueError("QImage is null")
+            thumb = thumbnail(img, self.thumb_size)
+            if source.thumb is not None:
+                try:
+                    save_thumbnail(source.thumb, thumb, img.width(), img.height())
+                except OSError:
+                    pass  # cache directory gone or full: just not cached
+            self.ready.emit(tile, thumb, img.width(), img.height())
+        except Exception as ex:
+            self.failed.emit(tile, str(ex))
+
+    def _decode_full(self, tile, source):
+        try:
+            img = decode(source, self.spool)
+        except Exception:
+            img = QImage()
+        self.full.emit(tile, img)
+
+    def _put(self, source):
+        data = base64.b64decode(source.data) if source.b64 else source.data
+        if self.history is not None:
+            try:
+                return self.history.put(data, source.raw)
+            except OSError:
+                pass  # cache directory unusable: this image just isn't cached
+        return Source(None, raw=source.raw, span=self.spool.put(data))
+
+    def _store(self, tile, source):
+        try:
+            self.stored.emit(tile, self._put(source))
+        except Exception as ex:
+            self.failed.emit(tile, str(ex))
+
+    def _store_all(self, tag, sources):
+        try:
+            stored = [self._put(source) for source in sources]
+        except Exception as ex:
+            self.stored_all.emit(tag, None, f"Bad image data: {ex}")
+            return
+        self.stored_all.emit(tag, stored, "")
+
+    def _parse(self, tag, payload):
+        line = payload.decode("utf-8", errors="replace").strip()
+        if not line:
+            return
+        try:
+            data = json.loads(line)
+        except Exception as ex:
+            self.parsed.emit(tag, None, f"Response is not JSON:\n{line[:2000]}\n\n{ex}")
+            return
+        imgs = data.get("images_base64") if isinstance(data, dict) else None
+        if not isinstance(imgs, list) or not imgs:
+            self.parsed.emit(tag, None, f"No images in response:\n{str(data)[:2000]}")
+            return
+        self.parsed.emit(tag, imgs, "")
@@ -0,0 +1,315 @@
+# gallery.py
+"""
+Virtualized result gallery.
+
+GalleryModel has one row per received image; GalleryView (a QListView in
+icon mode with a fixed grid) asks only for the rows it paints, so layout
+and paint cost depend on the window size, not on how many images there
+are.
+
+Memory stays bounded however long the session:
+- each image is moved into the decoder's spool (an unlinked temp file) as
+  soon as it arrives; a row keeps only its offset, length and size;
+- a thumbnail is decoded (decode.py, off the GUI thread) only when its
+  tile is painted, and at most CLIENT_THUMB_CACHE thumbnail pixmaps are
+  kept (least recently painted out first; evicted tiles are decoded again
+  when they come back into view). Decodes still queued for tiles that have
+  been scrolled past are skipped;
+- the full-resolution image is decoded only for the zoom view (double-click
+  or Enter on a tile), one at a time.
+"""
+from __future__ import annotations
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QRectF, QSize, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPixmap
+from PyQt5.QtWidgets import QGraphicsPixmapItem, QGraphicsScene, QGraphicsView, QListView
+
+from decode import Decoder, Source
+
+FRAME_BUDGET_S = 0.008  # GUI time per 16 ms tick spent turning thumbnails into pixmaps
+TILE_MARGIN = 16        # grid cell = thumbnail size + margin
+PREFETCH_LINES = 1      # rows of tiles above/below the viewport still worth decoding
+
+
+class GalleryModel(QAbstractListModel):
+    """Rows of images backed by the decoder's spool, with an LRU of thumbnails."""
+
+    error = pyqtSignal(str)             # an image failed to decode
+    zoomed = pyqtSignal(int, QPixmap)   # row, full-resolution pixmap (null on failure)
+
+    def __init__(self, decoder: Decoder, cache: Optional[int] = None, parent=None):
+        super().__init__(parent)
+        self.decoder = decoder
+        self.cache = max(1, cache if cache is not None
+                         else int(os.getenv("CLIENT_THUMB_CACHE", "256")))
+        self._base = 0          # tile id of row 0; tile ids are never reused
+        self._sources = []      # per row: Source (spooled once stored)
+        self._sizes = {}        # row -> (w, h) once decoded
+        self._errors = {}       # row -> decode error
+        self._thumbs = OrderedDict()   # tile -> QPixmap, least recently painted first
+        self._requested = set()        # tiles with a decode queued or running
+        self._arrived = deque()        # (tile, QImage, w, h) waiting for the GUI
+        self._visible = None           # (first, last) tile ids worth decoding, from the view
+        self._zoom = None              # tile shown in the zoom view
+        self._placeholder = _placeholder(decoder.thumb_size)
+        self._apply_timer = QTimer(self)
+        self._apply_timer.setInterval(16)
+        self._apply_timer.timeout.connect(self._apply_thumbnails)
+        decoder.ready.connect(self._on_thumbnail)
+        decoder.failed.connect(self._on_failed)
+        decoder.skipped.connect(self._on_skipped)
+        decoder.stored.connect(self._on_stored)
+        decoder.full.connect(self._on_full)
+
+    # ---------- Qt model ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._sources)
+
+    def data(self, index, role=Qt.DisplayRole):
+        row = index.row()
+        if not index.isValid() or row >= len(self._sources):
+            return None
+        tile = self._base + row
+        if role == Qt.DecorationRole:
+            pixmap = self._thumbs.get(tile)
+            if pixmap is not None:
+                self._thumbs.move_to_end(tile)
+                return pixmap
+            if row not in self._errors and tile not in self._requested:
+                self._requested.add(tile)
+                self.decoder.decode(tile, self._sources[row], self._wanted)
+            return self._placeholder
+        if role == Qt.DisplayRole:
+            return "✕" if row in self._errors else None
+        if role == Qt.ToolTipRole:
+            if row in self._errors:
+                return f"#{row + 1}: {self._errors[row]}"
+            size = self._sizes.get(row)
+            return f"#{row + 1}" + (f"  {size[0]}×{size[1]}" if size else "")
+        return None
+
+    # ---------- rows ----------
+
+    def add(self, sources) -> None:
+        """Append a tile per image; images still in memory are spooled right away."""
+        if not sources:
+            return
+        first = len(self._sources)
+        self.beginInsertRows(QModelIndex(), first, first + len(sources) - 1)
+        self._sources.extend(sources)
+        self.endInsertRows()
+        for row, source in enumerate(sources, first):
+            if source.data is not None:
+                self.decoder.store(self._base + row, source)
+
+    def clear(self) -> None:
+        """Remove every tile (decodes still queued for them are skipped)."""
+        self.beginResetModel()
+        self._base += len(self._sources)
+        self._sources = []
+        self._sizes.clear()
+        self._errors.clear()
+        self._thumbs.clear()
+        self._requested.clear()
+        self._arrived.clear()
+        self._zoom = None
+        self.endResetModel()
+
+    def set_visible(self, first: int, last: int) -> None:
+        """Rows [first, last] are on screen (or about to be); others need no decoding."""
+        self._visible = (self._base + first, self._base + last)
+        # Never evict what is on screen, however small CLIENT_THUMB_CACHE is
+        self.cache = max(self.cache, 2 * (last - first + 1))
+
+    def zoom(self, row: int) -> None:
+        """Decode row `row` at full resolution; emits zoomed."""
+        if 0 <= row < len(self._sources):
+            self._zoom = self._base + row
+            self.decoder.decode_full(self._zoom, self._sources[row])
+
+    def _wanted(self, tile) -> bool:
+        # Called on a decoder thread; _visible is replaced, never mutated.
+        visible = self._visible
+        return visible is None or visible[0] <= tile <= visible[1]
+
+    def _row(self, tile) -> Optional[int]:
+        row = tile - self._base
+        return row if 0 <= row < len(self._sources) else None
+
+    # ---------- decoder signals ----------
+
+    def _on_stored(self, tile, source: Source):
+        row = self._row(tile)
+        if row is not None:
+            self._sources[row] = source  # the received buffer can go now
+
+    def _on_thumbnail(self, tile, thumb, w, h):
+        if self._row(tile) is not None:
+            self._arrived.append((tile, thumb, w, h))
+            if not self._apply_timer.isActive():
+                self._apply_timer.start()
+
+    def _apply_thumbnails(self):
+        """Turn decoded thumbnails into pixmaps, within FRAME_BUDGET_S per tick."""
+        start = time.perf_counter()
+        while self._arrived and time.perf_counter() - start < FRAME_BUDGET_S:
+            tile, thumb, w, h = self._arrived.popleft()
+            row = self._row(tile)
+            self._requested.discard(tile)
+            if row is None:
+                continue
+            self._sizes[row] = (w, h)
+            self._thumbs[tile] = QPixmap.fromImage(thumb)
+            while len(self._thumbs) > self.cache:
+                self._thumbs.popitem(last=False)
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole, Qt.ToolTipRole])
+        if not self._arrived:
+            self._apply_timer.stop()
+
+    def _on_failed(self, tile, error):
+        self._requested.discard(tile)
+        row = self._row(tile)
+        if row is None or row in self._errors:
+            return
+        self._errors[row] = error
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        self.error.emit(f"Failed to decode image #{row + 1}: {error}")
+
+    def _on_skipped(self, tile):
+        self._requested.discard(tile)
+        row = self._row(tile)
+        if row is not None:
+            # Repainted (and requested again) only if the view still shows it
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def _on_full(self, tile, img):
+        if tile == self._zoom:
+            self._zoom = None
+            self.zoomed.emit(tile - self._base, QPixmap.fromImage(img))
+
+
+class GalleryView(QListView):
+    """Icon-mode list of fixed-size tiles; tells the model which rows are in view."""
+
+    def __init__(self, model: GalleryModel, parent=None):
+        super().__init__(parent)
+        size = model.decoder.thumb_size
+        self.setViewMode(QListView.IconMode)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)  # big batches are laid out in steps
+        self.setBatchSize(200)
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(QSize(size + TILE_MARGIN, size + TILE_MARGIN + self.fontMetrics().height()))
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.setSelectionMode(QListView.SingleSelection)
+        self.setModel(model)
+        self.gallery = model
+        self.zoom_view = ZoomView(model)
+        self.activated.connect(lambda index: self.zoom_view.show_row(index.row()))
+        self.verticalScrollBar().valueChanged.connect(self._update_visible)
+        model.rowsInserted.connect(self._update_visible)
+        model.modelReset.connect(self._update_visible)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_visible()
+
+    def _update_visible(self, *_):
+        grid = self.gridSize()
+        columns = max(1, self.viewport().width() // grid.width())
+        top = self.verticalScrollBar().value() // grid.height() - PREFETCH_LINES
+        bottom = (self.verticalScrollBar().value() + self.viewport().height()) // grid.height() \
+            + PREFETCH_LINES
+        self.gallery.set_visible(max(0, top) * columns, (bottom + 1) * columns - 1)
+
+
+class ZoomView(QGraphicsView):
+    """Full-resolution viewer: wheel zooms, drag pans, double-click fits, ←/→ browse."""
+
+    def __init__(self, model: GalleryModel, parent=None):
+        super().__init__(parent)
+        self.gallery = model
+        self.row = -1
+        self.setScene(QGraphicsScene(self))
+        self.item = QGraphicsPixmapItem()
+        self.item.setTransformationMode(Qt.SmoothTransformation)
+        self.scene().addItem(self.item)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setBackgroundBrush(QColor("#222"))
+        self.resize(900, 700)
+        model.zoomed.connect(self._on_zoomed)
+        model.modelReset.connect(self.close)
+
+    def show_row(self, row: int) -> None:
+        self.row = row
+        self.setWindowTitle(f"#{row + 1} – loading…")
+        self.gallery.zoom(row)
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def _on_zoomed(self, row, pixmap):
+        if row != self.row or not self.isVisible():
+            return
+        if pixmap.isNull():
+            self.setWindowTitle(f"#{row + 1} – could not be decoded")
+            self.item.setPixmap(QPixmap())
+            return
+        self.setWindowTitle(f"#{row + 1}  {pixmap.width()}×{pixmap.height()}")
+        self.item.setPixmap(pixmap)
+        self.scene().setSceneRect(QRectF(pixmap.rect()))
+        self.fit()
+
+    def fit(self):
+        self.resetTransform()
+        if self.item.pixmap().width() > self.viewport().width() \
+                or self.item.pixmap().height() > self.viewport().height():
+            self.fitInView(self.item, Qt.KeepAspectRatio)
+
+    def wheelEvent(self, event):
+        factor = 1.25 if event.angleDelta().y() > 0 else 0.8
+        self.scale(factor, factor)
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        if key in (Qt.Key_Left, Qt.Key_Right):
+            row = self.row + (1 if key == Qt.Key_Right else -1)
+            if 0 <= row < self.gallery.rowCount():
+                self.show_row(row)
+        elif key == Qt.Key_Escape:
+            self.close()
+        elif key == Qt.Key_0:
+            self.fit()
+        elif key == Qt.Key_1:
+            self.resetTransform()
+        else:
+            super().keyPressEvent(event)
+
+    def closeEvent(self, event):
+        self.item.setPixmap(QPixmap())  # the full-resolution image goes with the window
+        super().closeEvent(event)
+
+
+def _placeholder(size: int) -> QPixmap:
+    pixmap = QPixmap(size, size)
+    pixmap.fill(QColor("#f4f4f4"))
+    painter = QPainter(pixmap)
+    painter.setPen(QColor("#999"))
+    painter.drawRect(0, 0, size - 1, size - 1)
+    painter.drawText(pixmap.rect(), Qt.AlignCenter, "decoding…")
+    painter.end()
+    return pixmap
@@ -0,0 +1,277 @@
+# history.py
+"""
+Persistent generation history: prompt → images, cached on disk.
+
+Layout under CLIENT_CACHE_DIR (default ~/.cache/sem-client):
+  index.sqlite        entries (one per prompt + settings) and blob sizes
+  blobs/ab/abcdef…    each received image, named by the SHA-256 of its bytes
+                      (a result seen twice is stored once)
+  blobs/ab/abcdef….thumb  its decoded thumbnail (written by decode.py the
+                      first time the tile is shown; later visits read it
+                      instead of decoding the image again)
+
+An entry's key is the SHA-256 of the prompt and the settings that change
+the result: the server address and CLIENT_CACHE_SETTINGS (free-form, e.g.
+"provider=openai model=gpt-image-1"; the provider is configured on the
+server, so the client can't see it). Entries are evicted least recently
+used first once the blobs and thumbnails exceed CLIENT_CACHE_MAX_MB
+(default 512); a blob goes when no entry uses it any more. Blobs of the
+results on screen are pinned.
+
+put() runs on decoder threads (plain file writes); everything touching
+the index runs on the GUI thread. HistoryPanel lists the entries.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import (
+    QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QPushButton, QVBoxLayout, QWidget
+)
+
+from decode import Source
+
+THUMB_SUFFIX = ".thumb"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, prompt TEXT, settings TEXT,
+    created REAL, used REAL, images TEXT);
+CREATE TABLE IF NOT EXISTS entry_blobs (key TEXT, sha TEXT);
+CREATE INDEX IF NOT EXISTS entry_blobs_key ON entry_blobs (key);
+CREATE INDEX IF NOT EXISTS entry_blobs_sha ON entry_blobs (sha);
+CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, bytes INTEGER, thumb_bytes INTEGER);
+"""
+
+
+class Entry(NamedTuple):
+    """One cached result: `images` is a list of (sha, raw info or None)."""
+    key: str
+    prompt: str
+    created: float
+    used: float
+    images: list
+
+
+class History:
+    """Content-addressed, size-capped LRU cache of generation results."""
+
+    def __init__(self, root: str, max_bytes: int, settings: dict):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.settings = json.dumps(settings, sort_keys=True)
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+        self.db.execute("PRAGMA journal_mode=WAL")   # a lookup doesn't wait for fsync
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self.pinned = set()      # shas shown in the gallery right now
+        self._fresh = set()      # shas written by put() but not recorded yet
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, server: str) -> Optional["History"]:
+        """History configured by CLIENT_CACHE_*; None with CLIENT_CACHE_MAX_MB=0."""
+        max_mb = float(os.getenv("CLIENT_CACHE_MAX_MB", "512"))
+        if max_mb <= 0:
+            return None
+        root = os.getenv("CLIENT_CACHE_DIR",
+                         os.path.join(os.path.expanduser("~"), ".cache", "sem-client"))
+        return cls(root, int(max_mb * 2**20),
+                   {"server": server, "settings": os.getenv("CLIENT_CACHE_SETTINGS", "")})
+
+    # ---------- keys and files ----------
+
+    def key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.settings}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, "blobs", sha[:2], sha)
+
+    def source(self, sha: str, raw: Optional[dict] = None) -> Source:
+        """Source that decode.py reads from the blob (and its stored thumbnail)."""
+        path = self.blob_path(sha)
+        return Source(None, raw=raw, path=path, thumb=path + THUMB_SUFFIX)
+
+    def sources(self, entry: Entry) -> List[Source]:
+        return [self.source(sha, raw) for sha, raw in entry.images]
+
+    def put(self, data, raw: Optional[dict] = None) -> Source:
+        """Store one image's bytes (any thread); returns its blob Source."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._fresh.add(sha)
+        path = self.blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return self.source(sha, raw)
+
+    @staticmethod
+    def sha(source: Source) -> str:
+        return os.path.basename(source.path)
+
+    # ---------- entries (GUI thread) ----------
+
+    def lookup(self, prompt: str) -> Optional[Entry]:
+        """The cached result for `prompt` (marked as used), or None."""
+        key = self.key(prompt)
+        row = self.db.execute("SELECT key, prompt, created, used, images FROM entries "
+                              "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = _entry(row)
+        if not all(os.path.exists(self.blob_path(sha)) for sha, _raw in entry.images):
+            self.remove(key)  # cache directory was tampered with
+            return None
+        with self.db:
+            self.db.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+        return entry
+
+    def record(self, prompt: str, sources: List[Source]) -> bool:
+        """Make `sources` (from put()) the result of `prompt`; False if unchanged."""
+        key = self.key(prompt)
+        images = [(self.sha(s), s.raw) for s in sources]
+        old = self.db.execute("SELECT images FROM entries WHERE key = ?", (key,)).fetchone()
+        changed = old is None or [tuple(i) for i in json.loads(old[0])] != images
+        now = time.time()
+        with self.db:
+            if changed:
+                self.db.execute("DELETE FROM entry_blobs WHERE key = ?", (key,))
+                self.db.executemany("INSERT INTO entry_blobs VALUES (?, ?)",
+                                    [(key, sha) for sha, _raw in images])
+                for sha, _raw in images:
+                    self.db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, 0)",
+                                    (sha, os.path.getsize(self.blob_path(sha))))
+            self.db.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT(key) DO UPDATE SET created = excluded.created, "
+                            "used = excluded.used, images = excluded.images",
+                            (key, prompt, self.settings, now, now, json.dumps(images)))
+        with self._lock:
+            self._fresh.difference_update(sha for sha, _raw in images)
+        if changed and old is not None:
+            self._collect()  # blobs only the previous result used
+        self.evict()
+        return changed
+
+    def recent(self, limit: int = 500) -> List[Entry]:
+        """Entries for these settings, most recently used first."""
+        rows = self.db.execute("SELECT key, prompt, created, used, images FROM entries "
+                               "WHERE settings = ? ORDER BY used DESC LIMIT ?",
+                               (self.settings, limit))
+        return [_entry(row) for row in rows]
+
+    def remove(self, key: str) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.db.execute("DELETE FROM entry_blobs WHERE key = ?", (key,))
+        self._collect()
+
+    def size(self) -> int:
+        """Bytes of blobs and thumbnails (thumbnails counted once written)."""
+        for (sha,) in self.db.execute("SELECT sha FROM blobs WHERE thumb_bytes = 0").fetchall():
+            try:
+                size = os.path.getsize(self.blob_path(sha) + THUMB_SUFFIX)
+            except OSError:
+                continue
+            self.db.execute("UPDATE blobs SET thumb_bytes = ? WHERE sha = ?", (size, sha))
+        self.db.commit()
+        return self.db.execute("SELECT COALESCE(SUM(bytes + thumb_bytes), 0) FROM blobs").fetchone()[0]
+
+    def evict(self) -> None:
+        """Drop least recently used entries until under max_bytes (pinned ones stay)."""
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        with self._lock:
+            keep = self.pinned | self._fresh
+        for key, images in self.db.execute("SELECT key, images FROM entries "
+                                           "ORDER BY used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if any(sha in keep for sha, _raw in json.loads(images)):
+                continue
+            self.remove(key)
+            total = self.size()
+
+    def _collect(self) -> None:
+        """Delete the blobs (and thumbnails) no entry uses."""
+        with self._lock:
+            keep = self.pinned | self._fresh
+        orphans = [sha for (sha,) in self.db.execute(
+            "SELECT sha FROM blobs WHERE sha NOT IN (SELECT sha FROM entry_blobs)")
+            if sha not in keep]
+        with self.db:
+            self.db.executemany("DELETE FROM blobs WHERE sha = ?", [(sha,) for sha in orphans])
+        for sha in orphans:
+            for path in (self.blob_path(sha), self.blob_path(sha) + THUMB_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class HistoryPanel(QWidget):
+    """Browsable list of cached prompts: show one, regenerate it, or forget it."""
+
+    show_prompt = pyqtSignal(str, bool)  # prompt, revalidate (regenerate in the background)
+
+    def __init__(self, history: History, parent=None):
+        super().__init__(parent)
+        self.history = history
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("History"))
+        self.list = QListWidget()
+        self.list.setWordWrap(True)
+        self.list.itemActivated.connect(lambda item: self._emit(False))
+        layout.addWidget(self.list, stretch=1)
+        buttons = QHBoxLayout()
+        for text, slot in (("Show", lambda: self._emit(False)),
+                           ("Regenerate", lambda: self._emit(True)),
+                           ("Remove", self._remove)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        self.reload()
+
+    def reload(self) -> None:
+        """Re-read the entries (most recently used first)."""
+        self.list.clear()
+        for entry in self.history.recent():
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.used))
+            first = entry.prompt.splitlines()[0] if entry.prompt else ""
+            item = QListWidgetItem(f"{first[:60]}\n{len(entry.images)} images · {when}")
+            item.setToolTip(entry.prompt)
+            item.setData(Qt.UserRole, entry)
+            self.list.addItem(item)
+
+    def _selected(self) -> Optional[Entry]:
+        item = self.list.currentItem()
+        return item.data(Qt.UserRole) if item is not None else None
+
+    def _emit(self, revalidate: bool) -> None:
+        entry = self._selected()
+        if entry is not None:
+            self.show_prompt.emit(entry.prompt, revalidate)
+
+    def _remove(self) -> None:
+        entry = self._selected()
+        if entry is not None:
+            self.history.remove(entry.key)
+            self.reload()
+
+
+def _entry(row) -> Entry:
+    key, prompt, created, used, images = row
+    return Entry(key, prompt, created, used, [tuple(i) for i in json.loads(images)])
@@ -0,0 +1,39 @@
+# protocol.py
+"""
+Client side of the relay wire protocol.
+
+The framing and IMAGES payload code is the server's own (server/relay/
+framing.py and images.py), not a copy: the client image gets those files
+at build time (client/Dockerfile copies them to /app/relay), and a
+checkout imports them from ../server. See relay/framing.py for the
+protocol itself.
+
+make_framer() here builds reply framers (ERROR/BUSY lines are parsed)
+for SERVER_FRAMING=line|length.
+"""
+from __future__ import annotations
+import os
+import sys
+
+try:
+    import relay.framing  # noqa: F401  (client image: copied next to this file)
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from relay.framing import (  # noqa: E402
+    DEFAULT_MAX_FRAME, FRAME_MAGIC, Frame, FramingError, Kind, LengthFramer, LineFramer,
+)
+from relay.images import RAW_MIME, unpack_images  # noqa: E402
+
+FRAMERS = {"line": LineFramer, "length": LengthFramer}
+
+__all__ = ["DEFAULT_MAX_FRAME", "FRAME_MAGIC", "FRAMERS", "Frame", "FramingError", "Kind",
+           "RAW_MIME", "make_framer", "unpack_images"]
+
+
+def make_framer(mode: str = "length", max_frame: int = DEFAULT_MAX_FRAME):
+    """Create a fresh framer reading the server's replies."""
+    cls = FRAMERS.get(mode)
+    if cls is None:
+        raise ValueError(f"Unknown framing: {mode}. Supported: {list(FRAMERS)}")
+    return cls(max_frame, replies=True)
@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""The client's modules import as top-level modules, as when run from client/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
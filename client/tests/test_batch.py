@@ -0,0 +1,89 @@
+# tests/test_batch.py
+import asyncio
+import json
+import os
+
+from batch import Batch
+from protocol import Kind, LengthFramer
+from relay.images import pack_images
+
+
+class Server:
+    """Length-framing relay stand-in: one image per prompt, ERROR for prompts in `fail`."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.prompts = []
+
+    async def handle(self, reader, writer):
+        framer = LengthFramer()
+        while data := await reader.read(65536):
+            for frame in framer.feed(data):
+                prompt = bytes(frame.payload).decode()
+                self.prompts.append(prompt)
+                if prompt in self.fail:
+                    writer.write(framer.encode(Kind.ERROR, b"backend down", frame.id))
+                else:
+                    writer.write(framer.encode(
+                        Kind.IMAGES, pack_images([prompt.encode()], "image/webp"), frame.id))
+        writer.close()
+
+    def run(self, out, prompts):
+        async def main():
+            server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            batch = Batch(out, port=port, connections=2, in_flight=4, progress=0)
+            try:
+                return await batch.run(prompts)
+            finally:
+                server.close()
+        return asyncio.run(main())
+
+
+def manifest(out):
+    with open(os.path.join(out, "manifest.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_writes_images_then_manifest(tmp_path):
+    out = str(tmp_path)
+    stats = Server().run(out, ["a cat", "a dog"])
+    assert (stats.ok, stats.errors, stats.images) == (2, 0, 2)
+    recs = sorted(manifest(out), key=lambda r: r["i"])
+    assert [(r["i"], r["prompt"], r["status"], r["mime"]) for r in recs] == [
+        (0, "a cat", "ok", "image/webp"), (1, "a dog", "ok", "image/webp")]
+    for rec in recs:
+        (name,) = rec["files"]
+        assert name.endswith(".webp")
+        with open(os.path.join(out, name), "rb") as f:
+            assert f.read() == rec["prompt"].encode()
+    assert not [n for _d, _s, files in os.walk(out) for n in files if n.endswith(".tmp")]
+
+
+def test_resume_skips_done_prompts_and_retries_errors(tmp_path):
+    out = str(tmp_path)
+    first = Server(fail={"a dog"})
+    stats = first.run(out, ["a cat", "a dog", "a cow"])
+    assert (stats.ok, stats.errors) == (2, 1)
+
+    again = Server()
+    # Line 2 changed text: its old result doesn't count; line 3 is new.
+    stats = again.run(out, ["a cat", "a dog", "a pig", "a hen"])
+    assert sorted(again.prompts) == ["a dog", "a hen", "a pig"]
+    assert (stats.skipped, stats.ok, stats.errors) == (1, 3, 0)
+    assert Batch(out).done() == {0: "a cat", 1: "a dog", 2: "a pig", 3: "a hen"}
+
+    done = Server()
+    stats = done.run(out, ["a cat", "a dog", "a pig", "a hen"])
+    assert done.prompts == [] and stats.skipped == 4
+
+
+def test_done_reads_the_last_status_and_ignores_a_cut_off_line(tmp_path):
+    lines = [{"i": 0, "prompt": "x", "status": "ok"},
+             {"i": 1, "prompt": "y", "status": "ok"},
+             {"i": 1, "prompt": "y", "status": "error", "error": "later failure"}]
+    with open(tmp_path / "manifest.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(rec) + "\n" for rec in lines)
+        f.write('{"i": 2, "prompt": "z", "sta')
+    assert Batch(str(tmp_path)).done() == {0: "x"}
+    assert Batch(str(tmp_path / "missing")).done() == {}
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 import os, io, requests, base64
 from typing import List, Literal, Optional
 from PIL import Image, ImageDraw
+from batcher import EmbeddingBatcher
 
 # Required ENV variables (no defaults)
 LLAMA_BASE    = os.environ["LLAMA_BASE"]
@@ -18,6 +19,10 @@ TIMEOUT       = int(os.environ["TIMEOUT_SEC"])
 FIXED_WIDTH  = 512
 FIXED_HEIGHT = 512
 
+# Embedding micro-batching (EMBED_BATCH_MAX=1 disables it)
+EMBED_BATCH_MAX     = int(os.getenv("EMBED_BATCH_MAX", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
 # Mock mode configuration
 MOCK_COUNT   = 2
 MOCK_MIME    = "image/png"
@@ -38,16 +43,25 @@ class RequestBody(BaseModel):
     nlp_params: Optional[NLPParams] = None
     image_url_override: Optional[str] = None
 
-def embed_with_llm(text: str, model: str) -> List[float]:
+def embed_batch_with_llm(model: str, texts: List[str]) -> List[List[float]]:
     r = requests.post(
         f"{LLAMA_BASE}/embeddings",
         headers={"Authorization": f"Bearer {LLAMA_APIKEY}", "Content-Type": "application/json"},
-        json={"model": model, "input": [text]},
+        json={"model": model, "input": texts},
         timeout=TIMEOUT,
     )
     if r.status_code != 200:
         raise HTTPException(502, f"llama-server embeddings error: {r.text}")
-    return r.json()["data"][0]["embedding"]
+    data = sorted(r.json()["data"], key=lambda d: d.get("index", 0))
+    return [d["embedding"] for d in data]
+
+llm_batcher = EmbeddingBatcher(embed_batch_with_llm, max_batch=EMBED_BATCH_MAX,
+                               max_wait=EMBED_BATCH_WAIT_MS / 1000.0)
+
+def embed_with_llm(text: str, model: str) -> List[float]:
+    if EMBED_BATCH_MAX <= 1:
+        return embed_batch_with_llm(model, [text])[0]
+    return llm_batcher.embed(text, model)
 
 def embed_with_nlp(text: str, params: Optional[NLPParams]) -> List[float]:
     body = {"text": text}
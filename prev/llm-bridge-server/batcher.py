@@ -0,0 +1,74 @@
+"""
+Micro-batching for embedding calls.
+
+Request threads call `embed(text, model)` and block; a dispatcher thread
+collects whatever arrives within `max_wait` seconds (or until `max_batch`
+texts are queued), sends one `input: [...]` request per model through
+`send_batch`, and hands each caller its own vector back.
+
+At idle a lone request waits at most `max_wait`; under load many concurrent
+requests share one HTTP round-trip. If a batch fails (e.g. llama-server
+rejects one oversized text), each of its texts is sent again on its own,
+so only the callers whose text fails get the error.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+SendBatch = Callable[[str, List[str]], List[List[float]]]
+
+
+class EmbeddingBatcher:
+    def __init__(self, send_batch: SendBatch, max_batch: int = 32,
+                 max_wait: float = 0.005, concurrency: int = 4):
+        self.send_batch = send_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=concurrency,
+                                           thread_name_prefix="embed-batch")
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str, model: str) -> List[float]:
+        """Queue one text and block until its vector (or error) is ready."""
+        fut: Future = Future()
+        self._queue.put((model, text, fut))
+        return fut.result()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]  # block until there is work
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_model: Dict[str, List[Tuple[str, Future]]] = {}
+            for model, text, fut in batch:
+                by_model.setdefault(model, []).append((text, fut))
+            for model, items in by_model.items():
+                self._senders.submit(self._send, model, items)
+
+    def _send(self, model: str, items: List[Tuple[str, Future]]) -> None:
+        try:
+            vectors = self.send_batch(model, [text for text, _ in items])
+            if len(vectors) != len(items):
+                raise RuntimeError(f"expected {len(items)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            if len(items) > 1:
+                # One bad input shouldn't fail the texts batched with it
+                for item in items:
+                    self._send(model, [item])
+                return
+            items[0][1].set_exception(e)
+            return
+        for (_, fut), vec in zip(items, vectors):
+            fut.set_result(vec)
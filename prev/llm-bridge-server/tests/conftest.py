@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""The bridge's modules import as top-level modules, as when run from llm-bridge-server/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
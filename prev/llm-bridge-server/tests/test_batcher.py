@@ -0,0 +1,78 @@
+# tests/test_batcher.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batcher import EmbeddingBatcher
+
+
+class Upstream:
+    """send_batch double: records every call, vector = [len(text)]."""
+
+    def __init__(self, reject=(), short=False):
+        self.reject = set(reject)
+        self.short = short
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, model, texts):
+        with self._lock:
+            self.calls.append((model, list(texts)))
+        if self.reject & set(texts):
+            raise RuntimeError("HTTP 502: input too large")
+        vectors = [[float(len(t))] for t in texts]
+        return vectors[:-1] if self.short and len(texts) > 1 else vectors
+
+
+def embed_all(batcher, requests):
+    """Call embed() for every (text, model) at once; results (or errors) in order."""
+    def one(req):
+        try:
+            return batcher.embed(*req)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(len(requests)) as pool:
+        return list(pool.map(one, requests))
+
+
+def test_concurrent_requests_share_one_call_per_model():
+    upstream = Upstream()
+    batcher = EmbeddingBatcher(upstream, max_batch=32, max_wait=0.2)
+    out = embed_all(batcher, [("a", "m1"), ("bb", "m1"), ("ccc", "m2")])
+    assert out == [[1.0], [2.0], [3.0]]
+    assert sorted((m, sorted(t)) for m, t in upstream.calls) == [
+        ("m1", ["a", "bb"]), ("m2", ["ccc"])]
+
+
+def test_max_batch_splits_the_batch():
+    upstream = Upstream()
+    batcher = EmbeddingBatcher(upstream, max_batch=2, max_wait=0.2)
+    embed_all(batcher, [("a", "m"), ("b", "m"), ("c", "m")])
+    assert max(len(t) for _m, t in upstream.calls) == 2
+
+
+def test_one_bad_input_fails_only_its_caller():
+    upstream = Upstream(reject={"huge"})
+    batcher = EmbeddingBatcher(upstream, max_wait=0.2)
+    ok, bad, ok2 = embed_all(batcher, [("a", "m"), ("huge", "m"), ("cc", "m")])
+    assert ok == [1.0] and ok2 == [2.0]
+    assert isinstance(bad, RuntimeError) and "502" in str(bad)
+
+
+def test_upstream_down_fails_every_caller():
+    def down(model, texts):
+        raise ConnectionError("llama-server unreachable")
+    out = embed_all(EmbeddingBatcher(down, max_wait=0.2), [("a", "m"), ("b", "m")])
+    assert all(isinstance(e, ConnectionError) for e in out)
+
+
+def test_count_mismatch_is_retried_per_text_then_reported():
+    upstream = Upstream(short=True)
+    batcher = EmbeddingBatcher(upstream, max_wait=0.2)
+    assert embed_all(batcher, [("a", "m"), ("bb", "m")]) == [[1.0], [2.0]]
+
+    def empty(model, texts):
+        return []
+    with pytest.raises(RuntimeError, match="expected 1 embeddings, got 0"):
+        EmbeddingBatcher(empty, max_wait=0).embed("a", "m")
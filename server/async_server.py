@@ -0,0 +1,249 @@
+"""
+asyncio TCP→LLM relay (no Qt).
+
+Same wire protocol, framing and LLM adapters as server.py, for headless
+deployments that don't want PyQt5 in the image.
+
+Flow:
+  handle_client() → reader.read() → session.feed() → complete request frames
+  each frame → serve() task → acall_llm() → session.reply() → writer.
+  STREAM frames → astream_llm() → one session.reply() per chunk.
+  Tagged requests complete out of order; CANCEL frames are handled by the session.
+A CANCEL frame or a disconnect cancels the request's task (and, through its
+CancelToken, a call running on a worker thread; see llm/cancel.py).
+RELAY_JOURNAL turns on the request journal (relay/journal.py), and
+RELAY_PROCESSES / SIGTERM draining (relay/prefork.py) work as in server.py.
+Every adapter is awaited through `achat`: HTTP adapters use their pooled
+async client, the rest fall back to the port's thread offload, which runs
+on this server's pool of RELAY_WORKERS threads. At most RELAY_WORKERS calls
+run at once and RELAY_QUEUE_DEPTH more may wait (each at most
+RELAY_QUEUE_TIMEOUT); beyond that requests get a BUSY reply, as in server.py.
+Waiting requests get a slot in weighted fair order across clients, with
+optional per-client rate limits (relay/fair.py).
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from llm.cancel import Cancelled, scope
+from llm.factory import create_llm
+from relay.admission import Admission, Busy
+from relay.config import load_relay_cfg
+from relay.fair import AsyncSlots, Preempted
+from relay.framing import FramingError, Kind
+from relay.journal import Journal
+from relay.logs import setup_logging
+from relay.monitor import CANCELLED, INFLIGHT, QUEUE, WRITE, start_metrics_server
+from relay.prefork import listen_socket, supervise
+from relay.service import acall_llm, astream_llm, is_async, request_text
+from relay.session import Session
+
+READ_CHUNK = 64 * 1024
+
+log = logging.getLogger("relay.async_server")
+
+
+class Relay:
+    """One listening relay: shared LLM client, limits and executor."""
+
+    def __init__(self, llm, cfg: dict):
+        self.llm = llm
+        self.cfg = cfg
+        self.executor = ThreadPoolExecutor(max_workers=cfg["workers"],
+                                           thread_name_prefix="llm-worker")
+        self._slots = AsyncSlots(cfg["workers"])
+        self._admitted = 0  # running + waiting for a slot
+        self.admission = Admission(cfg)
+        self.journal = Journal.from_config(cfg, provider=os.getenv("LLM_PROVIDER", "llama").lower())
+        self.clients = {}  # Session -> StreamWriter for every open connection
+
+    async def serve(self, session, seq, frame, writer):
+        """Run one request and write its reply (in order, via the session)."""
+        if frame.kind not in (Kind.TEXT, Kind.STREAM):
+            session.reply(seq, Kind.ERROR, f"unsupported frame kind {frame.kind}".encode())
+            return
+        text = request_text(frame)
+        log.debug("[TCP IN] %s", text)
+
+        try:
+            flow, weight = self.admission.check(session, seq)
+            if (self._admitted >= self.cfg["workers"] + self.cfg["queue_depth"]
+                    and not self._slots.make_room(flow, weight)):
+                raise self.admission.busy(
+                    "queue_full", f"{self.cfg['workers']} workers busy and "
+                                  f"{self.cfg['queue_depth']} requests already queued")
+        except Busy as e:
+            session.reply(seq, Kind.BUSY, e.payload())
+            return
+        self._admitted += 1
+        INFLIGHT.inc()
+        enqueued = time.monotonic()
+        start = None
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(flow, weight),
+                                       self.admission.queue_timeout or None)
+            except Preempted as e:  # queue full: gave its place to a lighter client
+                session.reply(seq, Kind.BUSY,
+                              self.admission.throttle(session, "fair_share", str(e)).payload())
+                return
+            except asyncio.TimeoutError:
+                QUEUE.observe(time.monotonic() - enqueued)
+                busy = self.admission.busy(
+                    "queue_timeout",
+                    f"waited more than {self.admission.queue_timeout:g}s for a worker")
+                session.reply(seq, Kind.BUSY, busy.payload())
+                return
+            start = time.monotonic()
+            QUEUE.observe(start - enqueued)
+            trace = session.trace(seq)
+            if trace is not None:
+                trace.started = time.perf_counter()
+            try:
+                # The token reaches thread-offloaded calls (to_thread copies the context).
+                with scope(session.token(seq)):
+                    if frame.kind == Kind.STREAM:
+                        async for kind, payload, final in astream_llm(self.llm, text):
+                            await self.write(session, seq, kind, payload, final, writer)
+                        return
+                    kind, payload = await acall_llm(self.llm, text)
+            finally:
+                if trace is not None:
+                    trace.finished = time.perf_counter()
+                self._slots.release()
+                self.admission.observe(time.monotonic() - start)
+        except (asyncio.CancelledError, Cancelled):
+            CANCELLED.inc(stage="queued" if start is None else "running")
+            return  # the client is gone or no longer wants the reply
+        finally:
+            self._admitted -= 1
+            INFLIGHT.dec()
+        await self.write(session, seq, kind, payload, True, writer)
+
+    async def write(self, session, seq, kind, payload, final, writer):
+        """Hand one reply frame to the session and wait for the socket buffer."""
+        t0 = time.perf_counter()
+        session.reply(seq, kind, payload, final)
+        if session.open:
+            await writer.drain()
+        WRITE.observe(time.perf_counter() - t0)
+
+    async def handle_client(self, reader, writer):
+        """Per-connection loop: read, reassemble, spawn a task per request."""
+        log.debug("[TCP] new connection")
+        peer = writer.get_extra_info("peername")
+        session = Session(writer.write, self.cfg["framing"], self.cfg["max_frame"],
+                          self.journal, peer=str(peer[0]) if peer else "")
+        session.admitted = self.admission.connect()
+        self.clients[session] = writer
+        tasks = set()
+        idle = self.cfg["line_idle_ms"] / 1000
+        try:
+            while True:
+                if session.partial and idle > 0:
+                    # An unterminated line becomes a prompt once the client goes quiet
+                    try:
+                        data = await asyncio.wait_for(reader.read(READ_CHUNK), idle)
+                    except asyncio.TimeoutError:
+                        data = None
+                else:
+                    data = await reader.read(READ_CHUNK)
+                if data == b"":
+                    break
+                try:
+                    decoded = session.feed(data) if data is not None else session.flush()
+                except FramingError as e:
+                    log.warning("[TCP] protocol error: %s", e)
+                    writer.write(session.framer.encode(Kind.ERROR, str(e).encode("utf-8")))
+                    break
+                if not session.admitted:
+                    # Over RELAY_MAX_CONNECTIONS: answer in the client's framing, then hang up.
+                    for seq, _frame in decoded:
+                        session.reply(seq, Kind.BUSY,
+                                      self.admission.reject_connection().payload())
+                    if decoded:
+                        await writer.drain()
+                        break
+                    continue
+                for seq, frame in decoded:
+                    task = asyncio.create_task(self.serve(session, seq, frame, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    session.token(seq).on_cancel(task.cancel)
+        except ConnectionError:
+            pass
+        finally:
+            log.debug("[TCP] disconnected")
+            session.close()
+            if session.admitted:
+                self.admission.disconnect()
+            self.clients.pop(session, None)
+            writer.close()
+
+    async def drain(self, grace: float):
+        """Wait (at most `grace` s) for pending replies, then close every connection."""
+        deadline = time.monotonic() + grace
+        while any(s.pending for s in self.clients) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        writers = list(self.clients.values())
+        for writer in writers:
+            writer.close()  # buffered replies are flushed first
+        if writers:
+            await asyncio.wait([asyncio.ensure_future(w.wait_closed()) for w in writers],
+                               timeout=max(0.1, deadline - time.monotonic()))
+
+
+async def main():
+    load_dotenv()
+    cfg = load_relay_cfg()
+    setup_logging(cfg["log_level"], cfg["process_index"])
+
+    # Same factory + env as server.py: LLM_PROVIDER, LLM_BASE_URL, LLM_MODEL, ...
+    relay = Relay(create_llm(), cfg)
+    asyncio.get_running_loop().set_default_executor(relay.executor)
+    try:
+        sock = listen_socket(cfg)  # prefork worker: SO_REUSEPORT or inherited socket
+        if sock is not None:
+            server = await asyncio.start_server(relay.handle_client, sock=sock)
+        else:
+            server = await asyncio.start_server(relay.handle_client, host=None,
+                                                port=cfg["port"], backlog=1024)
+    except OSError as e:
+        log.error("Listen failed: %s", e)
+        sys.exit(1)
+
+    mode = "native async" if is_async(relay.llm) else f"{cfg['workers']} threads"
+    start_metrics_server(cfg)  # RELAY_METRICS_PORT, RELAY_METRICS_HOST
+    log.info("Async server running on port %d (%s, queue %d, framing %s)",
+             cfg["port"], mode, cfg["queue_depth"], cfg["framing"])
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+        log.info("stopping: draining %d connections", len(relay.clients))
+        server.close()  # stop accepting
+        await relay.drain(cfg["shutdown_grace"])
+    await relay.llm.aclose()  # pooled upstream connections (httpx)
+
+
+if __name__ == "__main__":
+    # RELAY_PROCESSES > 1: this process only supervises copies of this script.
+    load_dotenv()
+    relay_cfg = load_relay_cfg()
+    if relay_cfg["processes"] > 1:
+        setup_logging(relay_cfg["log_level"])
+        sys.exit(supervise(relay_cfg, __file__))
+    try:
+        import uvloop  # optional: faster event loop when installed
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+    run(main())
@@ -0,0 +1,254 @@
+"""
+Load generator / benchmark for the relay protocol (server.py, async_server.py).
+
+Opens --connections TCP connections and sends prompts at a fixed open-loop
+arrival rate (--rate requests/s over all connections; 0 = as fast as the
+connections allow, one request in flight each). Latency is measured from
+the moment a request was *scheduled*, not when it could be sent, so a
+stalled server shows up in the numbers instead of silently slowing the
+generator down.
+
+Prompts come from --prompts: a plain text file (one prompt per line) or a
+.jsonl file (each object's "prompt", "text", "title" or "body" field), e.g.
+the repo's requests.jsonl. They are replayed round-robin.
+
+With --multiplex every request is tagged with an id (length framing), so
+replies on one connection may complete out of order.
+
+Reports throughput, p50/p95/p99/max latency and error / BUSY rates.
+To measure only the relay's overhead, run the server with a mock backend
+of known speed:
+
+  LLM_PROVIDER=mock LLM_MOCK_LATENCY_MS=50 python server.py
+  python bench.py --connections 32 --rate 200 --duration 20 --prompts ../requests.jsonl
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from relay.framing import FramingError, Kind, make_framer
+
+READ_CHUNK = 64 * 1024
+
+
+def load_prompts(path):
+    """Prompt strings from a text or JSON-lines file."""
+    if not path:
+        return ["a scanning electron microscope image of a fractured steel surface"]
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                obj = json.loads(line)
+                line = next((obj[k] for k in ("prompt", "text", "title", "body") if obj.get(k)), "")
+            if line:
+                prompts.append(" ".join(line.split()))  # one line on the wire
+    if not prompts:
+        raise SystemExit(f"no prompts in {path}")
+    return prompts
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []     # seconds, successful replies
+        self.first_chunk = []   # seconds to first CHUNK (--stream)
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.busy = 0
+        self.bytes_in = 0
+
+
+class Conn:
+    """One connection: writes requests, matches replies to send times.
+
+    Untagged replies answer the oldest pending request; tagged ones (--multiplex)
+    carry their request's id.
+    """
+
+    def __init__(self, args, stats):
+        self.args = args
+        self.stats = stats
+        self.framer = make_framer(args.framing, replies=True)
+        self.pending = {}       # request id -> [scheduled time, first-chunk time]
+        self.next_id = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.closed = False     # the server hung up: pending requests were counted as errors
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+        if self.args.api_key and self.framer.mode == "length":
+            self.writer.write(self.framer.encode(
+                Kind.HELLO, json.dumps({"api_key": self.args.api_key}).encode("utf-8")))
+        self.read_task = asyncio.create_task(self.read_loop())
+
+    def send(self, prompt, scheduled):
+        if self.closed:
+            self.stats.sent += 1
+            self.stats.errors += 1
+            return
+        kind = Kind.STREAM if self.args.stream else Kind.TEXT
+        request_id = self.next_id
+        self.next_id += 1
+        self.pending[request_id] = [scheduled, None]
+        self.idle.clear()
+        self.writer.write(self.framer.encode(kind, prompt.encode("utf-8"),
+                                             request_id if self.args.multiplex else None))
+        self.stats.sent += 1
+
+    async def read_loop(self):
+        try:
+            await self._read_replies()
+        except (ConnectionError, FramingError) as e:
+            print(f"connection failed: {e}", file=sys.stderr)
+        # EOF or error (not close()): what is still pending will never be answered
+        self.closed = True
+        self.stats.errors += len(self.pending)
+        self.pending.clear()
+        self.idle.set()
+
+    async def _read_replies(self):
+        stats = self.stats
+        while True:
+            data = await self.reader.read(READ_CHUNK)
+            if not data:
+                return
+            stats.bytes_in += len(data)
+            now = time.perf_counter()
+            for frame in self.framer.feed(data):
+                key = frame.id if frame.id is not None else next(iter(self.pending), None)
+                entry = self.pending.get(key)
+                if entry is None:
+                    continue  # e.g. a protocol error reply
+                if frame.kind == Kind.CHUNK:
+                    if entry[1] is None:
+                        entry[1] = now
+                        stats.first_chunk.append(now - entry[0])
+                    continue
+                del self.pending[key]
+                if frame.kind == Kind.ERROR:
+                    stats.errors += 1
+                elif frame.kind == Kind.BUSY:
+                    stats.busy += 1
+                else:
+                    stats.ok += 1
+                    stats.latencies.append(now - entry[0])
+                if not self.pending:
+                    self.idle.set()
+
+    async def close(self):
+        self.writer.close()
+        self.read_task.cancel()
+
+
+async def run(args):
+    prompts = load_prompts(args.prompts)
+    stats = Stats()
+    conns = [Conn(args, stats) for _ in range(args.connections)]
+    await asyncio.gather(*(c.open() for c in conns))
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    end = start + args.duration
+    i = 0
+    if args.rate > 0:
+        # Open loop: request i is due at a fixed (or Poisson) schedule, whatever
+        # the server does; it goes to the next connection round-robin.
+        due = start
+        while due < end and (not args.requests or i < args.requests):
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            conns[i % len(conns)].send(prompts[i % len(prompts)], due)
+            i += 1
+            gap = rng.expovariate(args.rate) if args.poisson else 1 / args.rate
+            due += gap
+    else:
+        # Closed loop: each connection keeps exactly one request in flight.
+        async def worker(conn, offset):
+            n = offset
+            while (time.perf_counter() < end and not conn.closed
+                   and (not args.requests or n < args.requests)):
+                conn.send(prompts[n % len(prompts)], time.perf_counter())
+                await conn.idle.wait()
+                n += len(conns)
+        await asyncio.gather(*(worker(c, k) for k, c in enumerate(conns)))
+
+    # Let in-flight requests finish (bounded by --drain seconds).
+    try:
+        await asyncio.wait_for(asyncio.gather(*(c.idle.wait() for c in conns)), args.drain)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    for c in conns:
+        await c.close()
+    return stats, elapsed
+
+
+def report(args, stats, elapsed):
+    lat = sorted(stats.latencies)
+    ms = lambda v: round(v * 1000, 2)
+    out = {
+        "connections": args.connections, "rate": args.rate, "elapsed_s": round(elapsed, 2),
+        "sent": stats.sent, "ok": stats.ok, "errors": stats.errors, "busy": stats.busy,
+        "lost": stats.sent - stats.ok - stats.errors - stats.busy,
+        "throughput_rps": round(stats.ok / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round((stats.sent - stats.ok) / stats.sent, 4) if stats.sent else 0.0,
+        "p50_ms": ms(percentile(lat, 0.50)), "p95_ms": ms(percentile(lat, 0.95)),
+        "p99_ms": ms(percentile(lat, 0.99)), "max_ms": ms(lat[-1]) if lat else None,
+        "mb_in": round(stats.bytes_in / 1e6, 2),
+    }
+    if stats.first_chunk:
+        first = sorted(stats.first_chunk)
+        out["first_chunk_p50_ms"] = ms(percentile(first, 0.50))
+        out["first_chunk_p99_ms"] = ms(percentile(first, 0.99))
+    if args.json:
+        print(json.dumps(out))
+        return
+    for k, v in out.items():
+        print(f"{k:>20}: {v}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the TCP relay.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=12345)
+    p.add_argument("--connections", "-c", type=int, default=8)
+    p.add_argument("--rate", "-r", type=float, default=0,
+                   help="requests/s over all connections (0 = closed loop)")
+    p.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    p.add_argument("--duration", "-d", type=float, default=10, help="seconds of load")
+    p.add_argument("--requests", "-n", type=int, default=0, help="stop after N requests")
+    p.add_argument("--drain", type=float, default=30, help="max seconds to wait for replies")
+    p.add_argument("--prompts", help="text file (one prompt per line) or .jsonl")
+    p.add_argument("--framing", choices=["length", "line"], default="length")
+    p.add_argument("--stream", action="store_true", help="send STREAM requests")
+    p.add_argument("--multiplex", action="store_true",
+                   help="tag requests with ids (replies may come out of order)")
+    p.add_argument("--api-key", help="identify as this client (HELLO frame, length framing)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", action="store_true", help="print one JSON line")
+    args = p.parse_args(argv)
+    if (args.stream or args.multiplex) and args.framing == "line":
+        p.error("--stream and --multiplex need --framing length")
+
+    stats, elapsed = asyncio.run(run(args))
+    report(args, stats, elapsed)
+    return 0 if stats.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
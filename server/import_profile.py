@@ -0,0 +1,97 @@
+"""
+Import-time / startup profile for the relay, to catch cold-start regressions.
+
+  python import_profile.py                 # imports needed to build LLM_PROVIDER
+  python import_profile.py --top 25        # more modules
+  python import_profile.py --ready server.py --budget-ms 1000
+
+Default mode runs `python -X importtime` on what a server does before it
+can take requests (factory + relay modules + create_llm() for the
+configured provider) and lists the slowest modules by cumulative time.
+--ready starts the given server script and measures process start until
+its TCP port accepts connections. With --budget-ms the exit status is 1
+when the measured time is over budget, so this can run in CI.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STARTUP_CODE = (
+    "from dotenv import load_dotenv; load_dotenv();"
+    "from llm.factory import create_llm;"
+    "import relay.service, relay.session, relay.admission;"
+    "create_llm()"
+)
+
+
+def profile_imports(top: int) -> float:
+    """Print the slowest imports; return total import time in ms."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+                          cwd=HERE, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit("startup code failed (is LLM_PROVIDER configured?)")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name[1:]))  # keep the nesting indent
+    # Top-level imports (no leading indentation in -X importtime) sum to the total.
+    total_ms = sum(c for c, _, name in rows if not name.startswith(" ")) / 1000
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>14.1f} {self_us / 1000:>8.1f}  {name.strip()}")
+    print(f"total import time: {total_ms:.0f} ms "
+          f"(provider {os.getenv('LLM_PROVIDER', 'from .env')})")
+    return total_ms
+
+
+def time_to_ready(script: str, port: int, timeout: float) -> float:
+    """Start `script`, return ms until it accepts TCP connections on `port`."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], cwd=HERE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"{script} exited with status {proc.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.05).close()
+                ready_ms = (time.perf_counter() - start) * 1000
+                print(f"{script}: ready in {ready_ms:.0f} ms")
+                return ready_ms
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f"{script} not ready after {timeout:g}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Profile relay import / startup time.")
+    p.add_argument("--top", type=int, default=15, help="modules to list")
+    p.add_argument("--ready", metavar="SCRIPT",
+                   help="measure start-to-ready of a server script instead")
+    p.add_argument("--port", type=int, default=int(os.getenv("RELAY_PORT", "12345")))
+    p.add_argument("--budget-ms", type=float, default=0, help="fail if slower than this")
+    args = p.parse_args(argv)
+
+    if args.ready:
+        elapsed = time_to_ready(args.ready, args.port, timeout=30)
+    else:
+        elapsed = profile_imports(args.top)
+    if args.budget_ms and elapsed > args.budget_ms:
+        print(f"over budget: {elapsed:.0f} ms > {args.budget_ms:g} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
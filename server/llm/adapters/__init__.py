@@ -1,3 +1,3 @@
 # llm/adapters/__init__.py
-from .llama import LlamaAdapter
-# from .anthropic import AnthropicAdapter
+# Adapters are imported on demand by the registry (llm/registry.py);
+# don't import them here, or every provider loads at startup.
@@ -2,10 +2,12 @@
 """
 Minimal adapter for OpenAI-compatible `/v1/chat/completions` backends.
 Implements your generic LLMClient and hides provider-specific details.
+Streaming uses the same endpoint with `"stream": true` (server-sent events).
 """
 from __future__ import annotations
-import requests
-from typing import List, Optional
+import json
+from typing import AsyncIterator, Iterator, List, Optional
+from ..http import HttpTransport
 from ..port import LLMClient, ChatMessage, ChatResponse
 from ..registry import register
 
@@ -13,29 +15,43 @@ from ..registry import register
 class LlamaAdapter(LLMClient):
     """Adapter that calls `{base_url}/chat/completions` and returns ChatResponse."""
     def __init__(self, base_url: str, api_key: Optional[str],
-                 default_model: str, timeout: int = 120):
+                 default_model: str, timeout: int = 120,
+                 http: Optional[HttpTransport] = None):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.default_model = default_model
-        self.timeout = timeout
+        self.http = http or HttpTransport(timeout=timeout)
 
     @classmethod
     def from_config(cls, cfg: dict) -> "LlamaAdapter":
-        """Build from factory config dict (base_url/model/api_key/timeout)."""
+        """Build from factory config dict (base_url/model/api_key/timeout + HTTP pool)."""
         return cls(
-            base_url=cfg["base_url"],      
-            api_key=cfg.get("api_key"),    
-            default_model=cfg["model"],    
+            base_url=cfg["base_url"],
+            api_key=cfg.get("api_key"),
+            default_model=cfg["model"],
             timeout=cfg.get("timeout", 120),
+            http=HttpTransport.from_config(cfg),
         )
 
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
     def _headers(self):
         """JSON headers (+ Bearer token if api_key exists)."""
         h = {"Content-Type": "application/json"}
-        if self.api_key:  
+        if self.api_key:
             h["Authorization"] = f"Bearer {self.api_key}"
         return h
 
+    def _body(self, messages: List[ChatMessage], max_tokens: int,
+              temperature: float, model: Optional[str]) -> dict:
+        return {
+            "model": model or self.default_model,
+            "messages": [m.__dict__ for m in messages],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
     def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
          temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
         """
@@ -43,14 +59,46 @@ class LlamaAdapter(LLMClient):
         Returns the generated text; keeps original payload in `raw`.
         """
         url = f"{self.base_url}/chat/completions"
-        body = {
-            "model": model or self.default_model,
-            "messages": [m.__dict__ for m in messages],
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        }
+        body = self._body(messages, max_tokens, temperature, model)
+        r = self.http.post(url, json=body, headers=self._headers())
+        return self._parse(r)
 
-        r = requests.post(url, json=body, headers=self._headers(), timeout=self.timeout)
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        """Same as `chat`, over the pooled async HTTP client."""
+        url = f"{self.base_url}/chat/completions"
+        body = self._body(messages, max_tokens, temperature, model)
+        r = await self.http.apost(url, json=body, headers=self._headers())
+        return self._parse(r)
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        """Yield content deltas from the SSE stream as they arrive."""
+        url = f"{self.base_url}/chat/completions"
+        body = self._body(messages, max_tokens, temperature, model)
+        body["stream"] = True
+        for line in self.http.stream_lines(url, json=body, headers=self._headers()):
+            delta = _sse_delta(line)
+            if delta is _DONE:
+                return
+            if delta:
+                yield delta
+
+    async def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                           temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Async `stream_chat` over the pooled async HTTP client."""
+        url = f"{self.base_url}/chat/completions"
+        body = self._body(messages, max_tokens, temperature, model)
+        body["stream"] = True
+        async for line in self.http.astream_lines(url, json=body, headers=self._headers()):
+            delta = _sse_delta(line)
+            if delta is _DONE:
+                return
+            if delta:
+                yield delta
+
+    def _parse(self, r) -> ChatResponse:
+        """Normalize an HTTP response (requests or httpx) into ChatResponse."""
         ct = r.headers.get("content-type", "")
         r.raise_for_status()
 
@@ -61,7 +109,7 @@ class LlamaAdapter(LLMClient):
             txt = (r.text or "").strip()
             if not txt:
                 raise RuntimeError("Empty body with 200 OK from LLM server")
-       
+
             return ChatResponse(text=txt, raw={"raw_text": txt, "content_type": ct})
 
         text = (
@@ -71,4 +119,23 @@ class LlamaAdapter(LLMClient):
             or ""
         )
 
-        return ChatResponse(text=text, raw=data)
\ No newline at end of file
+        return ChatResponse(text=text, raw=data)
+
+
+_DONE = object()
+
+
+def _sse_delta(line: str):
+    """Text delta carried by one SSE line, _DONE at the end marker, else None."""
+    if not line.startswith("data:"):
+        return None  # blank separators, comments, "event:" lines
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _DONE
+    chunk = json.loads(data)
+    choice = (chunk.get("choices") or [{}])[0]
+    return (
+        (choice.get("delta") or {}).get("content")
+        or choice.get("text")
+        or chunk.get("content")
+    )
@@ -1,7 +1,8 @@
 from __future__ import annotations
-import json, requests
+import json
 from typing import List, Optional
-from ..port import LLMClient, ChatMessage, ChatResponse
+from ..http import HttpTransport
+from ..port import LLMClient, ChatMessage, ChatResponse, JSONResponse
 from ..registry import register
 
 @register("llama_emb")
@@ -16,10 +17,11 @@ class BridgeLLMAdapter(LLMClient):
     This ensures compatibility with the LLMClient interface,
     which expects `text` only.
     """
-    def __init__(self, base_url: str, model: str, timeout: int = 120):
+    def __init__(self, base_url: str, model: str, timeout: int = 120,
+                 http: Optional[HttpTransport] = None):
         self.base_url = base_url.rstrip("/")
         self.model = model
-        self.timeout = timeout
+        self.http = http or HttpTransport(timeout=timeout)
 
     @classmethod
     def from_config(cls, cfg: dict) -> "BridgeLLMAdapter":
@@ -28,7 +30,8 @@ class BridgeLLMAdapter(LLMClient):
         
         Args:
             cfg (dict): Configuration dictionary containing `base_url`,
-                        `model`, and optionally `timeout`.
+                        `model`, and optionally `timeout` and the HTTP pool
+                        settings (`pool_size`, `connect_timeout`, `http2`).
 
         Raises:
             ValueError: If no model is provided.
@@ -40,7 +43,8 @@ class BridgeLLMAdapter(LLMClient):
         model = cfg.get("model")
         if not model:
             raise ValueError("bridge_llm requires LLM_MODEL (model path/id) in env")
-        return cls(base_url=base, model=model, timeout=cfg.get("timeout", 120))
+        return cls(base_url=base, model=model, timeout=cfg.get("timeout", 120),
+                   http=HttpTransport.from_config(cfg))
 
     def chat(
         self,
@@ -62,10 +66,38 @@ class BridgeLLMAdapter(LLMClient):
         Returns:
             ChatResponse: Response containing JSON-encoded string with image data.
         """
+        request = self._request(messages, model)
+        if request is None:
+            return ChatResponse(text=json.dumps({"images_base64": [], "mime": "image/png"}))
+        url, payload = request
+        r = self.http.post(url, json=payload)
+        return self._parse(r)
+
+    async def achat(
+        self,
+        messages: List[ChatMessage],
+        *,
+        max_tokens: int = 500,
+        temperature: float = 0.2,
+        model: Optional[str] = None
+    ) -> ChatResponse:
+        """Same as `chat`, over the pooled async HTTP client."""
+        request = self._request(messages, model)
+        if request is None:
+            return ChatResponse(text=json.dumps({"images_base64": [], "mime": "image/png"}))
+        url, payload = request
+        r = await self.http.apost(url, json=payload)
+        return self._parse(r)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    def _request(self, messages: List[ChatMessage], model: Optional[str]):
+        """Build (url, payload) for the bridge, or None if there is no user text."""
         # Take the first user message as input text
         user = next((m.content for m in messages if m.role == "user"), "")
         if not user:
-            return ChatResponse(text=json.dumps({"images_base64": [], "mime": "image/png"}))
+            return None
 
         url = f"{self.base_url}/v1/text-to-image"
         payload = {
@@ -73,9 +105,11 @@ class BridgeLLMAdapter(LLMClient):
             "source": "llm",
             "llm_model": (model or self.model)
         }
-        r = requests.post(url, json=payload, timeout=self.timeout)
-        r.raise_for_status()
-        data = r.json()
+        return url, payload
 
-        # Return JSON as string to comply with the LLMClient contract
-        return ChatResponse(text=json.dumps(data, ensure_ascii=False), raw=data)
\ No newline at end of file
+    def _parse(self, r) -> ChatResponse:
+        """Check status and wrap the bridge JSON into a ChatResponse."""
+        r.raise_for_status()
+        # Parsed once, from the bytes (r.text would decode a second copy of
+        # the body); `text` is only rebuilt if a caller asks for it.
+        return JSONResponse(json.loads(r.content))
@@ -3,31 +3,90 @@ MockAdapter — minimal in-memory adapter for testing the LLM flow.
 
 Purpose:
 - No HTTP calls, no external deps.
-- Always returns: "<prefix> <user_text>".
+- Always returns: "<prefix> <user_text>", or with LLM_MOCK_IMAGES=N the
+  image bridge's {"images_base64": [...]} reply with N synthetic PNGs of
+  ~LLM_MOCK_IMAGE_BYTES each.
+- Streams the same text word by word (deterministic chunking).
+- Load-test knobs (llm/synthetic.py): LLM_MOCK_LATENCY_MS with
+  LLM_MOCK_LATENCY_DIST=fixed|normal|lognormal and LLM_MOCK_LATENCY_SIGMA,
+  LLM_MOCK_ERROR_RATE and LLM_MOCK_SEED, so the relay can be benchmarked
+  (bench.py) against a backend of known speed and failure rate.
+  The delay ends early when the call is cancelled (llm/cancel.py).
 - Registered as "mock" so the factory can pick it via LLM_PROVIDER=mock.
 """
 from __future__ import annotations
-from typing import List, Optional
-from ..port import LLMClient, ChatMessage, ChatResponse
+import asyncio
+import re
+from typing import AsyncIterator, Iterator, List, Optional
+from .. import cancel
+from ..port import LLMClient, ChatMessage, ChatResponse, JSONResponse
 from ..registry import register
+from ..synthetic import Latency, images_payload
 
 @register("mock")
 class MockAdapter(LLMClient):
     """Deterministic adapter for tests and local debugging."""
-    def __init__(self, prefix: str = "MOCK:", timeout: int = 1):
+    deterministic = True
+
+    def __init__(self, prefix: str = "MOCK:", timeout: int = 1,
+                 latency: Optional[Latency] = None, images: int = 0,
+                 image_bytes: int = 256 * 1024):
         self.prefix = prefix
         self.timeout = timeout
+        self.latency = latency or Latency()
+        self.images = images            # > 0: answer like the image bridge
+        self.image_bytes = image_bytes
 
     @classmethod
     def from_config(cls, cfg: dict) -> "MockAdapter":
-        """Create from config dict; honors optional 'mock_prefix'."""
-        return cls(prefix=cfg.get("mock_prefix", "MOCK:"), timeout=1)
+        """Create from config dict; honors optional 'mock_*' keys (see llm/synthetic.py)."""
+        return cls(prefix=cfg.get("mock_prefix", "MOCK:"), timeout=1,
+                   latency=Latency.from_config(cfg),
+                   images=cfg.get("mock_images", 0),
+                   image_bytes=cfg.get("mock_image_bytes", 256 * 1024))
 
     def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
              temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
         """
-        Return "<prefix> <first user message>".
+        Return "<prefix> <first user message>" (or synthetic images).
         Ignores generation options; intended only for wiring/tests.
         """
+        delay = self.latency.sample()
+        if delay:
+            cancel.sleep(delay)  # raises Cancelled early, like an aborted HTTP call
+        self.latency.maybe_fail()
+        return self._reply(messages)
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        """No I/O to wait for: answer inline instead of using a thread."""
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        self.latency.maybe_fail()
+        return self._reply(messages)
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        """Yield the `chat` text one word (with its trailing spaces) at a time."""
+        delay = self.latency.sample()
+        if delay:
+            cancel.sleep(delay)  # time to first chunk
+        self.latency.maybe_fail()
+        yield from re.findall(r"\S+\s*", self._reply(messages).text)
+
+    async def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                           temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        self.latency.maybe_fail()
+        for chunk in re.findall(r"\S+\s*", self._reply(messages).text):
+            yield chunk
+
+    def _reply(self, messages: List[ChatMessage]) -> ChatResponse:
+        if self.images:
+            data = images_payload(self.images, self.image_bytes)
+            return JSONResponse(data)
         user = next((m.content for m in messages if m.role == "user"), "")
         return ChatResponse(text=f"{self.prefix} {user}")
@@ -1,7 +1,8 @@
 from __future__ import annotations
-import json, requests
+import json
 from typing import List, Optional, Dict, Any
-from ..port import LLMClient, ChatMessage, ChatResponse
+from ..http import HttpTransport
+from ..port import LLMClient, ChatMessage, ChatResponse, JSONResponse
 from ..registry import register
 
 @register("nlp")
@@ -10,9 +11,10 @@ class BridgeNLPAdapter(LLMClient):
     Provider שמדבר עם ה-bridge שלך במצב source='nlp'.
     מחזיר ChatResponse.text כ-JSON-STRING עם images_base64/mime.
     """
-    def __init__(self, base_url: str, timeout: int = 120, default_nlp_params: Optional[Dict[str, Any]] = None):
+    def __init__(self, base_url: str, timeout: int = 120, default_nlp_params: Optional[Dict[str, Any]] = None,
+                 http: Optional[HttpTransport] = None):
         self.base_url = base_url.rstrip("/")
-        self.timeout = timeout
+        self.http = http or HttpTransport(timeout=timeout)
         self.default_nlp_params = default_nlp_params or {
             "use_lemma": True,
             "keep_pos": ["NOUN", "ADJ"],
@@ -24,7 +26,8 @@ class BridgeNLPAdapter(LLMClient):
         return cls(
             base_url=cfg["base_url"],
             timeout=cfg.get("timeout", 120),
-            default_nlp_params=cfg.get("nlp_params")  # לא חובה; אפשר להביא רק מה-bridge
+            default_nlp_params=cfg.get("nlp_params"),  # לא חובה; אפשר להביא רק מה-bridge
+            http=HttpTransport.from_config(cfg),
         )
 
     def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
@@ -33,13 +36,28 @@ class BridgeNLPAdapter(LLMClient):
         if not user:
             return ChatResponse(text=json.dumps({"images_base64": [], "mime": "image/png"}))
 
-        url = f"{self.base_url}/v1/text-to-image"
-        payload = {
+        r = self.http.post(f"{self.base_url}/v1/text-to-image", json=self._payload(user))
+        return self._parse(r)
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        user = next((m.content for m in messages if m.role == "user"), "")
+        if not user:
+            return ChatResponse(text=json.dumps({"images_base64": [], "mime": "image/png"}))
+
+        r = await self.http.apost(f"{self.base_url}/v1/text-to-image", json=self._payload(user))
+        return self._parse(r)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    def _payload(self, user: str) -> Dict[str, Any]:
+        return {
             "text": user,
             "source": "nlp",
             "nlp_params": self.default_nlp_params
         }
-        r = requests.post(url, json=payload, timeout=self.timeout)
+
+    def _parse(self, r) -> ChatResponse:
         r.raise_for_status()
-        data = r.json()
-        return ChatResponse(text=json.dumps(data, ensure_ascii=False), raw=data)
\ No newline at end of file
+        return JSONResponse(json.loads(r.content))  # held once: `text` is built on demand
@@ -0,0 +1,358 @@
+"""
+RouterAdapter — composite provider that spreads requests over several backends.
+
+Configured with LLM_PROVIDER=router and:
+- LLM_ROUTER_BACKENDS: comma-separated "provider" or "provider@base_url",
+  e.g. "llama@http://gpu1:8080/v1,llama@http://gpu2:8080/v1,mock".
+  Each backend is built by create_llm(), so its own LLM_LAYERS_<PROVIDER>
+  still applies.
+- LLM_ROUTER_POLICY: "least" (fewest outstanding requests, default) or
+  "ewma" (lowest latency EWMA scaled by outstanding requests).
+- LLM_ROUTER_HEDGE=1: when the chosen backend has not answered within its
+  recent p95 latency, send the same request to the next backend and take
+  whichever answers first. Blocking calls run their attempts on a pool of
+  LLM_ROUTER_HEDGE_THREADS threads (default 2 × LLM_POOL_SIZE: a primary
+  and a hedge for as many calls as a backend's HTTP pool can carry), so
+  hedges don't queue behind each other under load.
+- LLM_ROUTER_COOLDOWN: seconds a backend is ranked last after an error.
+
+A failing backend (error or HTTP timeout) is skipped and the request is
+retried on the next one. Streams fail over only before their first chunk.
+A cancelled request (llm/cancel.py) is not a backend failure: it is not
+retried, and hedge attempts that lose the race are cancelled upstream.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Iterator, List, Optional
+
+from .. import cancel
+from ..port import LLMClient, ChatMessage, ChatResponse
+from ..registry import register
+
+log = logging.getLogger(__name__)
+
+HEDGE_MIN_SAMPLES = 20  # latencies needed before p95 is trusted
+
+
+class _Backend:
+    """One routed client plus the load/latency numbers used to rank it."""
+
+    def __init__(self, name: str, client: LLMClient, alpha: float = 0.2):
+        self.name = name
+        self.client = client
+        self.alpha = alpha
+        self.outstanding = 0
+        self.ewma_ms: Optional[float] = None
+        self.recent = deque(maxlen=200)
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def observe(self, ms: float) -> None:
+        self.ewma_ms = ms if self.ewma_ms is None else (
+            self.alpha * ms + (1 - self.alpha) * self.ewma_ms)
+        self.recent.append(ms)
+
+    def p95_ms(self) -> Optional[float]:
+        if len(self.recent) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+@register("router")
+class RouterAdapter(LLMClient):
+    """Routes each request to the best-ranked backend, with failover and hedging."""
+
+    def __init__(self, backends: List[_Backend], policy: str = "least",
+                 hedge: bool = False, cooldown: float = 5.0, hedge_threads: int = 20):
+        if not backends:
+            raise ValueError("router needs at least one backend (LLM_ROUTER_BACKENDS)")
+        if policy not in ("least", "ewma"):
+            raise ValueError(f"Unknown router policy: {policy}. Supported: ['least', 'ewma']")
+        self.backends = backends
+        self.policy = policy
+        self.hedge = hedge and len(backends) > 1
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_threads,
+                                        thread_name_prefix="llm-router") if self.hedge else None
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "RouterAdapter":
+        """Build every backend listed in `router_backends` through the factory."""
+        from ..factory import create_llm  # late import: the factory imports this module
+
+        backends = []
+        for spec in (x.strip() for x in cfg.get("router_backends", "").split(",")):
+            if not spec:
+                continue
+            name, _, url = spec.partition("@")
+            if name.lower() == "router":
+                raise ValueError("router backends cannot include 'router'")
+            overrides = {"base_url": url} if url else {}
+            overrides["metrics_name"] = spec
+            backends.append(_Backend(spec, create_llm(name, **overrides)))
+        return cls(backends, policy=cfg.get("router_policy", "least"),
+                   hedge=cfg.get("router_hedge", False),
+                   cooldown=cfg.get("router_cooldown", 5.0),
+                   hedge_threads=(cfg.get("router_hedge_threads")
+                                  or 2 * cfg.get("pool_size", 10)))
+
+    @property
+    def deterministic(self) -> bool:
+        return all(b.client.deterministic for b in self.backends)
+
+    async def aclose(self) -> None:
+        for b in self.backends:
+            await b.client.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "failovers": self.failovers, "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "backends": {
+                    b.name: {"outstanding": b.outstanding, "calls": b.calls,
+                             "errors": b.errors, "ewma_ms": b.ewma_ms,
+                             "p95_ms": b.p95_ms()}
+                    for b in self.backends
+                },
+            }
+
+    # ---------- ranking / bookkeeping ----------
+
+    def _ranked(self) -> List[_Backend]:
+        """Backends best-first; those cooling down after an error go last."""
+        now = time.monotonic()
+        with self._lock:
+            if self.policy == "ewma":
+                load = lambda b: (b.ewma_ms or 0.0) * (b.outstanding + 1)
+            else:
+                load = lambda b: (b.outstanding, b.ewma_ms or 0.0)
+            return sorted(self.backends, key=lambda b: (b.cooldown_until > now, load(b)))
+
+    def _start(self, b: _Backend) -> float:
+        with self._lock:
+            b.outstanding += 1
+            b.calls += 1
+        return time.perf_counter()
+
+    def _finish(self, b: _Backend, t0: float, ok: Optional[bool]) -> None:
+        """Record an attempt: ok=True/False, or None if it was abandoned (no signal)."""
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            b.outstanding -= 1
+            if ok:
+                b.observe(ms)
+            elif ok is False:
+                b.errors += 1
+                b.cooldown_until = time.monotonic() + self.cooldown
+
+    def _hedge_delay(self, b: _Backend) -> Optional[float]:
+        """Seconds to wait on `b` before hedging, or None to wait indefinitely."""
+        with self._lock:
+            p95 = b.p95_ms()
+        return None if p95 is None else p95 / 1000
+
+    def _call(self, b: _Backend, messages, opts) -> ChatResponse:
+        t0 = self._start(b)
+        try:
+            reply = b.client.chat(messages, **opts)
+        except cancel.Cancelled:
+            self._finish(b, t0, ok=None)
+            raise
+        except Exception:
+            self._finish(b, t0, ok=False)
+            raise
+        self._finish(b, t0, ok=True)
+        return reply
+
+    async def _acall(self, b: _Backend, messages, opts) -> ChatResponse:
+        t0 = self._start(b)
+        try:
+            reply = await b.client.achat(messages, **opts)
+        except asyncio.CancelledError:
+            self._finish(b, t0, ok=None)  # lost a hedge race or caller went away
+            raise
+        except Exception:
+            self._finish(b, t0, ok=False)
+            raise
+        self._finish(b, t0, ok=True)
+        return reply
+
+    # ---------- LLMClient ----------
+
+    def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+             temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        opts = dict(max_tokens=max_tokens, temperature=temperature, model=model)
+        remaining = self._ranked()
+        if not self.hedge:
+            return self._failover(remaining, lambda b: self._call(b, messages, opts))
+
+        pending = {}  # future -> (backend, its CancelToken)
+        last_error: Optional[Exception] = None
+        hedged = False
+        caller = cancel.current()
+
+        def launch():
+            b = remaining.pop(0)
+            # Own token per attempt, so a losing hedge can be aborted alone.
+            token = caller.child() if caller is not None else cancel.CancelToken()
+            pending[self._pool.submit(self._scoped, token, b, messages, opts)] = (b, token)
+
+        launch()
+        primary = next(iter(pending.values()))[0]
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if (not hedged and remaining) else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:  # primary is slower than its p95: race a second backend
+                    hedged = True
+                    with self._lock:
+                        self.hedges += 1
+                    launch()
+                    continue
+                for fut in done:
+                    b, _token = pending.pop(fut)
+                    try:
+                        reply = fut.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if b is not primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return reply
+                if not pending and remaining:
+                    with self._lock:
+                        self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for _b, token in pending.values():
+                token.cancel()  # hedge loser: abort upstream
+
+    def _scoped(self, token, b: _Backend, messages, opts) -> ChatResponse:
+        """Runs on the hedge pool: `_call` under the attempt's token."""
+        with cancel.scope(token):
+            return self._call(b, messages, opts)
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        opts = dict(max_tokens=max_tokens, temperature=temperature, model=model)
+        remaining = self._ranked()
+        pending = {}
+        last_error: Optional[Exception] = None
+        hedged = not self.hedge
+
+        def launch():
+            b = remaining.pop(0)
+            pending[asyncio.ensure_future(self._acall(b, messages, opts))] = b
+
+        launch()
+        primary = next(iter(pending.values()))
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if (not hedged and remaining) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    with self._lock:
+                        self.hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    b = pending.pop(task)
+                    try:
+                        reply = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if b is not primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return reply
+                if not pending and remaining:
+                    with self._lock:
+                        self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()  # hedge loser (or caller cancelled): abort upstream
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        opts = dict(max_tokens=max_tokens, temperature=temperature, model=model)
+        last_error: Optional[Exception] = None
+        for i, b in enumerate(self._ranked()):
+            if i:
+                with self._lock:
+                    self.failovers += 1
+            started, ok = False, None
+            t0 = self._start(b)
+            try:
+                for chunk in b.client.stream_chat(messages, **opts):
+                    started = True
+                    yield chunk
+                ok = True
+            except Exception as e:
+                ok = False
+                if started:
+                    raise  # part of the reply is already out: can't switch backends
+                last_error = e
+                continue
+            finally:
+                self._finish(b, t0, ok)  # ok=None: the consumer stopped early
+            return
+        raise last_error
+
+    async def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                           temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        opts = dict(max_tokens=max_tokens, temperature=temperature, model=model)
+        last_error: Optional[Exception] = None
+        for i, b in enumerate(self._ranked()):
+            if i:
+                with self._lock:
+                    self.failovers += 1
+            started, ok = False, None
+            t0 = self._start(b)
+            try:
+                async for chunk in b.client.astream_chat(messages, **opts):
+                    started = True
+                    yield chunk
+                ok = True
+            except Exception as e:
+                ok = False
+                if started:
+                    raise
+                last_error = e
+                continue
+            finally:
+                self._finish(b, t0, ok)
+            return
+        raise last_error
+
+    def _failover(self, order: List[_Backend], call):
+        """Try `call(backend)` on each backend in order until one succeeds."""
+        last_error: Optional[Exception] = None
+        for i, b in enumerate(order):
+            if i:
+                with self._lock:
+                    self.failovers += 1
+            try:
+                return call(b)
+            except Exception as e:
+                log.warning("[router] %s failed: %s", b.name, e)
+                last_error = e
+        raise last_error
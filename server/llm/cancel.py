@@ -0,0 +1,113 @@
+# llm/cancel.py
+"""
+Cancellation for in-flight LLM calls.
+
+The relay creates one CancelToken per request and runs the call inside
+scope(token); whatever runs under it can see the token with current()
+(a contextvar, so it follows the call into asyncio.to_thread as well):
+
+- llm/http.py shuts down the socket of a blocking request, so a worker
+  stuck in requests.post() returns at once instead of waiting for the
+  backend to finish a reply nobody will read.
+- sleep() wakes up early (the mock provider's latency).
+- callers cancel queued futures / asyncio tasks via on_cancel().
+
+Cancelled derives from BaseException, like asyncio.CancelledError, so
+`except Exception` retry and failover code doesn't mistake it for a
+backend failure.
+"""
+from __future__ import annotations
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+
+class Cancelled(BaseException):
+    """The caller no longer wants the result."""
+
+
+class CancelToken:
+    """Thread-safe one-shot flag with callbacks."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._keys = itertools.count()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Fire the token (idempotent) and run the callbacks in this thread."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                log.warning("cancel callback failed: %s", e)
+
+    def on_cancel(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Call fn() when cancelled (now, if already); returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                key = next(self._keys)
+                self._callbacks[key] = fn
+                return lambda: self._callbacks.pop(key, None)
+        fn()
+        return lambda: None
+
+    def child(self) -> "CancelToken":
+        """A token that fires with this one but can also be cancelled alone."""
+        token = CancelToken()
+        token.on_cancel(self.on_cancel(token.cancel))
+        return token
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds: float) -> None:
+        """time.sleep() that raises Cancelled as soon as the token fires."""
+        if self._event.wait(seconds):
+            raise Cancelled()
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("llm_cancel_token", default=None)
+
+
+def current() -> Optional[CancelToken]:
+    """The token of the call running in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Run the block with `token` as current(); raises Cancelled if it already fired."""
+    if token is not None:
+        token.raise_if_cancelled()
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def sleep(seconds: float) -> None:
+    """Sleep, unless the current token fires first (then raise Cancelled)."""
+    token = current()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
@@ -3,17 +3,15 @@
 Factory for LLM adapters.
 
 - Reads config from environment variables (see below).
-- Imports adapters so their @register(...) decorators run (registry gets filled).
-- Returns a configured LLMClient instance by provider name.
+- Looks providers and layers up in the lazy registry (llm/registry.py):
+  only the modules actually configured get imported.
+- Returns a configured LLMClient instance by provider name, wrapped in the
+  layers named by LLM_LAYERS_<PROVIDER> (or LLM_LAYERS), e.g.
+  "singleflight,cache" (cache outermost: hits never wait on a flight).
+  The metrics layer goes innermost unless LLM_METRICS=0.
 """
 import os
-from .registry import PROVIDERS
-
-# Side-effect imports: ensure adapters register themselves into PROVIDERS.
-from .adapters import mock
-from .adapters import llama 
-from .adapters import llama_emb
-from .adapters import nlp
+from .registry import LAYERS, PROVIDERS
 
 def _load_cfg() -> dict:
     """Collect minimal config from env with sensible defaults."""
@@ -23,15 +21,58 @@ def _load_cfg() -> dict:
         "api_key":  os.getenv("LLM_API_KEY"),
         "model":    os.getenv("LLM_MODEL", "local-llama"),
         "timeout":  int(os.getenv("LLM_TIMEOUT", "120")),
+        # Pooled HTTP (see llm/http.py)
+        "pool_size":       int(os.getenv("LLM_POOL_SIZE", "10")),
+        "connect_timeout": float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+        "http2":           os.getenv("LLM_HTTP2", "1") == "1",
+        # Layers (see llm/layers/); per-provider LLM_LAYERS_<NAME> overrides this
+        "layers": os.getenv("LLM_LAYERS", ""),
+        "cache_max_bytes":     int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        "cache_ttl":           float(os.getenv("LLM_CACHE_TTL", "3600")),
+        "cache_db":            os.getenv("LLM_CACHE_DB") or None,
+        "cache_disk_bytes":    int(os.getenv("LLM_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))),
+        "cache_deterministic": os.getenv("LLM_CACHE_DETERMINISTIC", "0") == "1",
+        "metrics":             os.getenv("LLM_METRICS", "1") == "1",
+        # Mock provider (see llm/adapters/mock.py)
+        "mock_latency_ms":     float(os.getenv("LLM_MOCK_LATENCY_MS", "0")),
+        "mock_latency_dist":   os.getenv("LLM_MOCK_LATENCY_DIST", "fixed").lower(),
+        "mock_latency_sigma":  float(os.getenv("LLM_MOCK_LATENCY_SIGMA", "0")),
+        "mock_error_rate":     float(os.getenv("LLM_MOCK_ERROR_RATE", "0")),
+        "mock_seed":           int(os.getenv("LLM_MOCK_SEED", "0")),
+        "mock_images":         int(os.getenv("LLM_MOCK_IMAGES", "0")),
+        "mock_image_bytes":    int(os.getenv("LLM_MOCK_IMAGE_BYTES", str(256 * 1024))),
+        # Router provider (see llm/adapters/router.py)
+        "router_backends": os.getenv("LLM_ROUTER_BACKENDS", ""),
+        "router_policy":   os.getenv("LLM_ROUTER_POLICY", "least").lower(),
+        "router_hedge":    os.getenv("LLM_ROUTER_HEDGE", "0") == "1",
+        "router_cooldown": float(os.getenv("LLM_ROUTER_COOLDOWN", "5")),
+        "router_hedge_threads": int(os.getenv("LLM_ROUTER_HEDGE_THREADS", "0")),  # 0 = 2 × pool_size
     }
 
-def create_llm(provider: str | None = None):
+def create_llm(provider: str | None = None, **overrides):
     """
     Build and return an LLMClient for the requested provider.
+    `overrides` replace env config keys (e.g. base_url=... for one backend).
     """
-    cfg = _load_cfg()
+    cfg = {**_load_cfg(), **overrides}
     name = (provider or cfg["provider"]).lower()
     cls = PROVIDERS.get(name)
     if not cls:
-        raise ValueError(f"Unknown provider: {name}. Registered: {list(PROVIDERS)}")
-    return cls.from_config(cfg)
+        raise ValueError(f"Unknown provider: {name}. Registered: {PROVIDERS.names()}")
+    return _apply_layers(cls.from_config(cfg), name, cfg)
+
+def _apply_layers(llm, name: str, cfg: dict):
+    """Wrap `llm` in the configured layers, innermost (leftmost) first."""
+    spec = os.getenv(f"LLM_LAYERS_{name.upper()}", cfg["layers"])
+    # provider label of the layers' metrics (router backends pass their spec)
+    cfg = {**cfg, "metrics_name": cfg.get("metrics_name") or name}
+    if cfg["metrics"] and name != "router":  # router: its backends are measured
+        spec = "metrics," + spec
+    for layer in (x.strip().lower() for x in spec.split(",")):
+        if not layer:
+            continue
+        cls = LAYERS.get(layer)
+        if not cls:
+            raise ValueError(f"Unknown layer: {layer}. Registered: {LAYERS.names()}")
+        llm = cls.wrap(llm, cfg)
+    return llm
@@ -0,0 +1,198 @@
+# llm/http.py
+"""
+Pooled, keep-alive HTTP transport shared by the HTTP adapters.
+
+- post():  blocking, through one requests.Session per adapter so TCP/TLS
+           connections are reused instead of re-handshaking per request.
+- apost(): coroutine, through an httpx.AsyncClient when httpx is installed
+           (HTTP/2 if `h2` is installed too and LLM_HTTP2 is on); otherwise
+           post() is run in a worker thread.
+
+Both return response objects with the same surface the adapters use:
+status_code, headers, text, json(), raise_for_status().
+
+stream_lines() / astream_lines() POST and yield the response body line by
+line as it arrives (for server-sent-event streams).
+
+Blocking calls made under a CancelToken (llm/cancel.py) are abortable:
+the pooled connection they use is shut down when the token fires, and the
+call raises Cancelled. Async calls are aborted by cancelling their task.
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import importlib.util
+import socket
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import cancel
+
+# httpx (optional native async client) is imported on first async use only:
+# it is slow to import and the Qt server never needs it.
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
+HTTP2_AVAILABLE = HTTPX_AVAILABLE and importlib.util.find_spec("h2") is not None
+
+
+class _AbortablePool:
+    """Pool mixin: a connection taken under a CancelToken is shut down when it fires."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        token = cancel.current()
+        if token is not None:
+            conn.release_cancel = token.on_cancel(lambda: _shutdown(conn))
+        return conn
+
+    def _put_conn(self, conn):
+        release = getattr(conn, "release_cancel", None)
+        if release is not None:
+            conn.release_cancel = None  # back in the pool: no longer this call's
+            release()
+        super()._put_conn(conn)
+
+
+class _HTTPPool(_AbortablePool, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSPool(_AbortablePool, HTTPSConnectionPool):
+    pass
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+
+def _shutdown(conn) -> None:
+    """Unblock the thread waiting on `conn` (runs on the cancelling thread)."""
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+@contextmanager
+def _abortable():
+    """Turn the error of a request aborted by its CancelToken into Cancelled."""
+    token = cancel.current()
+    if token is not None:
+        token.raise_if_cancelled()
+    try:
+        yield
+    except (requests.RequestException, OSError) as e:
+        if token is not None and token.cancelled:
+            raise cancel.Cancelled() from e
+        raise
+
+
+class HttpTransport:
+    """Connection-pooled sync + async POST for one adapter."""
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0,
+                 timeout: float = 120.0, http2: bool = True):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        self.session = requests.Session()
+        adapter = _AbortableAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # httpx clients are bound to the loop they were created on.
+        self._aclient = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "HttpTransport":
+        """Build from factory config (pool_size/connect_timeout/timeout/http2)."""
+        return cls(
+            pool_size=cfg.get("pool_size", 10),
+            connect_timeout=cfg.get("connect_timeout", 5.0),
+            timeout=cfg.get("timeout", 120),
+            http2=cfg.get("http2", True),
+        )
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Blocking POST over the pooled session."""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.timeout))
+        with _abortable():
+            return self.session.post(url, **kwargs)
+
+    async def apost(self, url: str, **kwargs):
+        """Async POST; falls back to post() in a thread without httpx."""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.post, url, **kwargs)
+        return await self._async_client().post(url, **kwargs)
+
+    def stream_lines(self, url: str, **kwargs) -> Iterator[str]:
+        """Blocking streamed POST; yields decoded body lines as they arrive."""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.timeout))
+        with _abortable(), self.session.post(url, stream=True, **kwargs) as r:
+            r.raise_for_status()
+            r.encoding = r.encoding or "utf-8"
+            yield from r.iter_lines(decode_unicode=True)
+
+    async def astream_lines(self, url: str, **kwargs) -> AsyncIterator[str]:
+        """Async streamed POST; without httpx, stream_lines() is pumped from a thread."""
+        if HTTPX_AVAILABLE:
+            async with self._async_client().stream("POST", url, **kwargs) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    yield line
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def pump():
+            try:
+                for line in self.stream_lines(url, **kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, (line, None))
+                loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+
+        # copy_context: the pump thread sees the caller's CancelToken
+        loop.run_in_executor(None, contextvars.copy_context().run, pump)
+        while True:
+            line, err = await queue.get()
+            if line is done:
+                if err is not None:
+                    raise err
+                return
+            yield line
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            import httpx
+            self._aclient = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+            )
+            self._aclient_loop = loop
+        return self._aclient
+
+    def close(self) -> None:
+        self.session.close()
+
+    async def aclose(self) -> None:
+        """Close the async client's pooled connections (and the session's)."""
+        client, self._aclient = self._aclient, None
+        if client is not None and self._aclient_loop is asyncio.get_running_loop():
+            await client.aclose()  # bound to its loop: another loop can only drop it
+        self.close()
@@ -0,0 +1,7 @@
+# llm/layers/__init__.py
+"""
+Layers: LLMClients that wrap another LLMClient (the provider or another layer).
+
+Selected per process with LLM_LAYERS=a,b (applied left to right, so `b`
+wraps `a`) or per provider with LLM_LAYERS_<PROVIDER>=... (see factory.py).
+"""
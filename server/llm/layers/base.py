@@ -0,0 +1,70 @@
+# llm/layers/base.py
+"""
+Base class for layers plus the request key they share.
+
+- Layer: forwards every LLMClient call to `inner`; subclasses override
+  only what they change.
+- request_key(): stable hash of everything that determines a reply.
+"""
+from __future__ import annotations
+import hashlib
+import json
+from typing import AsyncIterator, Iterator, List, Optional
+
+from ..port import LLMClient, ChatMessage, ChatResponse
+
+
+def request_key(messages: List[ChatMessage], *, max_tokens: int,
+                temperature: float, model: Optional[str], scope: str = "") -> str:
+    """Hash normalized messages (role, whitespace-collapsed text) + options.
+
+    `scope` names who answers (provider, base_url, default model) when keys
+    outlive one client, e.g. in a cache file shared by several providers.
+    """
+    norm = [[m.role.strip().lower(), " ".join(m.content.split())] for m in messages]
+    blob = json.dumps([scope, norm, model, float(temperature), int(max_tokens)],
+                      ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class Layer(LLMClient):
+    """Transparent wrapper around another LLMClient."""
+
+    def __init__(self, inner: LLMClient):
+        self.inner = inner
+
+    @property
+    def deterministic(self) -> bool:
+        return self.inner.deterministic
+
+    @classmethod
+    def wrap(cls, inner: LLMClient, cfg: dict) -> "Layer":
+        """Build the layer around `inner` from factory config."""
+        return cls(inner)
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "Layer":
+        raise TypeError(f"{cls.__name__} is a layer; build it with wrap(inner, cfg)")
+
+    def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+             temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        return self.inner.chat(messages, max_tokens=max_tokens,
+                               temperature=temperature, model=model)
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        return await self.inner.achat(messages, max_tokens=max_tokens,
+                                      temperature=temperature, model=model)
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        return self.inner.stream_chat(messages, max_tokens=max_tokens,
+                                      temperature=temperature, model=model)
+
+    def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                     temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        return self.inner.astream_chat(messages, max_tokens=max_tokens,
+                                       temperature=temperature, model=model)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,311 @@
+# llm/layers/cache.py
+"""
+Response cache layer (LLM_LAYERS=cache).
+
+Identical requests (see base.request_key) are answered from cache instead
+of going through the backend again. Keys include the provider's identity
+(name, base_url, default model), so providers sharing an LLM_CACHE_DB
+never answer each other's requests. Only requests whose reply is
+reproducible are cached: temperature == 0, or a deterministic provider
+(LLMClient.deterministic, or LLM_CACHE_DETERMINISTIC=1 to force it). The
+image bridges are not marked deterministic: a prompt repeated for more
+samples should get new images unless the operator opts in.
+
+Streamed replies are text only (no `raw`), so they are cached under keys
+of their own: chat() never gets a stream's text back in place of an
+image bridge's JSON reply.
+
+Tiers:
+- memory: LRU bounded by LLM_CACHE_MAX_BYTES (approximate payload bytes).
+- disk:   optional sqlite file (LLM_CACHE_DB) bounded by LLM_CACHE_DISK_BYTES,
+          consulted on a memory miss and shared across restarts.
+Entries expire after LLM_CACHE_TTL seconds (0 = never). Counters are
+available from stats() and, per provider, on /metrics:
+
+- llm_cache_hits_total{provider,tier} / llm_cache_misses_total{provider}
+- llm_cache_bypassed_total{provider}  not cacheable (sampling temperature)
+- llm_cache_evictions_total{provider,tier} / llm_cache_expired_total{provider}
+- llm_cache_bytes{provider}           memory tier size (gauge)
+"""
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional
+
+from .. import metrics
+from ..port import LLMClient, ChatMessage, ChatResponse, JSONResponse
+from ..registry import register_layer
+from .base import Layer, request_key
+
+HITS = metrics.counter("llm_cache_hits_total", "Requests answered from the response cache.",
+                       ["provider", "tier"])
+MISSES = metrics.counter("llm_cache_misses_total", "Cacheable requests sent upstream.",
+                         ["provider"])
+BYPASSED = metrics.counter("llm_cache_bypassed_total",
+                           "Requests the cache could not serve (sampling temperature).",
+                           ["provider"])
+EVICTIONS = metrics.counter("llm_cache_evictions_total", "Cache entries dropped for space.",
+                            ["provider", "tier"])
+EXPIRED = metrics.counter("llm_cache_expired_total", "Cache entries dropped for TTL.",
+                          ["provider"])
+BYTES = metrics.gauge("llm_cache_bytes", "Approximate size of the memory cache tier.",
+                      ["provider"])
+
+
+class _Entry(NamedTuple):
+    expires: float  # 0 = never
+    size: int
+    text: Optional[str]   # None for a JSONResponse: rebuilt from raw when read
+    raw: Optional[dict]
+
+    def response(self) -> ChatResponse:
+        if self.text is None:
+            return JSONResponse(self.raw)
+        return ChatResponse(text=self.text, raw=self.raw)
+
+
+class _DiskTier:
+    """sqlite-backed second tier, LRU-evicted by last access time."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # no fsync per lookup
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, expires REAL, atime REAL,"
+            " size INTEGER, text TEXT, raw TEXT)")
+        self._db.commit()
+
+    def get(self, key: str, now: float) -> Optional[_Entry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires, size, text, raw FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            expires, size, text, raw = row
+            if expires and expires <= now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE cache SET atime = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return _Entry(expires, size, text, json.loads(raw) if raw else None)
+
+    def put(self, key: str, entry: _Entry, raw_json: Optional[str], now: float) -> int:
+        """Store an entry; return how many old entries were evicted."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.expires, now, entry.size, entry.text, raw_json))
+            evicted = 0
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            while total > self.max_bytes:
+                row = self._db.execute(
+                    "SELECT key, size FROM cache ORDER BY atime LIMIT 1").fetchone()
+                if row is None or row[0] == key:
+                    break
+                self._db.execute("DELETE FROM cache WHERE key = ?", (row[0],))
+                total -= row[1]
+                evicted += 1
+            self._db.commit()
+        return evicted
+
+
+@register_layer("cache")
+class CacheLayer(Layer):
+    """LRU (+ optional sqlite) cache in front of a provider."""
+
+    def __init__(self, inner: LLMClient, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 3600.0, db_path: Optional[str] = None,
+                 disk_bytes: int = 1024 * 1024 * 1024, force_deterministic: bool = False,
+                 provider: str = "", scope: str = ""):
+        super().__init__(inner)
+        self.provider = provider
+        self.scope = scope or provider
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.force_deterministic = force_deterministic
+        self._mem: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _DiskTier(db_path, disk_bytes) if db_path else None
+
+        self.hits = 0        # served from memory
+        self.disk_hits = 0   # served from sqlite (and promoted to memory)
+        self.misses = 0      # went to the backend
+        self.bypassed = 0    # not cacheable (sampling temperature)
+        self.evictions = 0   # dropped for space (both tiers)
+        self.expired = 0     # dropped for TTL (memory tier)
+
+    @classmethod
+    def wrap(cls, inner: LLMClient, cfg: dict) -> "CacheLayer":
+        return cls(
+            inner,
+            max_bytes=cfg.get("cache_max_bytes", 64 * 1024 * 1024),
+            ttl=cfg.get("cache_ttl", 3600.0),
+            db_path=cfg.get("cache_db"),
+            disk_bytes=cfg.get("cache_disk_bytes", 1024 * 1024 * 1024),
+            force_deterministic=cfg.get("cache_deterministic", False),
+            provider=cfg.get("metrics_name", ""),
+            scope=_scope(cfg),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "bypassed": self.bypassed,
+                "evictions": self.evictions, "expired": self.expired,
+                "entries": len(self._mem), "bytes": self._mem_bytes,
+            }
+
+    # ---------- LLMClient ----------
+
+    def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+             temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        key = self._key(messages, max_tokens, temperature, model)
+        if key is None:
+            return self.inner.chat(messages, max_tokens=max_tokens,
+                                   temperature=temperature, model=model)
+        hit = self._get(key)
+        if hit is not None:
+            return hit
+        reply = self.inner.chat(messages, max_tokens=max_tokens,
+                                temperature=temperature, model=model)
+        self._put(key, reply)
+        return reply
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        key = self._key(messages, max_tokens, temperature, model)
+        if key is None:
+            return await self.inner.achat(messages, max_tokens=max_tokens,
+                                          temperature=temperature, model=model)
+        hit = self._get(key)
+        if hit is not None:
+            return hit
+        reply = await self.inner.achat(messages, max_tokens=max_tokens,
+                                       temperature=temperature, model=model)
+        self._put(key, reply)
+        return reply
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        key = self._key(messages, max_tokens, temperature, model, stream=True)
+        hit = self._get(key) if key is not None else None
+        if hit is not None:
+            yield hit.text
+            return
+        parts = []
+        for chunk in self.inner.stream_chat(messages, max_tokens=max_tokens,
+                                            temperature=temperature, model=model):
+            parts.append(chunk)
+            yield chunk
+        if key is not None:
+            self._put(key, ChatResponse(text="".join(parts)))
+
+    async def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                           temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        key = self._key(messages, max_tokens, temperature, model, stream=True)
+        hit = self._get(key) if key is not None else None
+        if hit is not None:
+            yield hit.text
+            return
+        parts = []
+        async for chunk in self.inner.astream_chat(messages, max_tokens=max_tokens,
+                                                   temperature=temperature, model=model):
+            parts.append(chunk)
+            yield chunk
+        if key is not None:
+            self._put(key, ChatResponse(text="".join(parts)))
+
+    # ---------- internals ----------
+
+    def _key(self, messages, max_tokens, temperature, model,
+             stream: bool = False) -> Optional[str]:
+        """Cache key, or None (counted as bypassed) if the reply may vary."""
+        if temperature != 0 and not (self.force_deterministic or self.inner.deterministic):
+            with self._lock:
+                self.bypassed += 1
+            BYPASSED.inc(provider=self.provider)
+            return None
+        scope = self.scope + "\nstream" if stream else self.scope
+        return request_key(messages, max_tokens=max_tokens,
+                           temperature=temperature, model=model, scope=scope)
+
+    def _get(self, key: str) -> Optional[ChatResponse]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry.expires and entry.expires <= now:
+                    self._drop(key)
+                    self.expired += 1
+                    EXPIRED.inc(provider=self.provider)
+                else:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    HITS.inc(provider=self.provider, tier="memory")
+                    return entry.response()
+        if self._disk is not None:
+            entry = self._disk.get(key, now)
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._insert(key, entry)
+                HITS.inc(provider=self.provider, tier="disk")
+                return entry.response()
+        with self._lock:
+            self.misses += 1
+        MISSES.inc(provider=self.provider)
+        return None
+
+    def _put(self, key: str, reply: ChatResponse) -> None:
+        now = time.time()
+        raw_json = json.dumps(reply.raw, ensure_ascii=False) if reply.raw is not None else None
+        # A JSONResponse's text is raw again: don't build or keep it twice
+        text = None if isinstance(reply, JSONResponse) else reply.text
+        size = len(text.encode("utf-8")) if text is not None else 0
+        size += len(raw_json or "")
+        entry = _Entry(now + self.ttl if self.ttl else 0.0, size, text, reply.raw)
+        with self._lock:
+            self._insert(key, entry)
+        if self._disk is not None:
+            evicted = self._disk.put(key, entry, raw_json, now)
+            with self._lock:
+                self.evictions += evicted
+            if evicted:
+                EVICTIONS.inc(evicted, provider=self.provider, tier="disk")
+
+    def _insert(self, key: str, entry: _Entry) -> None:
+        """Add to the memory LRU and evict from the cold end (lock held)."""
+        if entry.size > self.max_bytes:
+            return  # would evict everything else; the disk tier may still keep it
+        if key in self._mem:
+            self._drop(key)
+        self._mem[key] = entry
+        self._mem_bytes += entry.size
+        while self._mem_bytes > self.max_bytes:
+            old_key, _ = next(iter(self._mem.items()))
+            self._drop(old_key)
+            self.evictions += 1
+            EVICTIONS.inc(provider=self.provider, tier="memory")
+        BYTES.set(self._mem_bytes, provider=self.provider)
+
+    def _drop(self, key: str) -> None:
+        self._mem_bytes -= self._mem.pop(key).size
+        BYTES.set(self._mem_bytes, provider=self.provider)
+
+
+def _scope(cfg: dict) -> str:
+    """Identity of the provider behind the cache: who would answer a request."""
+    name = cfg.get("metrics_name", "")
+    if name == "router":
+        return json.dumps([name, cfg.get("router_backends", "")])
+    return json.dumps([name, cfg.get("base_url", ""), cfg.get("model", "")])
@@ -0,0 +1,113 @@
+# llm/layers/metrics.py
+"""
+Metrics layer (on by default, LLM_METRICS=0 to disable).
+
+The factory puts it directly around each provider, below any other layer,
+so it measures real upstream calls only (cache hits and coalesced requests
+never reach it). Per provider it records:
+
+- llm_requests_total / llm_errors_total / llm_cancelled_total
+- llm_inflight (gauge)
+- llm_upstream_seconds (histogram; streams: time until the last chunk)
+
+A stream the consumer closes before its end (client gone, CANCEL) counts
+as cancelled, not as an error.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+from .. import cancel, metrics
+from ..port import LLMClient, ChatMessage, ChatResponse
+from ..registry import register_layer
+from .base import Layer
+
+REQUESTS = metrics.counter("llm_requests_total", "Upstream LLM calls.", ["provider", "op"])
+ERRORS = metrics.counter("llm_errors_total", "Upstream LLM calls that raised.", ["provider", "op"])
+CANCELLED = metrics.counter("llm_cancelled_total", "Upstream LLM calls aborted by the caller.",
+                            ["provider", "op"])
+INFLIGHT = metrics.gauge("llm_inflight", "Upstream LLM calls in progress.", ["provider"])
+UPSTREAM = metrics.histogram("llm_upstream_seconds", "Upstream LLM call latency.", ["provider", "op"])
+
+
+@register_layer("metrics")
+class MetricsLayer(Layer):
+    """Counts and times every call into `inner`."""
+
+    def __init__(self, inner: LLMClient, provider: str = ""):
+        super().__init__(inner)
+        self.provider = provider
+
+    @classmethod
+    def wrap(cls, inner: LLMClient, cfg: dict) -> "MetricsLayer":
+        return cls(inner, provider=cfg.get("metrics_name", ""))
+
+    def _start(self, op: str) -> float:
+        REQUESTS.inc(provider=self.provider, op=op)
+        INFLIGHT.inc(provider=self.provider)
+        return time.perf_counter()
+
+    def _end(self, op: str, t0: float, outcome: str) -> None:
+        INFLIGHT.dec(provider=self.provider)
+        if outcome == "cancelled":
+            CANCELLED.inc(provider=self.provider, op=op)
+            return  # not a latency sample: the call was cut short
+        UPSTREAM.observe(time.perf_counter() - t0, provider=self.provider, op=op)
+        if outcome == "error":
+            ERRORS.inc(provider=self.provider, op=op)
+
+    def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+             temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        t0, outcome = self._start("chat"), "error"
+        try:
+            reply = self.inner.chat(messages, max_tokens=max_tokens,
+                                    temperature=temperature, model=model)
+            outcome = "ok"
+            return reply
+        except (cancel.Cancelled, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            self._end("chat", t0, outcome)
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        t0, outcome = self._start("chat"), "error"
+        try:
+            reply = await self.inner.achat(messages, max_tokens=max_tokens,
+                                           temperature=temperature, model=model)
+            outcome = "ok"
+            return reply
+        except (cancel.Cancelled, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            self._end("chat", t0, outcome)
+
+    def stream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> Iterator[str]:
+        t0, outcome = self._start("stream"), "error"
+        try:
+            yield from self.inner.stream_chat(messages, max_tokens=max_tokens,
+                                              temperature=temperature, model=model)
+            outcome = "ok"
+        except (cancel.Cancelled, asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"  # GeneratorExit: the consumer stopped reading early
+            raise
+        finally:
+            self._end("stream", t0, outcome)
+
+    async def astream_chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                           temperature: float = 0.2, model: Optional[str] = None) -> AsyncIterator[str]:
+        t0, outcome = self._start("stream"), "error"
+        try:
+            async for chunk in self.inner.astream_chat(messages, max_tokens=max_tokens,
+                                                       temperature=temperature, model=model):
+                yield chunk
+            outcome = "ok"
+        except (cancel.Cancelled, asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"  # GeneratorExit: the consumer stopped reading early
+            raise
+        finally:
+            self._end("stream", t0, outcome)
@@ -0,0 +1,188 @@
+# llm/layers/singleflight.py
+"""
+Single-flight layer (LLM_LAYERS=singleflight).
+
+While a request is in flight upstream, identical requests (same
+base.request_key) wait for it instead of issuing their own call, and every
+waiter receives the same ChatResponse (or the same exception). Unlike the
+cache nothing is kept afterwards, so this is safe for sampling providers
+too: callers that arrive together simply share one sample.
+
+Enable it for one backend only with LLM_LAYERS_<PROVIDER>=singleflight.
+Streaming requests pass through uncoalesced. stats() reports how many
+upstream calls were made and how many were saved, also exported per
+provider as llm_singleflight_calls_total / llm_singleflight_saved_total.
+
+A shared call is cancelled upstream only once every caller waiting on it
+has cancelled, and a request arriving after that starts a call of its
+own. A follower that cancels stops waiting at once. The leader is
+different in the blocking path: the upstream call runs on the leader's
+own thread, so a cancelled leader keeps blocking until the call ends
+while followers remain, and only then raises Cancelled (with no
+followers left its cancel aborts the call at once). In the async path every
+caller, leader included, stops waiting at once.
+"""
+from __future__ import annotations
+import asyncio
+import copy
+import threading
+from typing import Dict, List, Optional
+
+from .. import cancel, metrics
+from ..port import LLMClient, ChatMessage, ChatResponse
+from ..registry import register_layer
+from .base import Layer, request_key
+
+CALLS = metrics.counter("llm_singleflight_calls_total",
+                        "Upstream calls made by the single-flight layer.", ["provider"])
+SAVED = metrics.counter("llm_singleflight_saved_total",
+                        "Requests answered by another request's upstream call.", ["provider"])
+
+
+class _Call:
+    """One upstream call shared by a leader thread and its followers."""
+    __slots__ = ("done", "result", "error", "token", "waiters", "wakes")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[ChatResponse] = None
+        self.error: Optional[BaseException] = None
+        self.token = cancel.CancelToken()  # the upstream call runs under this
+        self.waiters = 0                   # callers that have not cancelled
+        self.wakes: List[threading.Event] = []  # one per caller: set on done or its cancel
+
+
+class _AsyncCall:
+    """One upstream task shared by several coroutines."""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+@register_layer("singleflight")
+class SingleFlightLayer(Layer):
+    """Coalesces identical concurrent requests into one upstream call."""
+
+    def __init__(self, inner: LLMClient, provider: str = ""):
+        super().__init__(inner)
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._acalls: Dict[str, _AsyncCall] = {}
+        self.calls = 0   # upstream calls actually made
+        self.shared = 0  # requests answered by someone else's call
+
+    @classmethod
+    def wrap(cls, inner: LLMClient, cfg: dict) -> "SingleFlightLayer":
+        return cls(inner, provider=cfg.get("metrics_name", ""))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared,
+                    "in_flight": len(self._calls) + len(self._acalls)}
+
+    def chat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+             temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        key = request_key(messages, max_tokens=max_tokens,
+                          temperature=temperature, model=model)
+        woken = threading.Event()
+        with self._lock:
+            call = self._calls.get(key)
+            # No waiters left: the call is being cancelled upstream, don't join it
+            leader = call is None or call.waiters == 0
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+            call.waiters += 1
+            call.wakes.append(woken)
+        (CALLS if leader else SAVED).inc(provider=self.provider)
+        mine = cancel.current()
+        release = mine.on_cancel(lambda: self._leave(call, woken)) if mine is not None else None
+
+        try:
+            if not leader:
+                woken.wait()
+                if not call.done.is_set():
+                    raise cancel.Cancelled()  # we cancelled; the call goes on for the others
+                if call.error is not None:
+                    raise _fresh(call.error) from call.error
+                return call.result
+
+            try:
+                with cancel.scope(call.token):
+                    call.result = self.inner.chat(messages, max_tokens=max_tokens,
+                                                  temperature=temperature, model=model)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:  # not replaced after being abandoned
+                        del self._calls[key]
+                call.done.set()
+                for wake in call.wakes:  # nobody joins once it is out of _calls
+                    wake.set()
+            if mine is not None:
+                mine.raise_if_cancelled()  # finished for the followers, not for us
+            return call.result
+        finally:
+            if release is not None:
+                release()
+
+    def _leave(self, call: _Call, woken: threading.Event) -> None:
+        """A caller cancelled: abort upstream if it was the last one waiting."""
+        with self._lock:
+            call.waiters -= 1
+            abandoned = call.waiters == 0
+        woken.set()
+        if abandoned:
+            call.token.cancel()
+
+    async def achat(self, messages: List[ChatMessage], *, max_tokens: int = 500,
+                    temperature: float = 0.2, model: Optional[str] = None) -> ChatResponse:
+        key = request_key(messages, max_tokens=max_tokens,
+                          temperature=temperature, model=model)
+        with self._lock:
+            call = self._acalls.get(key)
+            if call is None or call.waiters == 0:  # none, or cancelled by its last waiter
+                task = asyncio.ensure_future(self.inner.achat(
+                    messages, max_tokens=max_tokens, temperature=temperature, model=model))
+                call = self._acalls[key] = _AsyncCall(task)
+                task.add_done_callback(lambda _t: self._forget(key, call))
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+            call.waiters += 1
+        (CALLS if leader else SAVED).inc(provider=self.provider)
+
+        try:
+            # shield: one waiter going away must not cancel the others' call
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done():
+                with self._lock:
+                    call.waiters -= 1
+                    abandoned = call.waiters == 0
+                if abandoned:
+                    call.task.cancel()  # nobody is left to receive the reply
+            raise
+
+    def _forget(self, key: str, call: _AsyncCall) -> None:
+        with self._lock:
+            if self._acalls.get(key) is call:
+                del self._acalls[key]
+
+
+def _fresh(error: BaseException) -> BaseException:
+    """A copy of `error` to raise in one more thread (raising one object in
+    several threads at once races on its __traceback__)."""
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
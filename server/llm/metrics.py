@@ -0,0 +1,205 @@
+# llm/metrics.py
+"""
+In-process metrics: counters, gauges and latency histograms.
+
+Every metric lives in REGISTRY and is rendered by render() in the
+Prometheus text format (served on /metrics by relay/monitor.py).
+
+- Counter:   monotonically increasing, e.g. requests and bytes.
+- Gauge:     goes up and down, e.g. requests in flight.
+- Histogram: HDR-style log-linear buckets. Bucket bounds grow by 2^(1/4)
+             (~19% apart), so every recorded value lands in O(1) and the
+             relative error stays the same from microseconds to minutes.
+
+Metrics take optional labels, passed as keywords:
+    REQUESTS.inc(provider="llama")
+All updates are thread-safe and cheap (one lock, a dict lookup).
+"""
+from __future__ import annotations
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[str, ...]
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, kw: Dict[str, str]) -> LabelKey:
+        return tuple(str(kw.get(label, "")) for label in self.labels)
+
+    def _label_str(self, key: LabelKey, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._label_str(k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class _Buckets:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Log-linear latency histogram (seconds by default)."""
+
+    type = "histogram"
+
+    def __init__(self, name, doc, labels=(), lowest: float = 50e-6,
+                 highest: float = 600.0, steps_per_doubling: int = 4):
+        super().__init__(name, doc, labels)
+        self._lowest = lowest
+        self._log_factor = math.log(2) / steps_per_doubling
+        n = int(math.ceil(math.log(highest / lowest) / self._log_factor)) + 1
+        self.bounds = [lowest * math.exp(i * self._log_factor) for i in range(n)]
+        self._series: Dict[LabelKey, _Buckets] = {}
+
+    def _index(self, value: float) -> int:
+        if value <= self._lowest:
+            return 0
+        i = int(math.ceil(math.log(value / self._lowest) / self._log_factor - 1e-9))
+        return min(i, len(self.bounds))  # len(bounds) = the +Inf bucket
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = self._index(value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = _Buckets(len(self.bounds) + 1)
+            s.counts[i] += 1
+            s.total += value
+            s.count += 1
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        with self._lock:
+            s = self._series.get(self._key(labels))
+            if s is None or not s.count:
+                return None
+            counts = list(s.counts)
+            rank = q * s.count
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                return self.bounds[i] if i < len(self.bounds) else math.inf
+        return math.inf
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(s.counts), s.total, s.count) for k, s in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            seen = 0
+            for bound, c in zip(self.bounds, counts):
+                seen += c
+                le = self._label_str(key, 'le="%.6g"' % bound)
+                lines.append(f"{self.name}_bucket{le} {seen}")
+            le = self._label_str(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total:.9g}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, doc, labels, **kw):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, doc, labels, **kw)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.type}")
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for m in metrics:
+            out.append(f"# HELP {m.name} {m.doc}")
+            out.append(f"# TYPE {m.name} {m.type}")
+            out.extend(m.render())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+    """Get or create a counter in REGISTRY (same name → same object)."""
+    return REGISTRY._get(Counter, name, doc, labels)
+
+
+def gauge(name: str, doc: str, labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY._get(Gauge, name, doc, labels)
+
+
+def histogram(name: str, doc: str, labels: Sequence[str] = (), **kw) -> Histogram:
+    return REGISTRY._get(Histogram, name, doc, labels, **kw)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    return REGISTRY.render()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
@@ -2,14 +2,24 @@
 """
 Generic LLM interface (the PORT) used by your app and all adapters.
 
-- ChatMessage / ChatResponse: simple DTOs.
+- ChatMessage / ChatResponse: simple DTOs. JSONResponse is a ChatResponse
+  for JSON reply bodies (the image bridges) whose `text` is only built
+  when read, so a multi-MB reply is held once, as `raw`.
 - LLMClient: abstract contract every adapter must implement.
+  `chat` is required; `achat` defaults to running `chat` in a worker thread
+  and is overridden by adapters that can do native async I/O.
+  `stream_chat` / `astream_chat` yield the reply in text chunks; by default
+  the whole reply arrives as a single chunk.
+- Calls may be cancelled by the caller (llm/cancel.py): blocking I/O done
+  through llm/http.py, or waits through cancel.sleep(), then raises Cancelled.
 """
 
 from __future__ import annotations
+import asyncio
+import json
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, Iterator, List, Optional, Dict, Any
 
 @dataclass
 class ChatMessage:
@@ -23,9 +33,23 @@ class ChatResponse:
     text: str
     raw: Optional[Dict[str, Any]] = None
 
+class JSONResponse(ChatResponse):
+    """ChatResponse whose `text` is `raw` serialized on demand."""
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw = raw
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self.raw, ensure_ascii=False)
+
 class LLMClient(ABC):
     """Abstract LLM client: adapters inherit and provide concrete behavior."""
 
+    # True when the reply depends only on the request (not on sampling),
+    # so identical requests may share a cached response.
+    deterministic: bool = False
+
     @abstractmethod
     def chat(self, messages: List[ChatMessage], *,
              max_tokens: int = 500, temperature: float = 0.2,
@@ -33,6 +57,31 @@ class LLMClient(ABC):
         """Send messages and return a normalized ChatResponse."""
         ...
 
+    async def achat(self, messages: List[ChatMessage], *,
+                    max_tokens: int = 500, temperature: float = 0.2,
+                    model: Optional[str] = None) -> ChatResponse:
+        """Async `chat`. Default: run the blocking `chat` in the loop's executor."""
+        return await asyncio.to_thread(self.chat, messages, max_tokens=max_tokens,
+                                       temperature=temperature, model=model)
+
+    def stream_chat(self, messages: List[ChatMessage], *,
+                    max_tokens: int = 500, temperature: float = 0.2,
+                    model: Optional[str] = None) -> Iterator[str]:
+        """Yield the reply text in chunks as the backend produces them."""
+        yield self.chat(messages, max_tokens=max_tokens,
+                        temperature=temperature, model=model).text
+
+    async def astream_chat(self, messages: List[ChatMessage], *,
+                           max_tokens: int = 500, temperature: float = 0.2,
+                           model: Optional[str] = None) -> AsyncIterator[str]:
+        """Async `stream_chat`. Default: the whole `achat` reply as one chunk."""
+        reply = await self.achat(messages, max_tokens=max_tokens,
+                                 temperature=temperature, model=model)
+        yield reply.text
+
+    async def aclose(self) -> None:
+        """Release pooled connections at shutdown (adapters with an HTTP pool)."""
+
     @classmethod
     @abstractmethod
     def from_config(cls, cfg: dict) -> "LLMClient":
@@ -43,3 +92,7 @@ class LLMClient(ABC):
     def chat_text(self, text: str, **opts) -> ChatResponse:
         """Convenience: send a single user string (wraps it into ChatMessage)."""
         return self.chat([ChatMessage(role="user", content=text)], **opts)
+
+    async def achat_text(self, text: str, **opts) -> ChatResponse:
+        """Async `chat_text`."""
+        return await self.achat([ChatMessage(role="user", content=text)], **opts)
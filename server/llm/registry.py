@@ -1,15 +1,94 @@
-# llm/registry.py
-"""Tiny registry for LLM adapters.
-Note: the factory must import adapter modules so their decorators run.
+"""Lazy registry for LLM adapters and the layers that wrap them.
+
+- PROVIDERS: backends (`LLM_PROVIDER=...`), built with `from_config(cfg)`.
+- LAYERS:    wrappers stacked on top of a provider (`LLM_LAYERS=...`),
+             built with `wrap(inner, cfg)`.
+
+Built-ins are declared below as name → "module:Class" and imported only
+when create_llm() first asks for them, so startup cost doesn't grow with
+the number of providers (check with `python import_profile.py`).
+Third-party packages can add more through the entry-point groups
+"sem_relay.providers" / "sem_relay.layers" (value "package.module:Class").
+Modules may still self-register with @register / @register_layer.
 """
-from typing import Dict, Type
+import importlib
+from importlib import metadata
+from typing import Dict, List, Optional, Type
 from .port import LLMClient
 
-PROVIDERS: Dict[str, Type[LLMClient]] = {}
+
+class LazyRegistry:
+    """name → class, importing "module:Class" targets on first lookup."""
+
+    def __init__(self, group: str, builtins: Dict[str, str]):
+        self.group = group
+        self._targets: Dict[str, str] = dict(builtins)
+        self._loaded: Dict[str, Type[LLMClient]] = {}
+        self._scanned = False
+
+    def add(self, name: str, cls: Type[LLMClient]) -> None:
+        self._loaded[name.lower()] = cls
+
+    def declare(self, name: str, target: str) -> None:
+        """Register "module:Class" (relative modules resolve against llm/)."""
+        self._targets[name.lower()] = target
+
+    def get(self, name: str) -> Optional[Type[LLMClient]]:
+        name = name.lower()
+        cls = self._loaded.get(name)
+        if cls is not None:
+            return cls
+        if name not in self._targets:
+            self._scan_entry_points()  # only pay for the scan on an unknown name
+        target = self._targets.get(name)
+        if target is None:
+            return None
+        module, _, attr = target.partition(":")
+        cls = getattr(importlib.import_module(module, __package__), attr)
+        self._loaded[name] = cls
+        return cls
+
+    def names(self) -> List[str]:
+        self._scan_entry_points()
+        return sorted(set(self._targets) | set(self._loaded))
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.names()
+
+    def _scan_entry_points(self) -> None:
+        if self._scanned:
+            return
+        self._scanned = True
+        for ep in metadata.entry_points(group=self.group):
+            self._targets.setdefault(ep.name.lower(), ep.value)
+
+
+PROVIDERS = LazyRegistry("sem_relay.providers", {
+    "mock":      ".adapters.mock:MockAdapter",
+    "llama":     ".adapters.llama:LlamaAdapter",
+    "llama_emb": ".adapters.llama_emb:BridgeLLMAdapter",
+    "nlp":       ".adapters.nlp:BridgeNLPAdapter",
+    "router":    ".adapters.router:RouterAdapter",
+})
+LAYERS = LazyRegistry("sem_relay.layers", {
+    "cache":        ".layers.cache:CacheLayer",
+    "singleflight": ".layers.singleflight:SingleFlightLayer",
+    "metrics":      ".layers.metrics:MetricsLayer",
+})
 
 def register(name: str):
     """Class decorator: register adapter under 'name' (case-insensitive)."""
     def deco(cls: Type[LLMClient]):
-        PROVIDERS[name.lower()] = cls
+        PROVIDERS.add(name, cls)
+        return cls
+    return deco
+
+def register_layer(name: str):
+    """Class decorator: register a wrapping layer under 'name' (case-insensitive)."""
+    def deco(cls: Type[LLMClient]):
+        LAYERS.add(name, cls)
         return cls
     return deco
@@ -0,0 +1,100 @@
+# llm/synthetic.py
+"""
+Synthetic backend behaviour for load tests, shared by the mock provider
+(llm/adapters/mock.py) and the HTTP stand-in (mock_backend.py).
+
+- Latency:   per-call delay drawn from a fixed, normal or lognormal
+             distribution (lognormal gives the long tail real backends
+             have), from a seeded RNG so runs are reproducible.
+- Faults:    raise an injected error with probability `error_rate`.
+- png():     a valid PNG of roughly the requested size (incompressible
+             noise stored uncompressed), so payload costs are realistic.
+- images_payload(): the bridge's {"images_base64": [...], "mime"} reply.
+"""
+from __future__ import annotations
+import base64
+import math
+import random
+import struct
+import threading
+import zlib
+from functools import lru_cache
+from typing import List
+
+
+class InjectedError(RuntimeError):
+    """Failure produced on purpose by error_rate."""
+
+
+class Latency:
+    """Seeded delay sampler: dist is "fixed", "normal" or "lognormal"."""
+
+    DISTS = ("fixed", "normal", "lognormal")
+
+    def __init__(self, mean_ms: float = 0.0, dist: str = "fixed", sigma: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        if dist not in self.DISTS:
+            raise ValueError(f"Unknown latency distribution: {dist}. Supported: {list(self.DISTS)}")
+        self.mean = mean_ms / 1000
+        self.dist = dist
+        self.sigma = sigma  # normal: stddev in ms; lognormal: sigma of log(latency)
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "Latency":
+        return cls(mean_ms=cfg.get("mock_latency_ms", 0.0),
+                   dist=cfg.get("mock_latency_dist", "fixed"),
+                   sigma=cfg.get("mock_latency_sigma", 0.0),
+                   error_rate=cfg.get("mock_error_rate", 0.0),
+                   seed=cfg.get("mock_seed", 0))
+
+    def sample(self) -> float:
+        """Seconds to wait for one call (never negative)."""
+        if not self.mean:
+            return 0.0
+        with self._lock:
+            if self.dist == "normal":
+                return max(0.0, self._rng.gauss(self.mean, self.sigma / 1000))
+            if self.dist == "lognormal":
+                # mu chosen so the distribution's mean stays mean_ms
+                mu = math.log(self.mean) - self.sigma ** 2 / 2
+                return self._rng.lognormvariate(mu, self.sigma)
+        return self.mean
+
+    def maybe_fail(self) -> None:
+        """Raise InjectedError with probability error_rate."""
+        if not self.error_rate:
+            return
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise InjectedError(f"mock: injected error (rate {self.error_rate:g})")
+
+
+@lru_cache(maxsize=64)
+def png(nbytes: int, index: int = 0) -> bytes:
+    """A noise PNG of about `nbytes` bytes (cached: same size+index, same bytes)."""
+    side = max(1, int(math.sqrt(max(nbytes, 3) / 3)))
+    rng = random.Random(index)
+    rows = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack("!I", len(data)) + tag + data + struct.pack("!I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack("!IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 0))
+            + chunk(b"IEND", b""))
+
+
+@lru_cache(maxsize=64)
+def _b64_images(count: int, nbytes: int) -> tuple:
+    return tuple(base64.b64encode(png(nbytes, i)).decode("ascii") for i in range(count))
+
+
+def images_payload(count: int, nbytes: int) -> dict:
+    """Bridge-shaped reply with `count` PNGs of ~`nbytes` each."""
+    images: List[str] = list(_b64_images(count, nbytes))
+    return {"images_base64": images, "mime": "image/png"}
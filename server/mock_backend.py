@@ -0,0 +1,155 @@
+"""
+Offline HTTP stand-in for the backends the relay and the bridge talk to.
+
+Serves, with the same latency / error / payload knobs as the mock provider
+(llm/synthetic.py):
+
+  POST /v1/text-to-image     → {"images_base64": [...], "mime": "image/png"}
+                               (the bridge's reply; for llama_emb / nlp)
+  POST /v1/embeddings        → OpenAI-style {"data": [{"embedding", "index"}]}
+                               (what the bridge asks llama-server for)
+  POST /v1/chat/completions  → OpenAI-style chat reply, SSE with "stream": true
+                               (for LLM_PROVIDER=llama)
+  GET  /health
+
+Injected errors answer HTTP 500. Connections are kept alive (HTTP/1.1), so
+pooled clients behave as against a real server.
+
+  python mock_backend.py --port 8090 --latency-ms 800 --dist lognormal --sigma 0.5 \
+      --images 2 --image-bytes 300000 --error-rate 0.01
+  LLM_PROVIDER=llama_emb LLM_BASE_URL=http://127.0.0.1:8090 LLM_MODEL=x python server.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm.synthetic import InjectedError, Latency, images_payload
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    opts = None                    # argparse namespace, set in main()
+    latency = None                 # shared Latency
+
+    # ---------- plumbing ----------
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        size = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(size) or b"{}")
+
+    def log_message(self, fmt, *args):
+        if self.opts.verbose:
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json({"status": "ok"})
+        else:
+            self._send_json({"detail": "not found"}, 404)
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_json({"detail": "invalid JSON"}, 400)
+            return
+        route = self.path.split("?")[0].rstrip("/")
+        for suffix, handler in (("/text-to-image", self.text_to_image),
+                                ("/embeddings", self.embeddings),
+                                ("/chat/completions", self.chat)):
+            if route.endswith(suffix):
+                break
+        else:
+            self._send_json({"detail": "not found"}, 404)
+            return
+        time.sleep(self.latency.sample())
+        try:
+            self.latency.maybe_fail()
+        except InjectedError as e:
+            self._send_json({"detail": str(e)}, 500)
+            return
+        handler(body)
+
+    # ---------- endpoints ----------
+
+    def text_to_image(self, body):
+        self._send_json(images_payload(self.opts.images, self.opts.image_bytes))
+
+    def embeddings(self, body):
+        texts = body.get("input", "")
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        data = [{"object": "embedding", "index": i, "embedding": self._vector(t)}
+                for i, t in enumerate(texts)]
+        self._send_json({"object": "list", "data": data, "model": body.get("model", "mock")})
+
+    def chat(self, body):
+        user = next((m.get("content", "") for m in body.get("messages", [])
+                     if m.get("role") == "user"), "")
+        text = f"MOCK: {user}"
+        if not body.get("stream"):
+            self._send_json({"object": "chat.completion", "model": body.get("model", "mock"),
+                             "choices": [{"index": 0, "finish_reason": "stop",
+                                          "message": {"role": "assistant", "content": text}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in re.findall(r"\S+\s*", text):
+            delta = {"choices": [{"index": 0, "delta": {"content": word}}]}
+            self._chunk(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")  # terminating zero-length chunk
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _vector(self, text):
+        """Deterministic unit-ish vector per text."""
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        return [round(rng.uniform(-1, 1), 6) for _ in range(self.opts.dim)]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Offline stand-in for the image bridge / LLM server.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8090)
+    p.add_argument("--latency-ms", type=float, default=0, help="mean latency per request")
+    p.add_argument("--dist", choices=Latency.DISTS, default="fixed")
+    p.add_argument("--sigma", type=float, default=0,
+                   help="normal: stddev in ms; lognormal: sigma of log(latency)")
+    p.add_argument("--error-rate", type=float, default=0, help="fraction answered with HTTP 500")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--images", type=int, default=2, help="images per text-to-image reply")
+    p.add_argument("--image-bytes", type=int, default=256 * 1024, help="approx. size of each PNG")
+    p.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    p.add_argument("--verbose", action="store_true", help="log every request")
+    opts = p.parse_args(argv)
+
+    Handler.opts = opts
+    Handler.latency = Latency(opts.latency_ms, opts.dist, opts.sigma, opts.error_rate, opts.seed)
+    httpd = ThreadingHTTPServer((opts.host, opts.port), Handler)
+    httpd.daemon_threads = True
+    print(f"Mock backend on http://{opts.host}:{opts.port} "
+          f"({opts.dist} {opts.latency_ms:g} ms, errors {opts.error_rate:g}, "
+          f"{opts.images} x ~{opts.image_bytes} B images)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# relay/__init__.py
+"""TCP-side helpers for the relay server (dispatch, config). LLM code lives in llm/."""
@@ -0,0 +1,178 @@
+# relay/admission.py
+"""
+Admission control: decide early and cheaply whether a request gets served.
+
+Limits (see relay/config.py):
+- RELAY_MAX_CONNECTIONS: sockets beyond this get a BUSY reply and are closed.
+- RELAY_CONN_INFLIGHT:   unanswered requests one connection may have.
+- RELAY_WORKERS + RELAY_QUEUE_DEPTH: global running + waiting requests
+  (enforced by the pool / async semaphore, reported through busy()).
+- RELAY_QUEUE_TIMEOUT:   a request still waiting for a worker after this
+  many seconds is dropped instead of started; its client has waited long
+  enough and the worker moves on to fresher work.
+- RELAY_RATE_LIMIT / RELAY_RATE_BURST: per-client token bucket, and
+  RELAY_FAIR_QUEUE / RELAY_API_KEYS: per-client share of the workers
+  (relay/fair.py). check() returns the client's fair-queue flow and
+  weight for the pool. Each throttled request is counted in
+  relay_throttled_total and logged, at INFO at most once per client every
+  THROTTLE_LOG_INTERVAL seconds (with the number of requests throttled
+  since the previous line), at DEBUG otherwise.
+
+Rejections are Busy exceptions whose payload() is the JSON body of a
+Kind.BUSY frame: {"reason", "message", "retry_after_ms"}. retry_after_ms
+is estimated from the recent service time, so clients back off by roughly
+the time the backlog needs to drain.
+"""
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from llm import cancel
+
+from . import monitor
+from .fair import RateLimiter
+
+log = logging.getLogger(__name__)
+
+THROTTLE_LOG_INTERVAL = 10.0
+
+
+class Busy(RuntimeError):
+    """Request rejected for overload; payload() goes out as a BUSY frame."""
+
+    def __init__(self, reason: str, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def payload(self) -> bytes:
+        return json.dumps({"reason": self.reason, "message": str(self),
+                           "retry_after_ms": int(self.retry_after * 1000)}).encode("utf-8")
+
+
+class Admission:
+    """Connection and in-flight limits shared by server.py and async_server.py."""
+
+    def __init__(self, cfg: dict):
+        self.workers = max(1, cfg.get("workers", 4))
+        self.queue_depth = max(0, cfg.get("queue_depth", 32))
+        self.max_connections = cfg.get("max_connections", 1024)
+        self.conn_inflight = cfg.get("conn_inflight", 16)
+        self.queue_timeout = cfg.get("queue_timeout", 30.0)
+        self._lock = threading.Lock()
+        self._service = 1.0  # EWMA of seconds per request, seeds retry_after
+        self.connections = 0
+        self.fair = cfg.get("fair_queue", True)
+        self.api_keys: Dict[str, Tuple[str, float]] = cfg.get("api_keys", {})
+        rate = cfg.get("rate_limit", 0.0)
+        self.limiter = RateLimiter(rate, cfg.get("rate_burst", 10.0)) if rate > 0 else None
+        self._throttled: Dict[str, list] = {}  # client -> [throttled since last INFO line, its time]
+
+    # ---------- connections ----------
+
+    def connect(self) -> bool:
+        """Count a new socket; False if it is over RELAY_MAX_CONNECTIONS."""
+        with self._lock:
+            if self.max_connections and self.connections >= self.max_connections:
+                return False
+            self.connections += 1
+            monitor.CONNECTIONS.set(self.connections)
+            return True
+
+    def disconnect(self) -> None:
+        """Release a socket that connect() accepted."""
+        with self._lock:
+            self.connections -= 1
+            monitor.CONNECTIONS.set(self.connections)
+
+    # ---------- requests ----------
+
+    def client(self, session) -> Tuple[str, float]:
+        """(client, weight): the API key's name if it is a known key, else the peer address."""
+        known = self.api_keys.get(session.api_key) if session.api_key else None
+        if known is not None:
+            return known
+        return session.peer or f"conn-{session.conn}", 1.0
+
+    def check(self, session, seq: int) -> Tuple[Optional[Hashable], float]:
+        """Raise Busy if the connection or client is over its limits.
+
+        Returns the request's (flow, weight) for the fair queue; flow is
+        None with RELAY_FAIR_QUEUE=0 (plain FIFO).
+        """
+        if self.conn_inflight and session.backlog(seq) >= self.conn_inflight:
+            raise self.busy("conn_inflight",
+                            f"{self.conn_inflight} requests already in flight on this connection")
+        client, weight = self.client(session)
+        if self.limiter is not None:
+            wait = self.limiter.take(client, weight)
+            if wait:
+                raise self.throttle(session, "rate_limit",
+                                    f"over {self.limiter.rate * weight:g} requests/s", wait)
+        return (client if self.fair else None), weight
+
+    def run(self, enqueued: float, token: Optional[cancel.CancelToken], fn: Callable, *args):
+        """Worker-side wrapper: drop the job if it queued too long, else time it.
+
+        `enqueued` is the time.monotonic() at submit. The job runs under the
+        request's CancelToken (raises cancel.Cancelled once it fires).
+        """
+        start = time.monotonic()
+        monitor.QUEUE.observe(start - enqueued)
+        if self.queue_timeout and start - enqueued > self.queue_timeout:
+            raise self.busy("queue_timeout",
+                            f"waited more than {self.queue_timeout:g}s for a worker")
+        try:
+            with cancel.scope(token):
+                return fn(*args)
+        finally:
+            self.observe(time.monotonic() - start)
+
+    def observe(self, seconds: float) -> None:
+        """Feed one request's service time into the retry_after estimate."""
+        with self._lock:
+            self._service = 0.8 * self._service + 0.2 * seconds
+
+    def busy(self, reason: str, message: str) -> Busy:
+        """Build (and count) a rejection with a backlog-based retry hint."""
+        with self._lock:
+            drain = self._service * (self.queue_depth + self.workers) / self.workers
+        monitor.REJECTED.inc(reason=reason)
+        log.debug("[BUSY] %s: %s", reason, message)
+        return Busy(reason, message, retry_after=min(max(drain, 0.1), 60.0))
+
+    def throttle(self, session, reason: str, message: str,
+                 retry_after: Optional[float] = None) -> Busy:
+        """Build, count and log a per-client rejection (rate_limit, fair_share)."""
+        client, _weight = self.client(session)
+        known = self.api_keys.get(session.api_key) if session.api_key else None
+        monitor.THROTTLED.inc(client=known[0] if known else "peer", reason=reason)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._throttled.get(client)
+            if entry is None or now - entry[1] >= THROTTLE_LOG_INTERVAL:
+                if len(self._throttled) > 4096:
+                    self._throttled.clear()  # clients that never came back
+                self._throttled[client] = [0, now]
+                since = entry[0] if entry else 0
+            else:
+                entry[0] += 1
+                since = None
+        if since is None:
+            log.debug("[THROTTLE] %s: %s: %s", client, reason, message)
+        elif since:
+            log.info("[THROTTLE] %s: %s: %s (%d more throttled since the last line)",
+                     client, reason, message, since)
+        else:
+            log.info("[THROTTLE] %s: %s: %s", client, reason, message)
+        busy = self.busy(reason, message)
+        if retry_after is not None:
+            busy.retry_after = min(max(retry_after, 0.01), 60.0)
+        return busy
+
+    def reject_connection(self) -> Busy:
+        return self.busy("max_connections",
+                         f"server already has {self.max_connections} connections")
@@ -0,0 +1,111 @@
+# relay/config.py
+"""
+Relay settings read from environment variables.
+
+The LLM side (LLM_PROVIDER, LLM_BASE_URL, ...) is read by llm/factory.py;
+everything about the TCP side (scheduling, framing) is read here:
+
+- RELAY_PORT:        TCP port both servers listen on (default 12345).
+- RELAY_DISPATCH:    "pool" (default) runs LLM calls on worker threads,
+                     "inline" runs them on the Qt thread (old behaviour).
+- RELAY_WORKERS:     number of worker threads (concurrent backend calls);
+                     async_server.py uses it as its concurrency limit.
+- RELAY_QUEUE_DEPTH: requests allowed to wait for a free worker before
+                     new ones are rejected.
+- RELAY_FRAMING:     "auto" (default) detects per connection, "line" forces
+                     newline-delimited messages, "length" forces
+                     length-prefixed frames (see relay/framing.py).
+- RELAY_MAX_FRAME:   largest accepted request frame in bytes.
+- RELAY_LINE_IDLE_MS: line framing: an unterminated line is taken as a
+                     whole prompt after this much silence from the client
+                     (default 50; clients of the original protocol send no
+                     newline). 0 = wait for the newline.
+
+Admission control (see relay/admission.py):
+
+- RELAY_MAX_CONNECTIONS: open sockets before new ones are turned away
+                         with a BUSY reply (0 = unlimited).
+- RELAY_CONN_INFLIGHT:   unanswered requests allowed per connection.
+- RELAY_QUEUE_TIMEOUT:   seconds a request may wait for a worker before
+                         it is dropped with a BUSY reply (0 = forever).
+
+Per-client limits (see relay/fair.py; a client is an API key from a
+HELLO frame, else the peer address):
+
+- RELAY_RATE_LIMIT: requests/s per client (token bucket; 0 = off, default).
+- RELAY_RATE_BURST: requests a client may send at once (bucket size).
+- RELAY_FAIR_QUEUE: 1 (default) starts waiting requests in weighted fair
+                    order across clients; 0 = first come, first served.
+- RELAY_API_KEYS:   "name:key[:weight],..." known clients; the weight
+                    (default 1) scales a client's rate and queue share.
+
+Observability (see relay/monitor.py and relay/logs.py):
+
+- RELAY_METRICS_PORT: port of the Prometheus /metrics endpoint (0 = off).
+- RELAY_METRICS_HOST: address it binds to (default 127.0.0.1).
+- RELAY_LOG_LEVEL:    DEBUG shows per-request lines; default INFO.
+
+Journal (see relay/journal.py, replayed by replay.py):
+
+- RELAY_JOURNAL:           JSONL file to append every request to (empty = off).
+- RELAY_JOURNAL_MAX_BYTES: rotate the file at this size (default 64 MiB).
+- RELAY_JOURNAL_KEEP:      rotated files kept (path.1 ... path.N).
+- RELAY_JOURNAL_FSYNC:     seconds between fsyncs (0 = after every batch).
+
+Processes (see relay/prefork.py):
+
+- RELAY_PROCESSES:      relay processes sharing the port (default 1; more
+                        turns the script into a supervisor of N workers).
+- RELAY_REUSEPORT:      1 (default): each worker binds with SO_REUSEPORT;
+                        0: workers inherit one socket bound by the supervisor.
+- RELAY_SHUTDOWN_GRACE: seconds a stopping process waits for requests
+                        in flight before closing their connections.
+- RELAY_LISTEN_FD / RELAY_PROCESS_INDEX: set by the supervisor for its
+                        workers (an inherited socket can also be passed
+                        this way by a process manager).
+"""
+import os
+
+
+def parse_api_keys(spec: str) -> dict:
+    """"name:key[:weight],..." -> {key: (name, weight)}."""
+    keys = {}
+    for entry in spec.split(","):
+        parts = entry.strip().split(":")
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        keys[parts[1]] = (parts[0], max(weight, 0.01))
+    return keys
+
+
+def load_relay_cfg() -> dict:
+    """Collect relay config from env with sensible defaults."""
+    return {
+        "port":        int(os.getenv("RELAY_PORT", "12345")),
+        "dispatch":    os.getenv("RELAY_DISPATCH", "pool").lower(),
+        "workers":     int(os.getenv("RELAY_WORKERS", "4")),
+        "queue_depth": int(os.getenv("RELAY_QUEUE_DEPTH", "32")),
+        "framing":     os.getenv("RELAY_FRAMING", "auto").lower(),
+        "max_frame":   int(os.getenv("RELAY_MAX_FRAME", str(64 * 1024 * 1024))),
+        "line_idle_ms": float(os.getenv("RELAY_LINE_IDLE_MS", "50")),
+        "max_connections": int(os.getenv("RELAY_MAX_CONNECTIONS", "1024")),
+        "conn_inflight":   int(os.getenv("RELAY_CONN_INFLIGHT", "16")),
+        "queue_timeout":   float(os.getenv("RELAY_QUEUE_TIMEOUT", "30")),
+        "rate_limit":      float(os.getenv("RELAY_RATE_LIMIT", "0")),
+        "rate_burst":      float(os.getenv("RELAY_RATE_BURST", "10")),
+        "fair_queue":      os.getenv("RELAY_FAIR_QUEUE", "1") not in ("0", "false", "no"),
+        "api_keys":        parse_api_keys(os.getenv("RELAY_API_KEYS", "")),
+        "metrics_port":    int(os.getenv("RELAY_METRICS_PORT", "9100")),
+        "metrics_host":    os.getenv("RELAY_METRICS_HOST", "127.0.0.1"),
+        "log_level":       os.getenv("RELAY_LOG_LEVEL", "INFO"),
+        "journal":           os.getenv("RELAY_JOURNAL", ""),
+        "journal_max_bytes": int(os.getenv("RELAY_JOURNAL_MAX_BYTES", str(64 * 1024 * 1024))),
+        "journal_keep":      int(os.getenv("RELAY_JOURNAL_KEEP", "5")),
+        "journal_fsync":     float(os.getenv("RELAY_JOURNAL_FSYNC", "1")),
+        "processes":      int(os.getenv("RELAY_PROCESSES", "1")),
+        "reuseport":      os.getenv("RELAY_REUSEPORT", "1") not in ("0", "false", "no"),
+        "shutdown_grace": float(os.getenv("RELAY_SHUTDOWN_GRACE", "10")),
+        "listen_fd":      int(os.getenv("RELAY_LISTEN_FD", "-1")),
+        "process_index":  int(os.getenv("RELAY_PROCESS_INDEX", "-1")),
+    }
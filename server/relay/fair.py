@@ -0,0 +1,203 @@
+# relay/fair.py
+"""
+Per-client fairness: token-bucket rate limits and fair queueing.
+
+A client is its API key (sent in a HELLO frame, see relay/framing.py and
+RELAY_API_KEYS) or else its peer address. Each client has a weight
+(1 unless its key says otherwise) that scales both parts:
+
+- RateLimiter: a token bucket per client, refilled at RELAY_RATE_LIMIT *
+  weight requests/s up to RELAY_RATE_BURST * weight; a request that finds
+  the bucket empty is rejected with BUSY (reason "rate_limit") and told
+  when the next token is due.
+- FairQueue: start-time fair queueing over the requests waiting for a
+  worker. Each request gets the tag max(V, F[client]), where F[client]
+  grows by 1/weight per request and V is the tag last dequeued, and
+  workers take the smallest tag. A client with a deep backlog therefore
+  can't delay a quiet client's request by more than one request per
+  worker, instead of by its whole backlog as in a FIFO.
+  When the queue is full, the client with the most queued requests
+  (per weight) gives up its newest one so that a lighter client's request
+  fits ("fair_share"), instead of the lighter client being turned away.
+  relay/pool.py (server.py) and AsyncSlots (async_server.py) dispatch
+  through it.
+
+Both are in-memory and per process: with RELAY_PROCESSES=N, a client whose
+connections land on several workers gets up to N times the rate.
+"""
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class Preempted(RuntimeError):
+    """A queued request was dropped to make room for a lighter client's."""
+
+
+class RateLimiter:
+    """Token buckets keyed by client; take() says whether a request may go."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._lock = threading.Lock()
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}  # client -> (tokens, stamp)
+
+    def take(self, client: Hashable, weight: float = 1.0,
+             now: Optional[float] = None) -> float:
+        """Spend one token: 0.0 if allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        rate, burst = self.rate * weight, self.burst * weight
+        with self._lock:
+            tokens, stamp = self._buckets.get(client, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if tokens >= 1.0:
+                self._buckets[client] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > 4096:
+                self._prune(now)
+            return (1.0 - tokens) / rate
+
+    def _prune(self, now: float) -> None:
+        """Forget buckets that have refilled completely (idle clients)."""
+        full = [c for c, (tokens, stamp) in self._buckets.items()
+                if tokens + (now - stamp) * self.rate >= self.burst]
+        for c in full:
+            del self._buckets[c]
+
+
+class FairQueue:
+    """Start-time fair queue of items per flow (thread-safe, non-blocking)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, Hashable, Any]] = []  # (start tag, n, flow, item)
+        self._n = itertools.count()
+        self._vtime = 0.0
+        self._finish: Dict[Hashable, float] = {}   # flow -> finish tag of its last item
+        self._queued: Dict[Hashable, int] = {}     # flow -> items in the heap
+        self._weight: Dict[Hashable, float] = {}   # flow -> weight of its queued items
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, flow: Hashable, weight: float, item: Any) -> None:
+        with self._lock:
+            start = max(self._vtime, self._finish.get(flow, 0.0))
+            self._finish[flow] = start + 1.0 / weight
+            self._queued[flow] = self._queued.get(flow, 0) + 1
+            self._weight[flow] = weight
+            heapq.heappush(self._heap, (start, next(self._n), flow, item))
+            if len(self._finish) > 2 * len(self._heap) + 64:
+                # Idle flows whose finish tag has passed start at V anyway.
+                for f in [f for f, tag in self._finish.items()
+                          if tag <= self._vtime and f not in self._queued]:
+                    del self._finish[f]
+
+    def pop(self) -> Any:
+        """Item with the smallest start tag; IndexError if empty."""
+        with self._lock:
+            start, _n, flow, item = heapq.heappop(self._heap)
+            self._vtime = start
+            self._forget(flow)
+            return item
+
+    def remove(self, item: Any) -> bool:
+        """Take `item` out of the queue (e.g. its request was cancelled)."""
+        with self._lock:
+            for i, entry in enumerate(self._heap):
+                if entry[3] is item:
+                    self._delete(i)
+                    return True
+            return False
+
+    def drop_for(self, flow: Hashable, weight: float) -> Optional[Tuple[Hashable, Any]]:
+        """Make room for one item of `flow`: remove and return (victim flow, item).
+
+        The victim is the newest item of the flow with the largest backlog
+        per weight, if that backlog is larger than `flow`'s would be with
+        the new item; otherwise None (the new item is the one to reject).
+        """
+        with self._lock:
+            mine = (self._queued.get(flow, 0) + 1) / weight
+            victim, worst = None, mine
+            for f, n in self._queued.items():
+                if f != flow and n / self._weight[f] > worst:
+                    victim, worst = f, n / self._weight[f]
+            if victim is None:
+                return None
+            i = max((i for i, e in enumerate(self._heap) if e[2] == victim),
+                    key=lambda i: self._heap[i][0])
+            item, w = self._heap[i][3], self._weight[victim]
+            self._delete(i)
+            self._finish[victim] -= 1.0 / w  # its share was not used: give the tag back
+            return victim, item
+
+    def queued(self, flow: Hashable) -> int:
+        return self._queued.get(flow, 0)
+
+    def _delete(self, i: int) -> None:
+        flow = self._heap[i][2]
+        self._heap[i] = self._heap[-1]
+        self._heap.pop()
+        heapq.heapify(self._heap)
+        self._forget(flow)
+
+    def _forget(self, flow: Hashable) -> None:
+        n = self._queued[flow] - 1
+        if n:
+            self._queued[flow] = n
+        else:
+            del self._queued[flow]
+            del self._weight[flow]
+
+
+class AsyncSlots:
+    """asyncio semaphore whose waiters are let in in FairQueue order."""
+
+    def __init__(self, slots: int):
+        self._free = slots
+        self._queue = FairQueue()
+
+    async def acquire(self, flow: Hashable = None, weight: float = 1.0) -> None:
+        """Wait for a slot; raises Preempted if make_room() picks this waiter."""
+        if self._free > 0 and not len(self._queue):
+            self._free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue.push(flow, weight, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not self._queue.remove(waiter) and waiter.done() \
+                    and not waiter.cancelled() and waiter.exception() is None:
+                self.release()  # granted just as we were cancelled: pass it on
+            raise
+
+    def release(self) -> None:
+        while True:
+            try:
+                waiter = self._queue.pop()
+            except IndexError:
+                self._free += 1
+                return
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def make_room(self, flow: Hashable, weight: float = 1.0) -> bool:
+        """Fail the heaviest flow's newest waiter with Preempted; False if none qualifies."""
+        dropped = self._queue.drop_for(flow, weight) if flow is not None else None
+        if dropped is None:
+            return False
+        victim, waiter = dropped
+        if not waiter.done():
+            waiter.set_exception(Preempted(
+                f"queue full: {victim} has the most queued requests, "
+                "dropped to make room for another client"))
+        return True
@@ -0,0 +1,243 @@
+# relay/framing.py
+"""
+Wire framing for the relay protocol.
+
+Two framings share the same Frame(kind, payload) model:
+
+- line:   one UTF-8 message per '\\n'-terminated line. The original client
+          sent its prompt with no newline at all, so the servers also take
+          an unterminated line as a whole prompt once the client has been
+          quiet for RELAY_LINE_IDLE_MS (see flush()).
+          Error replies are sent as "LLM_ERROR: <message>\\n", overload
+          rejections as "BUSY <json>\\n", images as the original
+          {"images_base64": [...]} JSON line.
+- length: binary frames, HEADER (magic, kind, payload length) + payload.
+          Payloads may contain anything, including newlines, and large
+          bodies are sliced out of the buffer without scanning them.
+          A kind with the TAGGED bit set is followed by a u32 request id
+          (counted in the length): the multiplexed mode. Replies to a
+          tagged request carry its id and are written as soon as they are
+          ready, so one socket can have many requests completing out of
+          order; CANCEL(id) tells the server the client no longer wants one.
+          A HELLO frame identifies the client by API key for per-client
+          rate limits and fair queueing (relay/fair.py).
+          PING is answered with PONG by the session itself, so clients can
+          detect a dead connection even while every worker is busy.
+
+Each framer keeps a per-connection reassembly buffer: `feed()` accepts
+whatever chunk the socket produced and returns every complete frame in it,
+keeping the remainder for the next call. AutoFramer picks the framing from
+the first byte a client sends (FRAME_MAGIC is never the first byte of UTF-8
+text), so old line clients and new length clients can share one port.
+"""
+from __future__ import annotations
+import struct
+from enum import IntEnum
+from typing import List, NamedTuple, Optional
+
+from .images import images_to_json
+
+FRAME_MAGIC = 0xA5                 # UTF-8 continuation byte: can't start text
+HEADER = struct.Struct("!BBI")     # magic, kind, payload length
+REQUEST_ID = struct.Struct("!I")   # follows HEADER when kind has the TAGGED bit
+TAGGED = 0x80
+ERROR_PREFIX = b"LLM_ERROR: "
+BUSY_PREFIX = b"BUSY "
+DEFAULT_MAX_FRAME = 64 * 1024 * 1024
+ZERO_COPY_MIN = 64 * 1024          # larger payloads may come back as the framer's bytearray
+
+
+class Kind(IntEnum):
+    """Frame kinds. Requests and replies share the numbering."""
+    TEXT = 1    # prompt (client→server) or reply text (server→client)
+    ERROR = 2   # UTF-8 error message
+    STREAM = 3  # prompt whose reply should be streamed (length framing only)
+    CHUNK = 4   # part of a streamed reply
+    END = 5     # end of a streamed reply (empty payload)
+    BUSY = 6    # overload rejection, JSON {"reason", "message", "retry_after_ms"}
+    IMAGES = 7  # binary images, see relay/images.py (length framing only)
+    CANCEL = 8  # client→server: drop tagged request `id` (empty payload)
+    HELLO = 9   # client→server: JSON {"api_key": ...} naming the client (no reply)
+    PING = 10   # client→server heartbeat, answered at once with PONG (same payload)
+    PONG = 11   # server→client: reply to PING, ahead of any queued replies
+
+
+class Frame(NamedTuple):
+    kind: int
+    payload: bytes  # a bytearray for large payloads (see ZERO_COPY_MIN)
+    id: Optional[int] = None  # request id of a tagged frame
+
+
+class FramingError(ValueError):
+    """Malformed or oversized frame; the connection should be closed."""
+
+
+class LineFramer:
+    """Newline-delimited messages.
+
+    A line is a prompt, so on the server every line is TEXT. Only a framer
+    reading replies (`replies=True`, e.g. bench.py) maps the LLM_ERROR:
+    and BUSY prefixes back to ERROR and BUSY.
+    """
+
+    mode = "line"
+
+    def __init__(self, max_frame: int = DEFAULT_MAX_FRAME, replies: bool = False):
+        self.max_frame = max_frame
+        self.replies = replies
+        self._buf = bytearray()
+        self._scanned = 0  # bytes of _buf already known to contain no '\n'
+
+    @property
+    def partial(self) -> bool:
+        """Bytes of an unterminated line are buffered."""
+        return bool(self._buf)
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """Append a chunk and return all complete lines as frames."""
+        buf = self._buf
+        buf += data
+        frames: List[Frame] = []
+        while True:
+            nl = buf.find(b"\n", self._scanned)
+            if nl < 0:
+                self._scanned = len(buf)
+                if len(buf) > self.max_frame:
+                    raise FramingError(f"line longer than {self.max_frame} bytes")
+                return frames
+            if nl == len(buf) - 1 and nl >= ZERO_COPY_MIN:
+                # Nothing buffered after this (large) line: hand the buffer over.
+                del buf[nl:]
+                if buf.endswith(b"\r"):
+                    del buf[-1:]
+                line, self._buf = buf, bytearray()
+                buf = self._buf
+            else:
+                line = bytes(buf[:nl]).rstrip(b"\r")
+                del buf[:nl + 1]  # front deletion is O(1) amortized for bytearray
+            self._scanned = 0
+            if not self.replies:
+                frames.append(Frame(Kind.TEXT, line))  # prompts may start with anything
+            elif line.startswith(ERROR_PREFIX):
+                frames.append(Frame(Kind.ERROR, line[len(ERROR_PREFIX):]))
+            elif line.startswith(BUSY_PREFIX):
+                frames.append(Frame(Kind.BUSY, line[len(BUSY_PREFIX):]))
+            else:
+                frames.append(Frame(Kind.TEXT, line))
+
+    def flush(self) -> List[Frame]:
+        """Take the buffered unterminated line as complete (idle client)."""
+        line = bytes(self._buf).rstrip(b"\r")
+        self._buf, self._scanned = bytearray(), 0
+        return [Frame(Kind.TEXT, line)] if line else []
+
+    def encode(self, kind: int, payload: bytes, request_id: Optional[int] = None) -> bytes:
+        # Line clients can't tag requests, so request_id is always None here.
+        if kind == Kind.ERROR:
+            return ERROR_PREFIX + payload + b"\n"
+        if kind == Kind.BUSY:
+            return BUSY_PREFIX + payload + b"\n"
+        if kind == Kind.IMAGES:
+            return images_to_json(payload) + b"\n"  # what line clients always got
+        return payload + b"\n"
+
+
+class LengthFramer:
+    """Length-prefixed binary frames (see HEADER)."""
+
+    mode = "length"
+
+    def __init__(self, max_frame: int = DEFAULT_MAX_FRAME, replies: bool = False):
+        self.max_frame = max_frame  # `replies` changes nothing: kinds are explicit
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """Append a chunk and return all complete frames."""
+        buf = self._buf
+        buf += data
+        frames: List[Frame] = []
+        while len(buf) >= HEADER.size:
+            magic, kind, size = HEADER.unpack_from(buf)
+            if magic != FRAME_MAGIC:
+                raise FramingError(f"bad frame magic 0x{magic:02x}")
+            if size > self.max_frame:
+                raise FramingError(f"frame of {size} bytes exceeds {self.max_frame}")
+            end = HEADER.size + size
+            if len(buf) < end:
+                break  # wait for the rest of the payload
+            start, request_id = HEADER.size, None
+            if kind & TAGGED:
+                if size < REQUEST_ID.size:
+                    raise FramingError("tagged frame without a request id")
+                (request_id,) = REQUEST_ID.unpack_from(buf, HEADER.size)
+                kind &= ~TAGGED
+                start += REQUEST_ID.size
+            if end == len(buf) and size >= ZERO_COPY_MIN:
+                # Nothing buffered after this (large) frame: hand the buffer
+                # itself over as the payload instead of copying it.
+                del buf[:start]  # front deletion is O(1)
+                frames.append(Frame(kind, buf, request_id))
+                self._buf = bytearray()
+                break
+            frames.append(Frame(kind, bytes(buf[start:end]), request_id))
+            del buf[:end]
+        return frames
+
+    # A partial binary frame is never a message: nothing to flush.
+    partial = False
+
+    def flush(self) -> List[Frame]:
+        return []
+
+    def encode(self, kind: int, payload: bytes, request_id: Optional[int] = None) -> bytes:
+        if request_id is None:
+            return HEADER.pack(FRAME_MAGIC, kind, len(payload)) + payload
+        return (HEADER.pack(FRAME_MAGIC, kind | TAGGED, REQUEST_ID.size + len(payload))
+                + REQUEST_ID.pack(request_id) + payload)
+
+
+class AutoFramer:
+    """Chooses LineFramer or LengthFramer from the first byte received."""
+
+    mode = "auto"
+
+    def __init__(self, max_frame: int = DEFAULT_MAX_FRAME, replies: bool = False):
+        self.max_frame = max_frame
+        self.replies = replies
+        self._inner = None
+
+    def feed(self, data: bytes) -> List[Frame]:
+        if self._inner is None:
+            if not data:
+                return []
+            cls = LengthFramer if data[0] == FRAME_MAGIC else LineFramer
+            self._inner = cls(self.max_frame, self.replies)
+            self.mode = self._inner.mode
+        return self._inner.feed(data)
+
+    @property
+    def partial(self) -> bool:
+        return self._inner is not None and self._inner.partial
+
+    def flush(self) -> List[Frame]:
+        return self._inner.flush() if self._inner is not None else []
+
+    def encode(self, kind: int, payload: bytes, request_id: Optional[int] = None) -> bytes:
+        # Nothing received yet: answer in the original line protocol.
+        inner = self._inner or LineFramer(self.max_frame)
+        return inner.encode(kind, payload, request_id)
+
+
+FRAMERS = {"line": LineFramer, "length": LengthFramer, "auto": AutoFramer}
+
+
+def make_framer(mode: str = "auto", max_frame: int = DEFAULT_MAX_FRAME, replies: bool = False):
+    """Create a fresh per-connection framer for RELAY_FRAMING=line|length|auto.
+
+    `replies=True` is for the client side of a connection (decoding what
+    the server sends); the server decodes requests.
+    """
+    cls = FRAMERS.get(mode)
+    if cls is None:
+        raise ValueError(f"Unknown framing: {mode}. Supported: {list(FRAMERS)}")
+    return cls(max_frame, replies)
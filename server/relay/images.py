@@ -0,0 +1,98 @@
+# relay/images.py
+"""
+Binary payload of an IMAGES frame (see framing.Kind.IMAGES).
+
+Layout:
+    u32 header length | JSON header | frame 0 bytes | frame 1 bytes | ...
+Header:
+    {"count": N, "mime": "image/png",
+     "frames": [{"w": 512, "h": 512, "len": 48213}, ...]}
+
+Frames are the encoded files (PNG/WebP/...) exactly as the backend made
+them, or raw pixels for mime "image/x-raw-uint8" (then each frame also has
+"c", the channel count: 1 gray, 3 RGB or 4 RGBA, rows tightly packed).
+Dimensions are read from the file header when the format is known (PNG,
+WebP), else 0. Receivers slice frames out with memoryviews, so no image
+is copied or base64-decoded on their side.
+"""
+from __future__ import annotations
+import base64
+import binascii
+import json
+import struct
+from typing import List, Optional, Tuple
+
+IMAGES_HEADER = struct.Struct("!I")  # length of the JSON header
+RAW_MIME = "image/x-raw-uint8"
+
+
+def image_size(data: bytes) -> Tuple[int, int]:
+    """(width, height) from a PNG or WebP header, (0, 0) if unknown."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack_from("!II", data, 16)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8X":
+            w = int.from_bytes(data[24:27], "little") + 1
+            h = int.from_bytes(data[27:30], "little") + 1
+            return w, h
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8 ":
+            w, h = struct.unpack_from("<HH", data, 26)
+            return w & 0x3FFF, h & 0x3FFF
+    return 0, 0
+
+
+def pack_images(images: List[bytes], mime: str = "image/png",
+                shapes: Optional[List[Tuple[int, int, int]]] = None) -> bytes:
+    """Build an IMAGES payload; the frame bytes are copied once, into the result.
+
+    `shapes` gives (w, h, channels) per frame and is required for RAW_MIME.
+    """
+    frames = []
+    for i, data in enumerate(images):
+        if shapes:
+            w, h, c = shapes[i]
+            frames.append({"w": w, "h": h, "c": c, "len": len(data)})
+            continue
+        w, h = image_size(data)
+        frames.append({"w": w, "h": h, "len": len(data)})
+    header = json.dumps({"count": len(images), "mime": mime, "frames": frames},
+                        separators=(",", ":")).encode("utf-8")
+    return b"".join([IMAGES_HEADER.pack(len(header)), header, *images])
+
+
+def unpack_images(payload: bytes) -> Tuple[dict, List[memoryview]]:
+    """Split an IMAGES payload into (header, frame views) without copying frames."""
+    view = memoryview(payload)
+    (size,) = IMAGES_HEADER.unpack_from(view)
+    start = IMAGES_HEADER.size + size
+    header = json.loads(bytes(view[IMAGES_HEADER.size:start]))
+    frames = []
+    for f in header["frames"]:
+        frames.append(view[start:start + f["len"]])
+        start += f["len"]
+    return header, frames
+
+
+def images_to_json(payload: bytes) -> bytes:
+    """IMAGES payload → the legacy {"images_base64": [...]} text (line framing)."""
+    header, frames = unpack_images(payload)
+    return json.dumps({"images_base64": [base64.b64encode(f).decode("ascii") for f in frames],
+                       "mime": header["mime"]}).encode("utf-8")
+
+
+def reply_images(raw) -> Optional[Tuple[List[bytes], str]]:
+    """Decode an image-bridge reply ({"images_base64": [...], "mime"}) once.
+
+    Returns (images, mime), or None if `raw` is not an image reply.
+    """
+    if not isinstance(raw, dict) or not isinstance(raw.get("images_base64"), list):
+        return None
+    try:
+        images = [base64.b64decode(b64, validate=True) for b64 in raw["images_base64"]]
+    except (TypeError, binascii.Error):
+        return None  # not really base64: send the reply as text instead
+    return images, raw.get("mime") or "image/png"
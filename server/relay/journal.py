@@ -0,0 +1,237 @@
+# relay/journal.py
+"""
+Request/response journal (RELAY_JOURNAL=path, off by default).
+
+One JSON line per finished request, e.g.
+
+  {"ts": 1760000000.123, "conn": 3, "seq": 7, "id": 12, "kind": "text",
+   "provider": "llama", "prompt": "...", "outcome": "images",
+   "queue_ms": 0.4, "llm_ms": 812.5, "first_ms": null, "total_ms": 814.1,
+   "bytes": 524331, "sha256": "9f2c..."}
+
+- ts/conn/seq/id: arrival time, connection and request numbers, so the
+  arrival pattern can be replayed (replay.py).
+- outcome: kind of the final reply (text, images, end, error, busy) or
+  "cancelled" when the client cancelled or went away first.
+- queue_ms: waiting for a worker; llm_ms: the adapter call; first_ms:
+  first stream chunk; total_ms: arrival → final reply.
+- bytes/sha256: size and (truncated) hash of the reply payload, to spot
+  changed answers across adapter versions.
+
+Lines are encoded and written by a background thread, in batches, and
+fsync'ed at most every RELAY_JOURNAL_FSYNC seconds, so request threads
+never touch the disk. At RELAY_JOURNAL_MAX_BYTES the file is rotated to
+path.1, path.2, ... keeping RELAY_JOURNAL_KEEP old files.
+
+The file is opened when the Journal is created, so a bad path fails at
+startup. At most MAX_QUEUED records wait for the writer; beyond that (a
+disk that can't keep up) or once the writer has stopped, records are
+dropped and counted in `dropped` instead of piling up in memory.
+"""
+from __future__ import annotations
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+MAX_BATCH = 1024
+MAX_QUEUED = 64 * 1024
+
+
+class Trace:
+    """Timestamps (time.perf_counter()) and reply digest of one request."""
+    __slots__ = ("ts", "arrived", "kind", "prompt", "id",
+                 "started", "finished", "first", "bytes", "digest")
+
+    def __init__(self, kind: str, prompt: str, request_id: Optional[int]):
+        self.ts = time.time()
+        self.arrived = time.perf_counter()
+        self.kind = kind
+        self.prompt = prompt
+        self.id = request_id
+        self.started: Optional[float] = None   # worker / slot acquired
+        self.finished: Optional[float] = None  # adapter call returned
+        self.first: Optional[float] = None     # first stream chunk
+        self.bytes = 0
+        self.digest = hashlib.sha256()
+
+
+def timed(trace: Optional[Trace], fn: Callable) -> Callable:
+    """Wrap a worker job so it stamps trace.started / trace.finished."""
+    if trace is None:
+        return fn
+
+    def run(*args):
+        trace.started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            trace.finished = time.perf_counter()
+    return run
+
+
+def _ms(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return None if a is None or b is None else round((b - a) * 1000, 3)
+
+
+class Journal:
+    """Append-only, rotating JSONL journal with a batching writer thread."""
+
+    def __init__(self, path: str, provider: str = "", max_bytes: int = 64 * 1024 * 1024,
+                 keep: int = 5, fsync_interval: float = 1.0):
+        self.path = path
+        self.provider = provider
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.fsync_interval = fsync_interval
+        self._file = open(path, "ab")  # raises here, at startup, if the path is bad
+        self._queue: queue.Queue = queue.Queue(MAX_QUEUED)
+        self._rotate_failed = False
+        self._accepting = True    # False once the writer thread has died
+        self._closed = False
+        self.dropped = 0  # records lost to a full queue or a stopped writer
+        self._thread = threading.Thread(target=self._run, name="relay-journal", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, cfg: dict, provider: str = "") -> Optional["Journal"]:
+        """Journal for RELAY_JOURNAL* settings, or None when journaling is off."""
+        if not cfg.get("journal"):
+            return None
+        journal = cls(cfg["journal"], provider,
+                      max_bytes=cfg.get("journal_max_bytes", 64 * 1024 * 1024),
+                      keep=cfg.get("journal_keep", 5),
+                      fsync_interval=cfg.get("journal_fsync", 1.0))
+        atexit.register(journal.close)
+        log.info("journal: %s", journal.path)
+        return journal
+
+    def record(self, conn: int, seq: int, trace: Trace, outcome: str) -> None:
+        """Queue one finished request (cheap; encoding happens on the writer thread)."""
+        if self._closed:
+            return  # shutting down: connections closing now are not journaled
+        if self._accepting:
+            try:
+                self._queue.put_nowait((conn, seq, trace, outcome, time.perf_counter()))
+                return
+            except queue.Full:
+                pass
+        if not self.dropped:
+            log.error("journal: dropping records (writer %s)",
+                      "behind" if self._accepting else "stopped")
+        self.dropped += 1
+
+    def close(self) -> None:
+        """Flush, fsync and stop the writer."""
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    # ---------- writer thread ----------
+
+    def _encode(self, conn, seq, t: Trace, outcome, done) -> bytes:
+        rec = {
+            "ts": round(t.ts, 3), "conn": conn, "seq": seq, "id": t.id, "kind": t.kind,
+            "provider": self.provider, "prompt": t.prompt, "outcome": outcome,
+            "queue_ms": _ms(t.arrived, t.started), "llm_ms": _ms(t.started, t.finished),
+            "first_ms": _ms(t.arrived, t.first), "total_ms": _ms(t.arrived, done),
+            "bytes": t.bytes, "sha256": t.digest.hexdigest()[:16] if t.bytes else None,
+        }
+        return json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    def _run(self) -> None:
+        try:
+            self._write_loop()
+        except Exception:
+            log.exception("journal writer stopped")
+        finally:
+            self._accepting = False
+            self._file.close()
+
+    def _write_loop(self) -> None:
+        f = self._file
+        last_sync = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval or None)
+            except queue.Empty:
+                item = None
+            batch, stop = [], False
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= MAX_BATCH:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            try:
+                if batch:
+                    f.write(b"".join(self._encode(*rec) for rec in batch))
+                    f.flush()
+                    dirty = True
+                now = time.monotonic()
+                if dirty and (stop or now - last_sync >= self.fsync_interval):
+                    os.fsync(f.fileno())
+                    last_sync, dirty = now, False
+                if f.tell() >= self.max_bytes:
+                    f = self._file = self._rotate(f)
+            except OSError as e:
+                log.error("journal write failed: %s", e)
+            if stop:
+                f.close()
+                return
+
+    def _rotate(self, f):
+        """path → path.1 → path.2 ... (keeping `keep` old files), then reopen.
+
+        Returns the file to write to next: the old one if rotating failed
+        (logged once until a rotation succeeds again), so writes go on.
+        """
+        try:
+            os.fsync(f.fileno())
+            if self.keep > 0:
+                for i in range(self.keep - 1, 0, -1):
+                    src = f"{self.path}.{i}"
+                    if os.path.exists(src):
+                        os.replace(src, f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+            new = open(self.path, "ab")
+        except OSError as e:
+            if not self._rotate_failed:
+                log.error("journal rotation failed, still writing to the old file: %s", e)
+                self._rotate_failed = True
+            return f
+        f.close()
+        if self._rotate_failed:
+            log.info("journal rotation works again")
+            self._rotate_failed = False
+        return new
+
+
+def journal_files(path: str):
+    """Journal files of `path`, oldest first (rotated ones, then the live file)."""
+    rotated = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+    files = list(reversed(rotated))
+    if os.path.exists(path):
+        files.append(path)
+    return files
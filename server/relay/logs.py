@@ -0,0 +1,35 @@
+# relay/logs.py
+"""
+Leveled, non-blocking logging for the relay processes.
+
+setup_logging() routes every logger through a QueueHandler: the thread that
+logs (Qt thread, event loop, worker) only enqueues the record, and a
+QueueListener thread formats it and writes it to stderr. Per-request lines
+([TCP IN], [LLM OUT], ...) are DEBUG; set RELAY_LOG_LEVEL=DEBUG to see them.
+"""
+from __future__ import annotations
+import atexit
+import logging
+import logging.handlers
+import queue
+
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level: str = "INFO", process_index: int = -1) -> logging.handlers.QueueListener:
+    """Install the queue handler on the root logger and start its listener.
+
+    Prefork workers (relay/prefork.py) pass their index, shown as [w<i>].
+    """
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    sink = logging.StreamHandler()
+    fmt = FORMAT if process_index < 0 else FORMAT.replace("%(name)s", f"[w{process_index}] %(name)s")
+    sink.setFormatter(logging.Formatter(fmt))
+    listener = logging.handlers.QueueListener(records, sink, respect_handler_level=False)
+
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level.upper())
+    listener.start()
+    atexit.register(listener.stop)  # flush what is still queued on exit
+    return listener
@@ -0,0 +1,80 @@
+# relay/monitor.py
+"""
+Relay metrics and the /metrics HTTP endpoint.
+
+The relay records, next to the per-provider llm_* metrics of
+llm/layers/metrics.py (and llm_cache_* / llm_singleflight_* of the
+cache and singleflight layers):
+
+- relay_requests_total{kind} / relay_replies_total{kind}
+                                   kind: a framing.Kind name, or "other"
+- relay_rejected_total{reason}     BUSY replies (see relay/admission.py)
+- relay_throttled_total{client,reason}  of those, per-client limits
+                                   (relay/fair.py); client is the API key's
+                                   name, or "peer" for address-keyed clients
+- relay_cancelled_total{stage}     requests cancelled by CANCEL or disconnect,
+                                   before ("queued") or during ("running") the call
+- relay_queue_seconds              wait for a worker slot
+- relay_write_seconds              reply ready → written to the socket
+- relay_bytes_in_total / relay_bytes_out_total
+- relay_connections / relay_inflight (gauges)
+
+So a request's time splits into queue + llm_upstream_seconds + write.
+start_metrics_server() serves everything from llm.metrics.REGISTRY in the
+Prometheus text format on RELAY_METRICS_HOST:RELAY_METRICS_PORT/metrics.
+"""
+from __future__ import annotations
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from llm import metrics
+
+log = logging.getLogger(__name__)
+
+REQUESTS = metrics.counter("relay_requests_total", "Requests decoded from clients.", ["kind"])
+REPLIES = metrics.counter("relay_replies_total", "Final reply frames sent.", ["kind"])
+REJECTED = metrics.counter("relay_rejected_total", "Requests answered with BUSY.", ["reason"])
+THROTTLED = metrics.counter("relay_throttled_total",
+                            "Requests rejected by per-client limits.", ["client", "reason"])
+CANCELLED = metrics.counter("relay_cancelled_total",
+                            "Requests cancelled by the client.", ["stage"])
+QUEUE = metrics.histogram("relay_queue_seconds", "Time a request waited for a worker.")
+WRITE = metrics.histogram("relay_write_seconds", "Time from reply ready to socket write.")
+BYTES_IN = metrics.counter("relay_bytes_in_total", "Bytes read from client sockets.")
+BYTES_OUT = metrics.counter("relay_bytes_out_total", "Bytes written to client sockets.")
+CONNECTIONS = metrics.gauge("relay_connections", "Open client connections.")
+INFLIGHT = metrics.gauge("relay_inflight", "Admitted requests not answered yet.")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass  # scrapes are not worth a log line each
+
+
+def start_metrics_server(cfg: dict) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread; None if RELAY_METRICS_PORT=0."""
+    port = cfg.get("metrics_port", 0)
+    if not port:
+        return None
+    try:
+        httpd = ThreadingHTTPServer((cfg.get("metrics_host", "127.0.0.1"), port), _Handler)
+    except OSError as e:
+        log.error("metrics endpoint not started: %s", e)
+        return None
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("metrics on http://%s:%d/metrics", *httpd.server_address[:2])
+    return httpd
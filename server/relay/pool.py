@@ -0,0 +1,127 @@
+# relay/pool.py
+"""
+Bounded worker pools for LLM calls.
+
+- WorkerPool: `workers` threads plus at most `queue_depth` waiting jobs;
+  submitting beyond that raises PoolFull instead of queueing forever.
+  Waiting jobs are started in fair-queue order across flows (clients,
+  see relay/fair.py), and a full queue makes room for a light flow by
+  failing the newest job of the heaviest one with Preempted. A job whose
+  future is cancelled while waiting leaves the queue at once.
+- InlinePool: same interface, runs the job immediately in the caller thread.
+
+Both return concurrent.futures.Future objects, so callers can attach
+done-callbacks the same way regardless of the dispatch mode.
+"""
+from __future__ import annotations
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable, Optional
+
+from .fair import FairQueue, Preempted
+
+
+class PoolFull(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class WorkerPool:
+    """Thread pool with a hard cap on running + queued jobs, fair across flows."""
+
+    def __init__(self, workers: int = 4, queue_depth: int = 32):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="llm-worker")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        self._queue = FairQueue()
+
+    def submit(self, fn: Callable, *args, flow: Optional[Hashable] = None,
+               weight: float = 1.0, **kwargs) -> Future:
+        """Schedule fn(*args, **kwargs) for `flow`; raise PoolFull if no slot is free."""
+        if not self._slots.acquire(blocking=False):
+            self._make_room(flow, weight)
+        fut: Future = Future()
+        job = (fut, fn, args, kwargs)
+        fut.add_done_callback(lambda _f: self._done(job))
+        self._queue.push(flow, weight, job)
+        try:
+            # One runner per job; each runs whichever job is next in fair order.
+            self._executor.submit(self._run_next)
+        except BaseException:
+            self._queue.remove(job)
+            fut.cancel()
+            raise
+        return fut
+
+    def _done(self, job) -> None:
+        if job[0].cancelled():
+            # Cancelled while queued: out of the queue now, not when a runner
+            # gets to it, so it no longer counts for drop_for() / PoolFull.
+            self._queue.remove(job)
+        self._slots.release()
+
+    def _make_room(self, flow: Optional[Hashable], weight: float) -> None:
+        """Take a slot from the heaviest flow's newest queued job, or raise PoolFull."""
+        while True:
+            dropped = self._queue.drop_for(flow, weight) if flow is not None else None
+            if dropped is None:
+                raise PoolFull(f"{self.workers} workers busy and "
+                               f"{self.queue_depth} requests already queued")
+            victim, (fut, *_job) = dropped
+            if not fut.cancelled():  # a cancelled job already gave its slot back
+                fut.set_exception(Preempted(
+                    f"queue full: {victim} has the most queued requests, "
+                    "dropped to make room for another client"))
+            if self._slots.acquire(blocking=False):
+                return
+
+    def _run_next(self) -> None:
+        while True:
+            try:
+                fut, fn, args, kwargs = self._queue.pop()
+            except IndexError:
+                return  # its job was cancelled or preempted and taken by another runner
+            if fut.set_running_or_notify_cancel():
+                break
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(result)
+
+    def shutdown(self, wait: bool = True) -> None:
+        while True:
+            try:
+                fut, *_job = self._queue.pop()
+            except IndexError:
+                break
+            fut.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class InlinePool:
+    """Runs jobs synchronously; kept for debugging and single-client setups."""
+
+    workers = 1
+    queue_depth = 0
+
+    def submit(self, fn: Callable, *args, flow: Optional[Hashable] = None,
+               weight: float = 1.0, **kwargs) -> Future:
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+def create_pool(cfg: dict):
+    """Build the pool selected by RELAY_DISPATCH (see relay/config.py)."""
+    if cfg.get("dispatch") == "inline":
+        return InlinePool()
+    return WorkerPool(cfg.get("workers", 4), cfg.get("queue_depth", 32))
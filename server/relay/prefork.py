@@ -0,0 +1,146 @@
+# relay/prefork.py
+"""
+Prefork mode: RELAY_PROCESSES relay processes serving one port.
+
+One relay process runs all its Python on one core (the GIL), however many
+worker threads it has, so CPU work on the reply path (JSON/base64
+re-encoding, image packing) stops scaling at one core. With
+RELAY_PROCESSES=N > 1 the server script becomes a supervisor that starts N
+copies of itself as workers, each with its own create_llm() client, pool,
+limits, metrics (RELAY_METRICS_PORT + i) and journal (name.w<i>.jsonl):
+
+- RELAY_REUSEPORT=1 (default, where the OS has SO_REUSEPORT): every
+  worker binds its own listening socket and the kernel spreads new
+  connections across them.
+- RELAY_REUSEPORT=0: the supervisor binds once and the workers inherit
+  the socket (RELAY_LISTEN_FD) and accept() from the same queue.
+
+Workers are re-executed rather than forked, so no Qt/asyncio/thread state
+crosses the process boundary. The supervisor restarts a worker that exits
+(waiting longer each time one dies right after starting) and on
+SIGTERM/SIGINT forwards SIGTERM: workers stop accepting, finish their
+requests within RELAY_SHUTDOWN_GRACE seconds and exit.
+"""
+from __future__ import annotations
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+MIN_UPTIME = 5.0      # a worker that dies sooner is restarted with a growing delay
+MAX_RESTART_DELAY = 30.0
+
+
+def reuseport_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def create_listener(port: int, reuse_port: bool = False) -> socket.socket:
+    """Listening TCP socket on every address (IPv6 + IPv4 where possible)."""
+    dualstack = socket.has_dualstack_ipv6()
+    return socket.create_server(("", port), backlog=1024, reuse_port=reuse_port,
+                                family=socket.AF_INET6 if dualstack else socket.AF_INET,
+                                dualstack_ipv6=dualstack)
+
+
+def listen_socket(cfg: dict) -> Optional[socket.socket]:
+    """The listening socket of a prefork worker, or None outside prefork mode."""
+    if cfg.get("listen_fd", -1) >= 0:
+        return socket.socket(fileno=cfg["listen_fd"])
+    if cfg.get("process_index", -1) >= 0:
+        return create_listener(cfg["port"], reuse_port=True)
+    return None
+
+
+def worker_env(cfg: dict, index: int, listen_fd: Optional[int]) -> Dict[str, str]:
+    """Environment of worker `index`: one process, own metrics port and journal."""
+    env = dict(os.environ, RELAY_PROCESSES="1", RELAY_PROCESS_INDEX=str(index))
+    if listen_fd is not None:
+        env["RELAY_LISTEN_FD"] = str(listen_fd)
+    if cfg.get("metrics_port"):
+        env["RELAY_METRICS_PORT"] = str(cfg["metrics_port"] + index)
+    if cfg.get("journal"):
+        root, ext = os.path.splitext(cfg["journal"])
+        env["RELAY_JOURNAL"] = f"{root}.w{index}{ext}"
+    return env
+
+
+class _Worker:
+    __slots__ = ("index", "proc", "started", "delay", "due")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.delay = 0.0   # restart delay after the last early death
+        self.due = 0.0     # monotonic time of the next (re)start
+
+
+def supervise(cfg: dict, script: str, argv: Optional[List[str]] = None) -> int:
+    """Run `script` in RELAY_PROCESSES worker processes until SIGTERM/SIGINT."""
+    argv = sys.argv[1:] if argv is None else argv
+    listener = None
+    if not (cfg.get("reuseport", True) and reuseport_supported()):
+        try:
+            listener = create_listener(cfg["port"])
+        except OSError as e:
+            log.error("Listen failed: %s", e)
+            return 1
+        listener.set_inheritable(True)
+    fd = listener.fileno() if listener is not None else None
+    cmd = [sys.executable, os.path.abspath(script), *argv]
+
+    stopping = threading.Event()
+
+    def on_signal(signum, _frame):
+        log.info("supervisor: %s, stopping workers", signal.Signals(signum).name)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    workers = [_Worker(i) for i in range(cfg["processes"])]
+    log.info("supervisor: %d workers on port %d (%s)", len(workers), cfg["port"],
+             "inherited socket" if listener is not None else "SO_REUSEPORT")
+    while not stopping.is_set():
+        now = time.monotonic()
+        for w in workers:
+            if w.proc is not None:
+                code = w.proc.poll()
+                if code is None:
+                    continue
+                uptime = now - w.started
+                w.delay = (min(max(w.delay * 2, 0.5), MAX_RESTART_DELAY)
+                           if uptime < MIN_UPTIME else 0.0)
+                log.warning("supervisor: worker %d (pid %d) exited with %s after %.1fs; "
+                            "restarting in %.1fs", w.index, w.proc.pid, code, uptime, w.delay)
+                w.proc, w.due = None, now + w.delay
+            if now >= w.due:
+                w.proc = subprocess.Popen(cmd, env=worker_env(cfg, w.index, fd),
+                                          pass_fds=(fd,) if fd is not None else ())
+                w.started = now
+                log.info("supervisor: worker %d started (pid %d)", w.index, w.proc.pid)
+        stopping.wait(0.2)
+
+    running = [w.proc for w in workers if w.proc is not None and w.proc.poll() is None]
+    for proc in running:
+        proc.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + cfg.get("shutdown_grace", 10.0) + 5.0
+    for proc in running:
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            log.warning("supervisor: worker pid %d did not stop, killing it", proc.pid)
+            proc.kill()
+            proc.wait()
+    if listener is not None:
+        listener.close()
+    log.info("supervisor: stopped")
+    return 0
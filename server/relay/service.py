@@ -0,0 +1,118 @@
+# relay/service.py
+"""
+What the relay does with one request, shared by both servers.
+
+- call_llm():  blocking; runs on a worker thread (Qt server, sync adapters).
+- acall_llm(): coroutine; awaits the adapter's `achat` (native async I/O,
+               or the port's default thread offload onto the loop's executor).
+
+Both return (kind, payload) ready for Session.reply(): the reply text on
+success, an IMAGES frame if the reply is an image-bridge result (decoded
+from base64 once, here, and sent as raw bytes), or an ERROR frame carrying
+the exception message.
+
+For STREAM requests, stream_llm() / astream_llm() produce the reply as
+CHUNK frames followed by END (or ERROR if the backend fails midway), each
+as (kind, payload, final) so chunks reach the socket as they arrive.
+"""
+from __future__ import annotations
+import logging
+from typing import AsyncIterator, Callable, Tuple
+
+from llm.layers.base import Layer
+from llm.port import ChatMessage, LLMClient
+from .framing import Kind
+from .images import pack_images, reply_images
+
+MAX_TOKENS = 500
+
+log = logging.getLogger(__name__)
+
+
+def request_text(frame) -> str:
+    """Decode a TEXT request frame into the prompt string."""
+    return frame.payload.decode("utf-8", errors="replace").strip()
+
+
+def _ok(text: str) -> Tuple[int, bytes]:
+    log.debug("[LLM OUT] %s", text)
+    return Kind.TEXT, text.encode("utf-8", errors="replace")
+
+
+def _reply(reply) -> Tuple[int, bytes]:
+    """TEXT for plain replies, IMAGES for image-bridge replies."""
+    decoded = reply_images(reply.raw)
+    if decoded is None:
+        return _ok(reply.text)
+    images, mime = decoded
+    payload = pack_images(images, mime)
+    log.debug("[LLM OUT] %d images (%s, %d bytes)", len(images), mime, len(payload))
+    return Kind.IMAGES, payload
+
+
+def _err(e: Exception) -> Tuple[int, bytes]:
+    log.warning("LLM_ERROR: %s", e)
+    return Kind.ERROR, str(e).encode("utf-8", errors="replace")
+
+
+def call_llm(llm, text: str) -> Tuple[int, bytes]:
+    """Call the LLM synchronously and return (kind, payload)."""
+    try:
+        return _reply(llm.chat_text(text, max_tokens=MAX_TOKENS))
+    except Exception as e:
+        return _err(e)
+
+
+def is_async(llm) -> bool:
+    """True when the provider under the layers overrides `achat` with native async I/O.
+
+    Layers (llm/layers/) always override `achat` to forward it, so the
+    chain is followed down to the provider; a router is async when all of
+    its backends are.
+    """
+    while isinstance(llm, Layer):
+        llm = llm.inner
+    backends = getattr(llm, "backends", None)
+    if backends is not None:
+        return all(is_async(b.client) for b in backends)
+    return type(llm).achat is not LLMClient.achat
+
+
+async def acall_llm(llm, text: str) -> Tuple[int, bytes]:
+    """Await the LLM and return (kind, payload)."""
+    try:
+        return _reply(await llm.achat_text(text, max_tokens=MAX_TOKENS))
+    except Exception as e:
+        return _err(e)
+
+
+def stream_llm(llm, text: str, emit: Callable[[int, bytes, bool], None]) -> None:
+    """Blocking: stream the reply, calling emit(kind, payload, final) per frame."""
+    parts = []
+    try:
+        for chunk in llm.stream_chat([ChatMessage(role="user", content=text)],
+                                     max_tokens=MAX_TOKENS):
+            if chunk:
+                parts.append(chunk)
+                emit(Kind.CHUNK, chunk.encode("utf-8", errors="replace"), False)
+    except Exception as e:
+        emit(*_err(e), True)
+        return
+    log.debug("[LLM OUT] %s", "".join(parts))
+    emit(Kind.END, b"", True)
+
+
+async def astream_llm(llm, text: str) -> AsyncIterator[Tuple[int, bytes, bool]]:
+    """Async `stream_llm`: yields (kind, payload, final) per frame."""
+    parts = []
+    try:
+        async for chunk in llm.astream_chat([ChatMessage(role="user", content=text)],
+                                            max_tokens=MAX_TOKENS):
+            if chunk:
+                parts.append(chunk)
+                yield Kind.CHUNK, chunk.encode("utf-8", errors="replace"), False
+    except Exception as e:
+        yield (*_err(e), True)
+        return
+    log.debug("[LLM OUT] %s", "".join(parts))
+    yield Kind.END, b"", True
@@ -0,0 +1,230 @@
+# relay/session.py
+"""
+Per-connection protocol state, independent of the socket library.
+
+A Session owns the connection's framer (reassembly buffer) and numbers
+every request it decodes. Replies may finish in any order on the worker
+pool, but a client that pipelines several requests on one socket expects
+answers in request order, so replies are held until all earlier ones
+have been written. A streamed reply is several frames for the same seq;
+its chunks go out immediately while it is at the head of the queue.
+
+Tagged requests (length framing, see relay/framing.py) opt out of the
+ordering: their replies carry the client's request id and are written as
+soon as they are ready. A CANCEL frame is handled here: the request's
+pending and future reply frames are dropped.
+
+Every request gets a CancelToken (llm/cancel.py), fired by CANCEL or when
+the socket closes; the servers hang the queued job / running call on it.
+With a Journal (relay/journal.py) every request also gets a Trace, which
+is recorded when its final reply is sent or it is cancelled.
+
+A HELLO frame sets the session's api_key; together with the peer address
+it is what relay/admission.py identifies the client by. A PING frame is
+answered with a PONG right away, outside the reply ordering.
+
+A line client that sends no newline (the original protocol) leaves its
+prompt buffered: while `partial` is set, the servers call flush() once
+the client has been quiet for RELAY_LINE_IDLE_MS.
+"""
+from __future__ import annotations
+import itertools
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llm.cancel import CancelToken
+
+from . import monitor
+from .framing import DEFAULT_MAX_FRAME, Frame, FramingError, Kind, make_framer
+from .journal import Journal, Trace
+
+_conn_ids = itertools.count(1)
+
+
+def _kind_name(kind: int) -> str:
+    """Metric label: a known Kind, else "other" (the byte comes from the client)."""
+    try:
+        return Kind(kind).name.lower()
+    except ValueError:
+        return "other"
+
+
+class Session:
+    """Reassembles frames from one socket and writes replies (in order unless tagged)."""
+
+    def __init__(self, write: Callable[[bytes], None], framing: str = "auto",
+                 max_frame: int = DEFAULT_MAX_FRAME, journal: Optional[Journal] = None,
+                 peer: str = ""):
+        self.framer = make_framer(framing, max_frame)
+        self.conn = next(_conn_ids)
+        self.peer = peer            # client address
+        self.api_key: Optional[str] = None  # from a HELLO frame
+        self.journal = journal
+        self.open = True
+        self.admitted = True        # False: over the connection limit, reject everything
+        self._write = write
+        self._next_seq = 0          # seq given to the next decoded request
+        self._order = deque()       # untagged seqs without a final reply, oldest first
+        self._ready: Dict[int, List[bytes]] = {}  # buffered frames per seq
+        self._done = set()                        # buffered seqs that are complete
+        self._tags: Dict[int, int] = {}           # seq -> request id, tagged requests
+        self._by_id: Dict[int, int] = {}          # request id -> seq
+        self._cancelled = set()                   # tagged seqs whose replies are dropped
+        self._tokens: Dict[int, CancelToken] = {}  # seq -> token until the final reply
+        self._traces: Dict[int, Trace] = {}       # seq -> trace, with a journal only
+
+    def feed(self, data: bytes) -> List[Tuple[int, Frame]]:
+        """Decode a socket chunk; return (seq, frame) for every complete request."""
+        monitor.BYTES_IN.inc(len(data))
+        return self._requests(self.framer.feed(data))
+
+    @property
+    def partial(self) -> bool:
+        """An unterminated line is buffered: flush() it if the client goes quiet."""
+        return self.framer.partial
+
+    def flush(self) -> List[Tuple[int, Frame]]:
+        """The client is idle: take a buffered unterminated line as its request."""
+        return self._requests(self.framer.flush())
+
+    def _requests(self, frames: List[Frame]) -> List[Tuple[int, Frame]]:
+        out = []
+        for frame in frames:
+            monitor.REQUESTS.inc(kind=_kind_name(frame.kind))
+            if frame.kind == Kind.CANCEL:
+                self.cancel(frame.id)
+                continue
+            if frame.kind == Kind.HELLO:
+                self.hello(frame.payload)
+                continue
+            if frame.kind == Kind.PING:
+                if self.open:
+                    self._send(self.framer.encode(Kind.PONG, frame.payload, frame.id))
+                continue
+            seq = self._next_seq
+            self._next_seq += 1
+            self._tokens[seq] = CancelToken()
+            if self.journal is not None:
+                self._traces[seq] = Trace(_kind_name(frame.kind),
+                                          frame.payload.decode("utf-8", errors="replace").strip(),
+                                          frame.id)
+            if frame.id is None:
+                self._order.append(seq)
+            else:
+                self._tags[seq] = frame.id
+                self._by_id[frame.id] = seq
+            out.append((seq, frame))
+        return out
+
+    def backlog(self, seq: int) -> int:
+        """Requests decoded before `seq` whose replies are not finished yet."""
+        return (sum(1 for s in self._order if s < seq)
+                + sum(1 for s in self._tags if s < seq))
+
+    @property
+    def pending(self) -> int:
+        """Requests still waiting for their final reply (not cancelled)."""
+        return len(self._tokens)
+
+    def token(self, seq: int) -> CancelToken:
+        """The CancelToken of request `seq` (already fired once it is answered)."""
+        token = self._tokens.get(seq)
+        if token is None:
+            token = CancelToken()
+            token.cancel()
+        return token
+
+    def trace(self, seq: int) -> Optional[Trace]:
+        """The journal Trace of request `seq` (None without a journal)."""
+        return self._traces.get(seq)
+
+    def hello(self, payload: bytes) -> None:
+        """Take the client's API key from a HELLO frame."""
+        try:
+            key = json.loads(payload).get("api_key")
+        except (ValueError, AttributeError):
+            raise FramingError("HELLO payload is not a JSON object") from None
+        self.api_key = str(key) if key else None
+
+    def cancel(self, request_id) -> None:
+        """Forget tagged request `request_id` and cancel its work."""
+        seq = self._by_id.pop(request_id, None)
+        if seq is not None:
+            del self._tags[seq]
+            self._cancelled.add(seq)
+            self._tokens.pop(seq).cancel()
+            self._record(seq, "cancelled")
+
+    def reply(self, seq: int, kind: int, payload: bytes, final: bool = True) -> None:
+        """Send a reply frame for request `seq` (final=False for stream chunks)."""
+        if not self.open:
+            return
+        if seq in self._cancelled:
+            if final:
+                self._cancelled.discard(seq)
+            return
+        trace = self._traces.get(seq)
+        if trace is not None:
+            if not final and trace.first is None:
+                trace.first = time.perf_counter()
+            trace.bytes += len(payload)
+            trace.digest.update(payload)
+        if final:
+            monitor.REPLIES.inc(kind=_kind_name(kind))
+            self._tokens.pop(seq, None)
+            self._record(seq, _kind_name(kind))
+        request_id = self._tags.get(seq)
+        if request_id is not None:
+            if final:
+                del self._tags[seq]
+                self._by_id.pop(request_id, None)
+            self._send(self.framer.encode(kind, payload, request_id))
+            return
+        wire = self.framer.encode(kind, payload)
+        if seq != self._order[0]:
+            self._ready.setdefault(seq, []).append(wire)
+            if final:
+                self._done.add(seq)
+            return
+        self._send(wire)
+        if final:
+            self._advance()
+
+    def _advance(self) -> None:
+        """Move past the finished head and flush whatever is buffered behind it."""
+        order = self._order
+        order.popleft()
+        while order and order[0] in self._ready:
+            head = order[0]
+            for wire in self._ready.pop(head):
+                self._send(wire)
+            if head not in self._done:
+                return  # still streaming: later chunks are written directly
+            self._done.discard(head)
+            order.popleft()
+
+    def _record(self, seq: int, outcome: str) -> None:
+        trace = self._traces.pop(seq, None)
+        if trace is not None:
+            self.journal.record(self.conn, seq, trace, outcome)
+
+    def _send(self, wire: bytes) -> None:
+        monitor.BYTES_OUT.inc(len(wire))
+        self._write(wire)
+
+    def close(self) -> None:
+        """Mark the socket gone: pending and future replies are dropped, work cancelled."""
+        self.open = False
+        tokens, self._tokens = list(self._tokens.values()), {}
+        for token in tokens:
+            token.cancel()
+        for seq in list(self._traces):
+            self._record(seq, "cancelled")
+        self._ready.clear()
+        self._done.clear()
+        self._order.clear()
+        self._tags.clear()
+        self._by_id.clear()
+        self._cancelled.clear()
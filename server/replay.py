@@ -0,0 +1,183 @@
+"""
+Replay a relay journal (relay/journal.py) through any provider.
+
+Reads the journal (and its rotated files, oldest first), sends every
+recorded prompt to an LLM client built by create_llm() with the original
+arrival pattern, and compares the latency distribution and the replies
+with what was recorded:
+
+  RELAY_JOURNAL=traffic.jsonl python server.py       # record
+  LLM_PROVIDER=llama LLM_BASE_URL=http://new:8080/v1 \
+      python replay.py traffic.jsonl --speed 2        # replay, twice as fast
+
+Prefork workers (RELAY_PROCESSES) each write their own journal; pass all
+of them (traffic.w*.jsonl) to replay their merged arrival pattern.
+
+--speed scales the recorded inter-arrival times (0 = ignore them and keep
+--concurrency requests in flight). Requests go through relay/service.py
+like in the servers, so reply hashes are comparable with the journal's:
+"changed" counts replies whose hash differs from the recorded one (only
+meaningful for deterministic providers).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from bench import percentile
+from llm.factory import create_llm
+from relay.framing import Kind
+from relay.journal import journal_files
+from relay.service import acall_llm, astream_llm
+
+OK_OUTCOMES = ("text", "images", "end")
+
+
+def load_journal(paths, only_ok=False, limit=0):
+    """Replayable records (text/stream requests with a prompt), in arrival order."""
+    records = []
+    names = [name for path in paths for name in journal_files(path) or [path]]
+    for name in names:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if rec.get("kind") not in ("text", "stream") or not rec.get("prompt"):
+                    continue
+                if only_ok and rec.get("outcome") not in OK_OUTCOMES:
+                    continue
+                records.append(rec)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+async def replay_one(llm, rec):
+    """Send one recorded request; return its replay result."""
+    digest, size, first = hashlib.sha256(), 0, None
+    t0 = time.perf_counter()
+    if rec["kind"] == "stream":
+        kind = Kind.END
+        async for kind, payload, final in astream_llm(llm, rec["prompt"]):
+            if first is None:
+                first = time.perf_counter()
+            digest.update(payload)
+            size += len(payload)
+    else:
+        kind, payload = await acall_llm(llm, rec["prompt"])
+        digest.update(payload)
+        size = len(payload)
+    elapsed = time.perf_counter() - t0
+    return {
+        "conn": rec.get("conn"), "seq": rec.get("seq"), "kind": rec["kind"],
+        "outcome": Kind(kind).name.lower(),
+        "llm_ms": round(elapsed * 1000, 3),
+        "first_ms": round((first - t0) * 1000, 3) if first is not None else None,
+        "recorded_llm_ms": rec.get("llm_ms"), "recorded_outcome": rec.get("outcome"),
+        "bytes": size, "sha256": digest.hexdigest()[:16] if size else None,
+        "changed": bool(rec.get("sha256")) and rec.get("outcome") == Kind(kind).name.lower()
+                   and digest.hexdigest()[:16] != rec["sha256"],
+    }
+
+
+async def run(args, llm, records):
+    slots = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async def one(rec):
+        async with slots:
+            results.append(await replay_one(llm, rec))
+
+    start = time.perf_counter()
+    tasks = []
+    if args.speed > 0:
+        # Open loop: request i goes out at its recorded offset / speed.
+        t_first = records[0]["ts"]
+        for rec in records:
+            delay = (rec["ts"] - t_first) / args.speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(rec)))
+    else:
+        tasks = [asyncio.create_task(one(rec)) for rec in records]
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def summary(values):
+    v = sorted(x for x in values if x is not None)
+    if not v:
+        return {"n": 0}
+    return {"n": len(v), "p50_ms": percentile(v, 0.50), "p95_ms": percentile(v, 0.95),
+            "p99_ms": percentile(v, 0.99), "max_ms": v[-1]}
+
+
+def report(args, records, results, elapsed):
+    ok = [r for r in results if r["outcome"] in OK_OUTCOMES]
+    out = {
+        "provider": args.provider or os.getenv("LLM_PROVIDER", "llama"), "requests": len(results),
+        "elapsed_s": round(elapsed, 2),
+        "recorded_span_s": round(records[-1]["ts"] - records[0]["ts"], 2),
+        "errors": sum(r["outcome"] == "error" for r in results),
+        "changed": sum(r["changed"] for r in results),
+        "recorded": summary(r.get("llm_ms") for r in records
+                            if r.get("outcome") in OK_OUTCOMES),
+        "replay": summary(r["llm_ms"] for r in ok),
+    }
+    first = [r["first_ms"] for r in ok if r["first_ms"] is not None]
+    if first:
+        out["replay_first_chunk"] = summary(first)
+    if args.json:
+        print(json.dumps(out))
+        return
+    for k, v in out.items():
+        if isinstance(v, dict):
+            v = "  ".join(f"{key}={val:.1f}" if isinstance(val, float) else f"{key}={val}"
+                          for key, val in v.items())
+        print(f"{k:>20}: {v}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Replay a relay journal through a provider.")
+    p.add_argument("journal", nargs="+",
+                   help="journal file(s) (RELAY_JOURNAL); rotated files are included")
+    p.add_argument("--provider", help="provider for create_llm() (default: LLM_PROVIDER)")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="arrival-time scale factor (0 = as fast as --concurrency allows)")
+    p.add_argument("--concurrency", "-c", type=int, default=16, help="max requests in flight")
+    p.add_argument("--limit", "-n", type=int, default=0, help="replay only the first N requests")
+    p.add_argument("--only-ok", action="store_true",
+                   help="skip requests that were rejected, failed or cancelled")
+    p.add_argument("--out", help="write per-request replay results (JSONL) here")
+    p.add_argument("--json", action="store_true", help="print one JSON line")
+    args = p.parse_args(argv)
+
+    load_dotenv()
+    records = load_journal(args.journal, args.only_ok, args.limit)
+    if not records:
+        raise SystemExit(f"nothing to replay in {' '.join(args.journal)}")
+    llm = create_llm(args.provider)
+
+    async def go():
+        # Thread-offloaded adapters get as many threads as requests in flight.
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency))
+        return await run(args, llm, records)
+
+    results, elapsed = asyncio.run(go())
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+    report(args, records, results, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,61 +2,261 @@
 Minimal TCP→LLM relay.
 
 Flow:
-  TCP client text → handle_ready_read() → llm.chat_text(text) → write reply.
+  TCP bytes → handle_ready_read() → session.feed() → complete request frames
+  each frame → admission checks → pool.submit(call_llm, llm, text)
+  worker thread: llm.chat_text(text) → bridge.frame signal
+  Qt thread: write_frame() → session.reply() → socket (in request order,
+  or as soon as ready for tagged requests, which carry the client's id).
+STREAM requests run stream_llm() instead, which emits one bridge.frame per
+chunk, so the client sees the first tokens while the rest are generated.
+Requests over the connection/in-flight/queue limits are answered at once
+with a BUSY frame (relay/admission.py) instead of piling up; waiting
+requests are started in weighted fair order across clients, optionally
+rate-limited per client (relay/fair.py).
+A CANCEL frame or a disconnect fires the request's CancelToken: a queued
+job is removed from the pool, a running call is aborted (llm/cancel.py).
 The LLM client is created once via factory+ENV (see llm/factory.py and .env).
+Dispatch and framing are configured via RELAY_* vars (see relay/config.py).
+Metrics are served on /metrics (relay/monitor.py); logging is queued
+(relay/logs.py) so no request thread blocks on stdout.
+With RELAY_JOURNAL set, every request is appended to a journal
+(relay/journal.py) that replay.py can feed back through any provider.
+RELAY_PROCESSES=N runs N copies of this script on the same port under a
+supervisor (relay/prefork.py). SIGTERM/SIGINT stop accepting, let the
+requests in flight finish (RELAY_SHUTDOWN_GRACE) and then exit.
+async_server.py serves the same protocol without Qt.
 """
-from PyQt5.QtCore import QCoreApplication
-from PyQt5.QtNetwork import QTcpServer, QHostAddress
+from PyQt5.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+from PyQt5.QtNetwork import QAbstractSocket, QTcpServer, QHostAddress
 from dotenv import load_dotenv
+import logging
+import os
+import signal
 import sys
+import time
 
-from llm.factory import create_llm  
+from llm.cancel import Cancelled
+from llm.factory import create_llm
+from relay.admission import Admission, Busy
+from relay.fair import Preempted
+from relay.config import load_relay_cfg
+from relay.framing import FramingError, Kind
+from relay.journal import Journal, timed
+from relay.logs import setup_logging
+from relay.monitor import CANCELLED, INFLIGHT, WRITE, start_metrics_server
+from relay.pool import PoolFull, create_pool
+from relay.prefork import listen_socket, supervise
+from relay.service import call_llm, request_text, stream_llm
+from relay.session import Session
 
 load_dotenv()
+relay_cfg = load_relay_cfg()
+setup_logging(relay_cfg["log_level"], relay_cfg["process_index"])
+log = logging.getLogger("relay.server")
+
+# RELAY_PROCESSES > 1: this process only supervises copies of this script.
+if relay_cfg["processes"] > 1:
+    sys.exit(supervise(relay_cfg, __file__))
 
 app = QCoreApplication([])
 server = QTcpServer()
 
-# Start listening on 0.0.0.0:12345
-if not server.listen(QHostAddress.Any, 12345):
-    print("Listen failed")
+# Start listening on 0.0.0.0:RELAY_PORT (12345), or on the socket of a prefork worker
+sock = listen_socket(relay_cfg)
+if sock is not None:
+    listening = server.setSocketDescriptor(sock.detach())
+else:
+    listening = server.listen(QHostAddress.Any, relay_cfg["port"])
+if not listening:
+    log.error("Listen failed")
     sys.exit(1)
 
 # Create one LLM client (adapter) for the entire process.
 # The factory reads: LLM_PROVIDER, LLM_BASE_URL, LLM_MODEL, LLM_API_KEY, LLM_TIMEOUT.
 llm = create_llm()
 
-def handle_ready_read(client):
-    """Read bytes from the socket, call the LLM, write back the text reply."""
-    data_bytes = client.readAll().data()
-    if not data_bytes:
+# Worker pool + framing: RELAY_DISPATCH, RELAY_WORKERS, RELAY_QUEUE_DEPTH, RELAY_FRAMING.
+pool = create_pool(relay_cfg)
+
+# Overload policy: RELAY_MAX_CONNECTIONS, RELAY_CONN_INFLIGHT, RELAY_QUEUE_TIMEOUT,
+# per client: RELAY_RATE_LIMIT, RELAY_RATE_BURST, RELAY_FAIR_QUEUE, RELAY_API_KEYS.
+admission = Admission(relay_cfg)
+
+# Request journal: RELAY_JOURNAL, RELAY_JOURNAL_MAX_BYTES, ... (None when off).
+journal = Journal.from_config(relay_cfg, provider=os.getenv("LLM_PROVIDER", "llama").lower())
+
+
+class ReplyBridge(QObject):
+    """Carries reply frames from worker threads back to the Qt thread."""
+    # (session, seq, kind, payload, final, perf_counter() when the frame was ready)
+    frame = pyqtSignal(object, int, int, bytes, bool, float)
+
+
+bridge = ReplyBridge()
+
+
+def write_frame(session, seq, kind, payload, final, ready):
+    """Runs on the Qt thread: hand a reply frame to its session."""
+    session.reply(seq, kind, payload, final)  # no-op once the client disconnected
+    WRITE.observe(time.perf_counter() - ready)
+
+
+bridge.frame.connect(write_frame)
+
+
+def dispatch(session, seq, frame):
+    """Admit one decoded request and submit it to the worker pool."""
+    if frame.kind not in (Kind.TEXT, Kind.STREAM):
+        session.reply(seq, Kind.ERROR, f"unsupported frame kind {frame.kind}".encode())
         return
-    text = data_bytes.decode("utf-8", errors="replace").strip()
-    print(f"[TCP IN] {text}")
+    text = request_text(frame)
+    log.debug("[TCP IN] %s", text)
+
+    # Both paths emit from the worker thread; the signal queues them to Qt.
+    def emit(kind, payload, final):
+        bridge.frame.emit(session, seq, kind, payload, final, time.perf_counter())
 
+    def done(fut):
+        INFLIGHT.dec()
+        if fut.cancelled():  # removed from the queue by the token below
+            CANCELLED.inc(stage="queued")
+            return
+        e = fut.exception()
+        if isinstance(e, Cancelled):
+            CANCELLED.inc(stage="running")
+        elif isinstance(e, Preempted):  # queue full: gave its place to a lighter client
+            emit(Kind.BUSY, admission.throttle(session, "fair_share", str(e)).payload(), True)
+        elif isinstance(e, Busy):  # dropped after waiting past RELAY_QUEUE_TIMEOUT
+            emit(Kind.BUSY, e.payload(), True)
+        elif frame.kind == Kind.TEXT:
+            emit(*fut.result(), True)
+
+    token = session.token(seq)
+    trace = session.trace(seq)
     try:
-        reply = llm.chat_text(text, max_tokens=500)
-        print(f"[LLM OUT] {reply.text}")
+        flow, weight = admission.check(session, seq)
+        enqueued = time.monotonic()
+        if frame.kind == Kind.STREAM:
+            fut = pool.submit(admission.run, enqueued, token, timed(trace, stream_llm),
+                              llm, text, emit, flow=flow, weight=weight)
+        else:
+            fut = pool.submit(admission.run, enqueued, token, timed(trace, call_llm),
+                              llm, text, flow=flow, weight=weight)
+    except PoolFull as e:
+        session.reply(seq, Kind.BUSY, admission.busy("queue_full", str(e)).payload())
+        return
+    except Busy as e:
+        session.reply(seq, Kind.BUSY, e.payload())
+        return
+    INFLIGHT.inc()
+    fut.add_done_callback(done)
+    # Still queued: drop the job (frees its queue slot). Running: the call
+    # itself sees the token and is aborted.
+    token.on_cancel(fut.cancel)
+
+
+def handle_ready_read(client, session, idle):
+    """Feed socket bytes into the session and dispatch every complete request."""
+    try:
+        decoded = session.feed(client.readAll().data())
+    except FramingError as e:
+        log.warning("[TCP] protocol error: %s", e)
+        client.write(session.framer.encode(Kind.ERROR, str(e).encode("utf-8")))
+        session.close()
+        client.disconnectFromHost()
+        return
+    # An unterminated line becomes a prompt once the client goes quiet
+    if session.partial and relay_cfg["line_idle_ms"] > 0:
+        idle.start(int(relay_cfg["line_idle_ms"]))
+    else:
+        idle.stop()
+    handle_decoded(client, session, decoded)
+
+
+def handle_decoded(client, session, decoded):
+    """Dispatch decoded requests (or turn them all away if over the connection limit)."""
+    if not session.admitted:
+        # Over RELAY_MAX_CONNECTIONS: answer in the client's framing, then hang up.
+        for seq, _frame in decoded:
+            session.reply(seq, Kind.BUSY, admission.reject_connection().payload())
+        if decoded:
+            client.disconnectFromHost()
+        return
+    for seq, frame in decoded:
+        dispatch(session, seq, frame)
+
+
+connections = {}  # QTcpSocket -> Session for every open socket
 
-        # Many TCP clients expect a newline to detect end-of-message.
-        wire = (reply.text + "\n").encode("utf-8", errors="replace")
-        client.write(wire)
-        client.flush()  # ensure it goes out immediately
-        # Optional for simple clients: close after one reply
-        # client.disconnectFromHost()
-    except Exception as e:
-        err = f"LLM_ERROR: {e}"
-        print(err)
-        client.write(err.encode("utf-8"))
 
 def on_new_connection():
     """Wire per-connection signals to our handler and cleanup."""
     client = server.nextPendingConnection()
-    print("[TCP] new connection")
-    client.readyRead.connect(lambda: handle_ready_read(client))
-    client.disconnected.connect(lambda: print("[TCP] disconnected"))
+    # No Nagle: small CHUNK/END frames would otherwise wait ~40 ms for the delayed ACK
+    client.setSocketOption(QAbstractSocket.LowDelayOption, 1)
+    log.debug("[TCP] new connection")
+
+    def write(wire):
+        client.write(wire)
+        client.flush()  # ensure it goes out immediately
+
+    session = Session(write, relay_cfg["framing"], relay_cfg["max_frame"], journal,
+                      peer=client.peerAddress().toString())
+    session.admitted = admission.connect()
+    # Keep the socket wrapper referenced until disconnect: otherwise Python's
+    # GC may free it (and the slots below) while Qt still delivers signals.
+    connections[client] = session
+
+    def on_disconnected():
+        log.debug("[TCP] disconnected")
+        session.close()
+        if session.admitted:
+            admission.disconnect()
+        connections.pop(client, None)
+
+    idle = QTimer(client)
+    idle.setSingleShot(True)
+    idle.timeout.connect(lambda: handle_decoded(client, session, session.flush()))
+    client.readyRead.connect(lambda: handle_ready_read(client, session, idle))
+    client.disconnected.connect(on_disconnected)
     client.disconnected.connect(client.deleteLater)
 
+
+def shutdown(signum, _frame):
+    """SIGTERM/SIGINT: stop accepting, finish the requests in flight, then quit."""
+    if not server.isListening():
+        return
+    log.info("%s: draining %d connections", signal.Signals(signum).name, len(connections))
+    server.close()
+    deadline = time.monotonic() + relay_cfg["shutdown_grace"]
+
+    def drain():
+        if connections and time.monotonic() < deadline:
+            for client, session in list(connections.items()):
+                if not session.pending:
+                    client.disconnectFromHost()  # after the buffered replies are written
+            return
+        app.quit()
+
+    drainer.timeout.connect(drain)
+    drainer.start(50)
+
+
+# Python runs signal handlers between bytecodes; the ticker wakes it up
+# while Qt's event loop is blocked in C++.
+ticker = QTimer()
+ticker.timeout.connect(lambda: None)
+ticker.start(200)
+drainer = QTimer()
+signal.signal(signal.SIGTERM, shutdown)
+signal.signal(signal.SIGINT, shutdown)
+
 server.newConnection.connect(on_new_connection)
-print("Server running on port 12345")
+start_metrics_server(relay_cfg)  # RELAY_METRICS_PORT, RELAY_METRICS_HOST
+log.info("Server running on port %d (%s, %d workers, queue %d, framing %s)",
+         relay_cfg["port"], relay_cfg["dispatch"], pool.workers, pool.queue_depth,
+         relay_cfg["framing"])
 app.exec_()
+pool.shutdown(wait=False)
+if journal is not None:
+    journal.close()
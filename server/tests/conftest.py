@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""The server's modules import as top-level packages (relay, llm), as when run from server/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+# tests/fakes.py
+"""Small LLMClient doubles for the layer and router tests."""
+import asyncio
+import threading
+
+from llm import cancel
+from llm.port import ChatMessage, ChatResponse, LLMClient
+
+
+def user(text):
+    return [ChatMessage(role="user", content=text)]
+
+
+class Echo(LLMClient):
+    """Replies "<n>:<prompt>", n counting the calls; optional delay and failures."""
+
+    def __init__(self, delay=0.0, error=None, deterministic=False):
+        self.delay = delay
+        self.error = error
+        self.deterministic = deterministic
+        self.calls = 0
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls()
+
+    def _next(self, messages):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        if self.error is not None:
+            raise self.error
+        return ChatResponse(text=f"{n}:{messages[-1].content}")
+
+    def chat(self, messages, **opts):
+        self.started.set()
+        if self.delay:
+            cancel.sleep(self.delay)
+        return self._next(messages)
+
+    async def achat(self, messages, **opts):
+        self.started.set()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._next(messages)
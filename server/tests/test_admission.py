@@ -0,0 +1,97 @@
+# tests/test_admission.py
+import asyncio
+import json
+import time
+
+import pytest
+
+from relay.admission import Admission, Busy
+from relay.config import load_relay_cfg
+from relay.framing import Kind, LineFramer, make_framer
+from relay.session import Session
+
+
+def cfg(**overrides):
+    return {**load_relay_cfg(), **overrides}
+
+
+def test_connection_limit():
+    admission = Admission(cfg(max_connections=2))
+    assert admission.connect() and admission.connect()
+    assert not admission.connect()
+    admission.disconnect()
+    assert admission.connect()
+    busy = json.loads(admission.reject_connection().payload())
+    assert busy["reason"] == "max_connections" and busy["retry_after_ms"] > 0
+
+
+def test_per_connection_inflight_limit():
+    admission = Admission(cfg(conn_inflight=2))
+    s = Session(lambda _wire: None, "length")
+    wire = b"".join(s.framer.encode(Kind.TEXT, b"p", i) for i in range(3))
+    seqs = [seq for seq, _frame in s.feed(wire)]
+    admission.check(s, seqs[0])
+    admission.check(s, seqs[1])
+    with pytest.raises(Busy) as e:
+        admission.check(s, seqs[2])
+    assert e.value.reason == "conn_inflight"
+
+
+def test_queue_timeout_drops_stale_jobs_and_retry_after_follows_service_time():
+    admission = Admission(cfg(queue_timeout=0.05, workers=2, queue_depth=2))
+    assert admission.run(time.monotonic(), None, lambda x: x * 2, 21) == 42
+    with pytest.raises(Busy) as e:
+        admission.run(time.monotonic() - 1, None, lambda: None)
+    assert e.value.reason == "queue_timeout"
+    for _ in range(50):
+        admission.observe(2.0)   # 2 s per request, 4 requests ahead over 2 workers
+    assert admission.busy("queue_full", "x").retry_after == pytest.approx(4.0, rel=0.01)
+
+
+def test_rate_limit_per_client_and_weight():
+    keys = {"k-gold": ("gold", 2.0)}
+    admission = Admission(cfg(rate_limit=1, rate_burst=1, api_keys=keys))
+    plain, gold = Session(lambda _w: None, peer="10.0.0.1"), Session(lambda _w: None)
+    gold.api_key = "k-gold"
+    admission.check(plain, 0)
+    with pytest.raises(Busy) as e:
+        admission.check(plain, 0)
+    assert e.value.reason == "rate_limit" and 0 < e.value.retry_after <= 1
+    flow, weight = admission.check(gold, 0)   # own bucket, twice the rate
+    assert (flow, weight) == ("gold", 2.0)
+
+
+def test_busy_frames_in_both_framings():
+    payload = Busy("queue_full", "all busy", 0.25).payload()
+    line = LineFramer(replies=True)
+    assert line.feed(line.encode(Kind.BUSY, payload)) == [(Kind.BUSY, payload, None)]
+    length = make_framer("length")
+    (frame,) = length.feed(length.encode(Kind.BUSY, payload, 7))
+    assert (frame.kind, frame.id) == (Kind.BUSY, 7)
+    assert json.loads(frame.payload) == {
+        "reason": "queue_full", "message": "all busy", "retry_after_ms": 250}
+
+
+def test_async_server_answers_busy_when_full():
+    from async_server import Relay
+    from llm.factory import create_llm
+
+    async def main():
+        relay = Relay(create_llm("mock", mock_latency_ms=300),
+                      cfg(workers=1, queue_depth=0, journal="", fair_queue=False))
+        server = await asyncio.start_server(relay.handle_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        framer = make_framer("length", replies=True)
+        writer.write(b"".join(framer.encode(Kind.TEXT, b"p", i) for i in range(2)))
+        frames = []
+        while len(frames) < 2:
+            frames += framer.feed(await reader.read(65536))
+        writer.close()
+        server.close()
+        return {f.id: f for f in frames}
+
+    replies = asyncio.run(main())
+    assert replies[0].kind == Kind.TEXT
+    assert replies[1].kind == Kind.BUSY
+    assert json.loads(replies[1].payload)["reason"] == "queue_full"
@@ -0,0 +1,115 @@
+# tests/test_cache.py
+import pytest
+
+from llm.layers import cache as cache_mod
+from llm.layers.cache import CacheLayer
+from llm.port import JSONResponse
+
+from fakes import Echo, user
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "time", lambda: now[0])
+    return now
+
+
+def test_hit_miss_and_bypass():
+    inner = Echo()
+    layer = CacheLayer(inner, provider="t")
+    assert layer.chat(user("a"), temperature=0).text == "1:a"
+    assert layer.chat(user("a"), temperature=0).text == "1:a"
+    assert layer.chat(user("a"), temperature=0.7).text == "2:a"  # sampling: not cached
+    stats = layer.stats()
+    assert (stats["hits"], stats["misses"], stats["bypassed"]) == (1, 1, 1)
+    assert cache_mod.HITS.value(provider="t", tier="memory") >= 1
+
+
+def test_deterministic_provider_or_flag_caches_any_temperature():
+    for layer in (CacheLayer(Echo(deterministic=True)),
+                  CacheLayer(Echo(), force_deterministic=True)):
+        assert layer.chat(user("a"), temperature=0.7).text == "1:a"
+        assert layer.chat(user("a"), temperature=0.7).text == "1:a"
+
+
+def test_ttl(clock):
+    layer = CacheLayer(Echo(), ttl=10)
+    layer.chat(user("a"), temperature=0)
+    clock[0] += 9
+    assert layer.chat(user("a"), temperature=0).text == "1:a"
+    clock[0] += 2
+    assert layer.chat(user("a"), temperature=0).text == "2:a"
+    assert layer.stats()["expired"] == 1
+
+
+def test_lru_eviction_by_size():
+    layer = CacheLayer(Echo(), max_bytes=8)        # room for two "n:x" replies
+    for prompt in ("a", "b", "a", "c"):            # "a" used again: "b" is the coldest
+        layer.chat(user(prompt), temperature=0)
+    assert layer.stats()["evictions"] == 1
+    assert layer.chat(user("a"), temperature=0).text == "1:a"
+    assert layer.chat(user("b"), temperature=0).text == "4:b"
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    CacheLayer(Echo(), db_path=db).chat(user("a"), temperature=0)
+    layer = CacheLayer(Echo(), db_path=db)
+    assert layer.chat(user("a"), temperature=0).text == "1:a"
+    assert layer.stats()["disk_hits"] == 1
+
+
+def test_json_replies_are_kept_once(tmp_path):
+    raw = {"images_base64": ["QUJD"], "mime": "image/png"}
+
+    class Bridge(Echo):
+        def chat(self, messages, **opts):
+            self.calls += 1
+            return JSONResponse(raw)
+
+    db = str(tmp_path / "cache.sqlite")
+    layer = CacheLayer(Bridge(), db_path=db)
+    layer.chat(user("a"), temperature=0)
+    assert layer._mem[next(iter(layer._mem))].text is None
+    for cached in (layer, CacheLayer(Bridge(), db_path=db)):
+        hit = cached.chat(user("a"), temperature=0)
+        assert isinstance(hit, JSONResponse) and hit.raw == raw
+        assert hit.text == JSONResponse(raw).text
+
+
+def test_streams_are_cached_as_one_chunk():
+    layer = CacheLayer(Echo())
+    assert list(layer.stream_chat(user("a"), temperature=0)) == ["1:a"]
+    assert list(layer.stream_chat(user("a"), temperature=0)) == ["1:a"]
+
+
+def test_providers_sharing_a_db_keep_their_own_entries(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    cfg = {"cache_db": db, "metrics_name": "llama", "base_url": "http://a/v1", "model": "m"}
+    CacheLayer.wrap(Echo(), cfg).chat(user("a"), temperature=0)
+    for other, hits in (({}, 1), ({"metrics_name": "mock"}, 0),
+                        ({"base_url": "http://b/v1"}, 0), ({"model": "n"}, 0)):
+        inner = Echo()
+        layer = CacheLayer.wrap(inner, {**cfg, **other})
+        layer.chat(user("a"), temperature=0)
+        assert (layer.stats()["disk_hits"], inner.calls) == (hits, 1 - hits)
+
+
+class Bridge(Echo):
+    """Image bridge double: JSON replies, so chat() hits must keep `raw`."""
+
+    def chat(self, messages, **opts):
+        self.calls += 1
+        return JSONResponse({"images_base64": [f"{self.calls}:{messages[-1].content}"]})
+
+
+def test_streamed_replies_never_answer_chat():
+    inner = Bridge()
+    layer = CacheLayer(inner, force_deterministic=True)
+    assert "".join(layer.stream_chat(user("a"))) == '{"images_base64": ["1:a"]}'
+    reply = layer.chat(user("a"))
+    assert reply.raw == {"images_base64": ["2:a"]}   # not the stream's text-only entry
+    assert layer.chat(user("a")).raw == reply.raw
+    assert "".join(layer.stream_chat(user("a"))) == '{"images_base64": ["1:a"]}'
+    assert inner.calls == 2
@@ -0,0 +1,147 @@
+# tests/test_cancel.py
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from llm import cancel
+from llm.cancel import Cancelled, CancelToken
+from llm.factory import create_llm
+from llm.http import HttpTransport
+from relay.framing import Kind, LengthFramer
+from relay.pool import WorkerPool
+from relay.session import Session
+
+from fakes import user
+
+
+def cancel_later(token, seconds=0.05):
+    timer = threading.Timer(seconds, token.cancel)
+    timer.start()
+    return timer
+
+
+def test_callbacks_run_once_and_can_be_unregistered():
+    token, calls = CancelToken(), []
+    token.on_cancel(lambda: calls.append("a"))
+    unregister = token.on_cancel(lambda: calls.append("b"))
+    token.on_cancel(lambda: 1 / 0)           # a failing callback doesn't stop the rest
+    token.on_cancel(lambda: calls.append("c"))
+    unregister()
+    token.cancel()
+    token.cancel()
+    assert calls == ["a", "c"] and token.cancelled
+    token.on_cancel(lambda: calls.append("late"))  # already fired: runs at once
+    assert calls[-1] == "late"
+    with pytest.raises(Cancelled):
+        token.raise_if_cancelled()
+
+
+def test_child_fires_with_its_parent_but_not_the_other_way():
+    parent = CancelToken()
+    alone, with_parent = parent.child(), parent.child()
+    alone.cancel()
+    assert alone.cancelled and not parent.cancelled and not with_parent.cancelled
+    parent.cancel()
+    assert with_parent.cancelled
+
+
+def test_scope_wakes_sleepers_and_follows_the_call_into_threads():
+    token = CancelToken()
+    assert cancel.current() is None
+    cancel_later(token)
+    t0 = time.monotonic()
+    with cancel.scope(token), pytest.raises(Cancelled):
+        assert cancel.current() is token
+        asyncio.run(asyncio.to_thread(cancel.sleep, 5))
+    assert time.monotonic() - t0 < 1
+    assert cancel.current() is None
+    with pytest.raises(Cancelled):
+        with cancel.scope(token):
+            pass  # already fired: the block never runs
+
+
+def test_cancel_aborts_a_blocked_http_request():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    accepted = []
+    threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+    http = HttpTransport(timeout=30)
+    token = CancelToken()
+    cancel_later(token, 0.1)
+    t0 = time.monotonic()
+    try:
+        with cancel.scope(token), pytest.raises(Cancelled):
+            http.post(f"http://127.0.0.1:{port}/", json={})  # the server never answers
+        assert time.monotonic() - t0 < 5
+    finally:
+        http.close()
+        server.close()
+
+
+def test_cancelled_call_on_a_worker_stops_and_frees_it():
+    llm = create_llm("mock", mock_latency_ms=5000, layers="")
+    pool = WorkerPool(1, 1)
+    running, queued = CancelToken(), CancelToken()
+
+    def call(token):
+        with cancel.scope(token):
+            return llm.chat(user("x"))
+
+    first = pool.submit(call, running)
+    second = pool.submit(call, queued)
+    queued.on_cancel(second.cancel)
+    queued.cancel()                   # queued: dropped without running
+    assert second.cancelled()
+    t0 = time.monotonic()
+    running.cancel()                  # running: the mock's sleep raises
+    with pytest.raises(Cancelled):
+        first.result(timeout=2)
+    assert time.monotonic() - t0 < 1
+    assert pool.submit(lambda: "free").result(timeout=1) == "free"
+    pool.shutdown()
+
+
+def test_session_cancel_frame_and_close_fire_the_tokens():
+    s = Session(lambda _w: None, "length")
+    framer = LengthFramer()
+    wire = b"".join(framer.encode(Kind.TEXT, b"p", i) for i in (1, 2, 3))
+    (a, _), (b, _), (c, _) = s.feed(wire)
+    assert s.feed(framer.encode(Kind.CANCEL, b"", 2)) == []
+    assert s.token(b).cancelled and not s.token(a).cancelled
+    s.reply(a, Kind.TEXT, b"A")
+    s.close()
+    assert s.token(c).cancelled and s.token(a).cancelled  # finished or gone: a fired token
+
+
+def test_async_server_cancel_frame_stops_the_running_call():
+    from async_server import Relay
+    from relay.config import load_relay_cfg
+
+    async def main():
+        cfg = {**load_relay_cfg(), "workers": 1, "journal": "", "fair_queue": False}
+        relay = Relay(create_llm("mock", mock_latency_ms=5000, layers=""), cfg)
+        server = await asyncio.start_server(relay.handle_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        framer = LengthFramer(replies=True)
+        writer.write(framer.encode(Kind.TEXT, b"slow", 1))
+        await asyncio.sleep(0.1)
+        t0 = time.monotonic()
+        writer.write(framer.encode(Kind.CANCEL, b"", 1))
+        # With one worker, this is only answered once the slow call let go of it.
+        relay.llm = create_llm("mock", layers="")
+        writer.write(framer.encode(Kind.TEXT, b"fast", 2))
+        frames = []
+        while not frames:
+            frames += framer.feed(await asyncio.wait_for(reader.read(65536), 2))
+        writer.close()
+        server.close()
+        return frames, time.monotonic() - t0
+
+    frames, elapsed = asyncio.run(main())
+    assert [f.id for f in frames] == [2]
+    assert elapsed < 1
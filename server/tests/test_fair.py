@@ -0,0 +1,131 @@
+# tests/test_fair.py
+import asyncio
+import threading
+
+import pytest
+
+from relay.fair import AsyncSlots, FairQueue, Preempted, RateLimiter
+from relay.pool import PoolFull, WorkerPool
+
+
+def drain(q):
+    out = []
+    while True:
+        try:
+            out.append(q.pop())
+        except IndexError:
+            return out
+
+
+def test_fair_queue_interleaves_a_backlog_with_a_quiet_flow():
+    q = FairQueue()
+    for i in range(4):
+        q.push("heavy", 1.0, f"h{i}")
+    q.push("quiet", 1.0, "q0")
+    assert drain(q) == ["h0", "q0", "h1", "h2", "h3"]
+
+
+def test_fair_queue_weights():
+    q = FairQueue()
+    for i in range(4):
+        q.push("gold", 2.0, f"g{i}")
+        q.push("basic", 1.0, f"b{i}")
+    # Weight 2 advances gold's tag half as fast: two of its items per basic one
+    assert drain(q) == ["g0", "b0", "g1", "b1", "g2", "g3", "b2", "b3"]
+
+
+def test_fair_queue_remove_updates_counts():
+    q = FairQueue()
+    items = [object() for _ in range(3)]
+    for item in items:
+        q.push("a", 1.0, item)
+    assert q.remove(items[1]) and not q.remove(items[1])
+    assert q.queued("a") == 2 and len(q) == 2
+    assert drain(q) == [items[0], items[2]]
+    assert q.queued("a") == 0
+
+
+def test_drop_for_takes_the_heaviest_flows_newest_item():
+    q = FairQueue()
+    for i in range(3):
+        q.push("heavy", 1.0, f"h{i}")
+    q.push("light", 1.0, "l0")
+    assert q.drop_for("light", 1.0) == ("heavy", "h2")
+    assert q.queued("heavy") == 2
+    # Equal backlogs: nobody is heavier than the newcomer would be
+    assert q.drop_for("heavy", 1.0) is None
+
+
+def test_rate_limiter_bucket():
+    rl = RateLimiter(rate=2.0, burst=2.0)
+    assert rl.take("c", now=0.0) == 0.0
+    assert rl.take("c", now=0.0) == 0.0
+    assert rl.take("c", now=0.0) == pytest.approx(0.5)
+    assert rl.take("c", now=0.5) == 0.0          # refilled one token
+    assert rl.take("other", now=0.5) == 0.0      # buckets are per client
+    assert rl.take("vip", weight=2.0, now=0.0) == 0.0  # weight scales the burst
+    for _ in range(3):
+        rl.take("vip", weight=2.0, now=0.0)
+    assert rl.take("vip", weight=2.0, now=0.0) == pytest.approx(0.25)
+
+
+def blocked_pool(workers=1, queue_depth=2):
+    pool = WorkerPool(workers, queue_depth)
+    gate = threading.Event()
+    for _ in range(workers):
+        pool.submit(gate.wait, flow="busy")
+    return pool, gate
+
+
+def test_pool_full_and_preemption():
+    pool, gate = blocked_pool()
+    try:
+        heavy = [pool.submit(lambda: "h", flow="heavy") for _ in range(2)]
+        with pytest.raises(PoolFull):
+            pool.submit(lambda: "h", flow="heavy")
+        light = pool.submit(lambda: "l", flow="light")
+        with pytest.raises(Preempted):
+            heavy[1].result(timeout=1)
+        gate.set()
+        assert light.result(timeout=1) == "l" and heavy[0].result(timeout=1) == "h"
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+def test_cancelled_jobs_leave_the_queue_at_once():
+    pool, gate = blocked_pool()
+    try:
+        queued = [pool.submit(lambda: "a", flow="a") for _ in range(2)]
+        assert all(f.cancel() for f in queued)
+        assert len(pool._queue) == 0 and pool._queue.queued("a") == 0
+        # Their slots are free again: no PoolFull, no preemption
+        again = [pool.submit(lambda: "b", flow="b") for _ in range(2)]
+        gate.set()
+        assert [f.result(timeout=1) for f in again] == ["b", "b"]
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+def test_async_slots_fair_order_and_make_room():
+    async def main():
+        slots = AsyncSlots(1)
+        await slots.acquire("busy")
+        order = []
+
+        async def job(flow, name):
+            await slots.acquire(flow)
+            order.append(name)
+            slots.release()
+
+        tasks = [asyncio.ensure_future(job("heavy", f"h{i}")) for i in range(3)]
+        tasks.append(asyncio.ensure_future(job("quiet", "q0")))
+        await asyncio.sleep(0)
+        assert slots.make_room("quiet")              # drops h2
+        slots.release()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[2], Preempted)
+        assert order == ["h0", "q0", "h1"]
+
+    asyncio.run(main())
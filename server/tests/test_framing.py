@@ -0,0 +1,115 @@
+# tests/test_framing.py
+import pytest
+
+from relay.framing import (
+    FRAME_MAGIC, ZERO_COPY_MIN, AutoFramer, Frame, FramingError, Kind, LengthFramer,
+    LineFramer, make_framer,
+)
+from relay.images import pack_images
+
+
+def feed_bytewise(framer, wire):
+    frames = []
+    for i in range(len(wire)):
+        frames += framer.feed(wire[i:i + 1])
+    return frames
+
+
+def test_line_round_trip_across_chunks():
+    wire = b"first prompt\nsecond\r\nthi"
+    framer = LineFramer()
+    assert feed_bytewise(framer, wire) == [Frame(Kind.TEXT, b"first prompt"),
+                                           Frame(Kind.TEXT, b"second")]
+    assert framer.feed(b"rd\n") == [Frame(Kind.TEXT, b"third")]
+
+
+@pytest.mark.parametrize("line", [b"LLM_ERROR: not an error", b"BUSY street at night, SEM image"])
+def test_server_decodes_prefixed_prompts_as_text(line):
+    assert make_framer("line").feed(line + b"\n") == [Frame(Kind.TEXT, line)]
+    assert make_framer("auto").feed(line + b"\n") == [Frame(Kind.TEXT, line)]
+
+
+def test_reply_framer_parses_prefixes():
+    framer = make_framer("line", replies=True)
+    wire = (framer.encode(Kind.ERROR, b"boom") + framer.encode(Kind.BUSY, b'{"reason":"x"}')
+            + framer.encode(Kind.TEXT, b"ok"))
+    assert framer.feed(wire) == [Frame(Kind.ERROR, b"boom"),
+                                 Frame(Kind.BUSY, b'{"reason":"x"}'),
+                                 Frame(Kind.TEXT, b"ok")]
+
+
+def test_line_images_are_sent_as_legacy_json():
+    wire = LineFramer().encode(Kind.IMAGES, pack_images([b"abc"], "image/png"))
+    assert wire.endswith(b"\n") and b"images_base64" in wire
+
+
+def test_line_too_long():
+    with pytest.raises(FramingError):
+        LineFramer(max_frame=8).feed(b"0123456789")
+
+
+def test_length_round_trip_with_newlines_and_tags():
+    framer = LengthFramer()
+    wire = (framer.encode(Kind.TEXT, b"a\nb")
+            + framer.encode(Kind.STREAM, b"tagged", request_id=7)
+            + framer.encode(Kind.CANCEL, b"", request_id=2**32 - 1))
+    assert feed_bytewise(LengthFramer(), wire) == [
+        Frame(Kind.TEXT, b"a\nb"),
+        Frame(Kind.STREAM, b"tagged", 7),
+        Frame(Kind.CANCEL, b"", 2**32 - 1),
+    ]
+
+
+def test_length_large_payload_is_handed_over():
+    framer = LengthFramer()
+    payload = bytes(range(256)) * (ZERO_COPY_MIN // 256 + 1)
+    (frame,) = framer.feed(framer.encode(Kind.IMAGES, payload, request_id=3))
+    assert frame.kind == Kind.IMAGES and frame.id == 3 and frame.payload == payload
+    assert framer.feed(framer.encode(Kind.TEXT, b"next")) == [Frame(Kind.TEXT, b"next")]
+
+
+def test_length_errors():
+    with pytest.raises(FramingError):
+        LengthFramer().feed(b"\x00" * 6)
+    with pytest.raises(FramingError):
+        LengthFramer(max_frame=4).feed(LengthFramer().encode(Kind.TEXT, b"12345"))
+    with pytest.raises(FramingError):
+        # TAGGED bit set but no room for the request id
+        LengthFramer().feed(bytes([FRAME_MAGIC, Kind.TEXT | 0x80, 0, 0, 0, 2]) + b"ab")
+
+
+def test_auto_framer_detects_each_framing():
+    line = AutoFramer()
+    assert line.feed(b"hello\n") == [Frame(Kind.TEXT, b"hello")]
+    assert line.mode == "line"
+
+    length = AutoFramer()
+    assert length.feed(LengthFramer().encode(Kind.PING, b"x", request_id=1)) == \
+        [Frame(Kind.PING, b"x", 1)]
+    assert length.mode == "length"
+    assert length.encode(Kind.PONG, b"x", 1) == LengthFramer().encode(Kind.PONG, b"x", 1)
+
+
+def test_auto_framer_answers_in_line_protocol_before_any_input():
+    assert AutoFramer().encode(Kind.ERROR, b"no") == b"LLM_ERROR: no\n"
+
+
+def test_unknown_framing():
+    with pytest.raises(ValueError):
+        make_framer("json")
+
+
+def test_unterminated_line_is_flushed_as_a_prompt():
+    framer = LineFramer()
+    assert framer.feed(b"a\nhello") == [Frame(Kind.TEXT, b"a")]
+    assert framer.partial
+    assert framer.flush() == [Frame(Kind.TEXT, b"hello")]
+    assert not framer.partial and framer.flush() == []
+    assert framer.feed(b"next\n") == [Frame(Kind.TEXT, b"next")]
+
+
+def test_partial_binary_frame_is_not_flushed():
+    auto = AutoFramer()
+    assert not auto.partial and auto.flush() == []
+    auto.feed(LengthFramer().encode(Kind.TEXT, b"hello")[:-2])
+    assert not auto.partial and auto.flush() == []
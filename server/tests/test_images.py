@@ -0,0 +1,74 @@
+# tests/test_images.py
+import base64
+import json
+import struct
+import zlib
+
+from relay.framing import Kind, LineFramer, make_framer
+from relay.images import (RAW_MIME, image_size, images_to_json, pack_images,
+                          reply_images, unpack_images)
+
+
+def png(w, h):
+    ihdr = struct.pack("!IIBBBBB", w, h, 8, 2, 0, 0, 0)
+    chunk = struct.pack("!I", len(ihdr)) + b"IHDR" + ihdr
+    return b"\x89PNG\r\n\x1a\n" + chunk + struct.pack("!I", zlib.crc32(chunk[4:]))
+
+
+def test_image_size():
+    assert image_size(png(640, 480)) == (640, 480)
+    vp8x = b"RIFF" + b"\0" * 4 + b"WEBPVP8X" + b"\0" * 8 + (99).to_bytes(3, "little") \
+        + (49).to_bytes(3, "little")
+    assert image_size(vp8x) == (100, 50)
+    assert image_size(b"GIF89a" + b"\0" * 30) == (0, 0)
+
+
+def test_pack_unpack_round_trip():
+    images = [png(4, 2), png(1, 1) + b"tail"]
+    header, frames = unpack_images(pack_images(images))
+    assert header["count"] == 2 and header["mime"] == "image/png"
+    assert [(f["w"], f["h"]) for f in header["frames"]] == [(4, 2), (1, 1)]
+    assert all(isinstance(f, memoryview) for f in frames)
+    assert [bytes(f) for f in frames] == images
+
+
+def test_raw_frames_carry_their_shape():
+    rgb, gray = bytes(range(2 * 2 * 3)), b"\x00\xff"
+    header, frames = unpack_images(
+        pack_images([rgb, gray], RAW_MIME, [(2, 2, 3), (2, 1, 1)]))
+    assert header["mime"] == RAW_MIME
+    assert header["frames"] == [{"w": 2, "h": 2, "c": 3, "len": 12},
+                                {"w": 2, "h": 1, "c": 1, "len": 2}]
+    assert [bytes(f) for f in frames] == [rgb, gray]
+
+
+def test_empty_payload():
+    assert unpack_images(pack_images([])) == ({"count": 0, "mime": "image/png",
+                                               "frames": []}, [])
+
+
+def test_reply_images_decodes_once_and_rejects_non_images():
+    data = png(3, 3)
+    raw = {"images_base64": [base64.b64encode(data).decode()], "mime": "image/webp"}
+    assert reply_images(raw) == ([data], "image/webp")
+    assert reply_images({"images_base64": []}) == ([], "image/png")
+    assert reply_images({"images_base64": ["not base64!"]}) is None
+    assert reply_images({"text": "hi"}) is None
+    assert reply_images("images_base64") is None
+
+
+def test_line_clients_get_the_legacy_json():
+    data = png(2, 2)
+    payload = pack_images([data])
+    assert json.loads(images_to_json(payload)) == {
+        "images_base64": [base64.b64encode(data).decode()], "mime": "image/png"}
+    wire = LineFramer(replies=True).encode(Kind.IMAGES, payload)
+    assert wire.endswith(b"\n") and json.loads(wire)["mime"] == "image/png"
+
+
+def test_length_framing_carries_images_unchanged():
+    framer = make_framer("length", replies=True)
+    payload = pack_images([png(8, 8)])
+    (frame,) = framer.feed(framer.encode(Kind.IMAGES, payload, 3))
+    assert (frame.kind, frame.id) == (Kind.IMAGES, 3)
+    assert bytes(frame.payload) == payload
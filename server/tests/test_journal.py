@@ -0,0 +1,114 @@
+# tests/test_journal.py
+import asyncio
+import json
+import logging
+import os
+import time
+
+import pytest
+
+from llm.factory import create_llm
+from relay.journal import Journal, Trace, journal_files
+from relay.service import call_llm, request_text
+from relay.session import Session
+
+from replay import load_journal, replay_one
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def written(path):
+    return [r for name in journal_files(path) for r in lines(name)]
+
+
+def record_one(journal, seq, prompt="p" * 400):
+    """Record and wait until it is on disk, so every record is its own batch."""
+    journal.record(1, seq, Trace("text", prompt, None), "text")
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            if any(r["seq"] == seq for r in written(journal.path)):
+                return
+        except (OSError, ValueError):
+            pass  # mid-rotation
+        time.sleep(0.005)
+    raise AssertionError(f"record {seq} never written")
+
+
+def test_session_requests_are_journaled(tmp_path):
+    path = str(tmp_path / "j.jsonl")
+    journal = Journal(path, provider="mock", fsync_interval=0.01)
+    s = Session(lambda _wire: None, "line", journal=journal)
+    (a, fa), (b, _fb) = s.feed(b"first\nsecond\n")
+    s.reply(a, *call_llm(create_llm("mock"), request_text(fa)))
+    s.close()  # b never answered
+    journal.close()
+    recs = lines(path)
+    assert [(r["seq"], r["prompt"], r["outcome"]) for r in recs] == [
+        (a, "first", "text"), (b, "second", "cancelled")]
+    assert recs[0]["bytes"] > 0 and recs[0]["sha256"] and recs[0]["provider"] == "mock"
+
+
+def test_rotation_keeps_the_newest_files(tmp_path):
+    path = str(tmp_path / "j.jsonl")
+    journal = Journal(path, max_bytes=300, keep=2, fsync_interval=0.01)
+    for seq in range(5):
+        record_one(journal, seq)  # each one is over max_bytes: rotated after it
+    journal.close()
+    assert journal_files(path) == [f"{path}.2", f"{path}.1", path]
+    assert [r["seq"] for r in written(path)] == [3, 4]
+
+
+def test_failed_rotation_keeps_writing(tmp_path, monkeypatch, caplog):
+    def read_only(*_args):
+        raise PermissionError("read-only directory")
+
+    path = str(tmp_path / "j.jsonl")
+    journal = Journal(path, max_bytes=300, keep=1, fsync_interval=0.01)
+    with caplog.at_level(logging.INFO, logger="relay.journal"):
+        with monkeypatch.context() as m:
+            m.setattr(os, "replace", read_only)
+            for seq in range(3):
+                record_one(journal, seq)
+        assert journal_files(path) == [path]
+        record_one(journal, 3)  # rotates again: the old file holds everything so far
+        journal.close()
+    assert [r["seq"] for r in lines(f"{path}.1")] == [0, 1, 2, 3]
+    messages = [r.getMessage() for r in caplog.records]
+    assert sum("rotation failed" in m for m in messages) == 1
+    assert "journal rotation works again" in messages
+
+
+def test_replay_reproduces_a_deterministic_provider(tmp_path):
+    path = str(tmp_path / "j.jsonl")
+    journal = Journal(path, provider="mock", fsync_interval=0.01)
+    s = Session(lambda _wire: None, "line", journal=journal)
+    llm = create_llm("mock")
+    for seq, frame in s.feed(b"one\ntwo\n"):
+        s.reply(seq, *call_llm(llm, request_text(frame)))
+    journal.close()
+
+    records = load_journal([path], only_ok=True)
+    assert [r["prompt"] for r in records] == ["one", "two"]
+    results = [asyncio.run(replay_one(llm, r)) for r in records]
+    assert [(r["outcome"], r["changed"]) for r in results] == [("text", False)] * 2
+
+
+def test_bad_path_fails_at_startup(tmp_path):
+    with pytest.raises(OSError):
+        Journal(str(tmp_path / "missing" / "j.jsonl"))
+
+
+def test_records_are_dropped_once_the_writer_died(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path / "j.jsonl"), fsync_interval=0.01)
+    monkeypatch.setattr(journal, "_encode", lambda *_args: 1 / 0)
+    journal.record(1, 0, Trace("text", "p", None), "text")
+    journal._thread.join(5)
+    assert not journal._thread.is_alive()
+    for seq in range(1, 4):
+        journal.record(1, seq, Trace("text", "p", None), "text")
+    assert journal.dropped == 3 and journal._queue.empty()
+    journal.close()
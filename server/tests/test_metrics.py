@@ -0,0 +1,103 @@
+# tests/test_metrics.py
+import asyncio
+import math
+
+import pytest
+
+from llm import metrics
+from llm.layers.metrics import CANCELLED, ERRORS, MetricsLayer
+from llm.port import LLMClient
+
+from fakes import user
+
+
+class Chunks(LLMClient):
+    """Streams "a", "b", "c"."""
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls()
+
+    def chat(self, messages, **opts):
+        raise NotImplementedError
+
+    def stream_chat(self, messages, **opts):
+        yield from "abc"
+
+    async def astream_chat(self, messages, **opts):
+        for chunk in "abc":
+            yield chunk
+
+
+def test_stream_closed_early_is_cancelled_not_an_error():
+    layer = MetricsLayer(Chunks(), provider="early")
+    stream = layer.stream_chat(user("x"))
+    assert next(stream) == "a"
+    stream.close()
+
+    async def consume_one():
+        stream = layer.astream_chat(user("x"))
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+    asyncio.run(consume_one())
+
+    assert CANCELLED.value(provider="early", op="stream") == 2
+    assert ERRORS.value(provider="early", op="stream") == 0
+
+
+def test_counter_and_gauge_keep_one_value_per_label_set():
+    reg = metrics.Registry()
+    sent = reg._get(metrics.Counter, "t_sent_total", "Sent.", ("provider",))
+    sent.inc(provider="a")
+    sent.inc(2.5, provider="a")
+    sent.inc(provider="b")
+    assert sent.value(provider="a") == 3.5 and sent.value(provider="b") == 1
+    assert sent.value(provider="c") == 0
+    live = reg._get(metrics.Gauge, "t_live", "Live.", ())
+    live.inc()
+    live.inc()
+    live.dec()
+    assert live.value() == 1
+    live.set(7)
+    assert live.value() == 7
+
+
+def test_registry_returns_the_same_metric_and_rejects_a_type_change():
+    assert metrics.counter("t_same_total", "x") is metrics.counter("t_same_total", "x")
+    with pytest.raises(ValueError):
+        metrics.histogram("t_same_total", "x")
+
+
+def test_histogram_quantiles_stay_within_one_bucket():
+    h = metrics.Histogram("t_latency_seconds", "Latency.", ("provider",))
+    assert h.quantile(0.5, provider="a") is None
+    for ms in range(1, 1001):
+        h.observe(ms / 1000, provider="a")
+    for q in (0.5, 0.9, 0.99):   # true quantile is q seconds
+        assert q <= h.quantile(q, provider="a") < q * 2 ** 0.25
+    h.observe(10_000, provider="a")   # past `highest`: the +Inf bucket
+    assert h.quantile(1.0, provider="a") == math.inf
+    assert h.quantile(0.5, provider="other") is None
+
+
+def test_render_prometheus_text():
+    reg = metrics.Registry()
+    reg._get(metrics.Counter, "t_req_total", "Requests.", ("provider",)).inc(
+        provider='we"ird\\')
+    h = reg._get(metrics.Histogram, "t_lat_seconds", "Latency.", (), lowest=0.001,
+                 highest=0.004, steps_per_doubling=1)
+    h.observe(0.0015)
+    h.observe(0.5)
+    assert reg.render() == "\n".join([
+        "# HELP t_req_total Requests.",
+        "# TYPE t_req_total counter",
+        't_req_total{provider="we\\"ird\\\\"} 1',
+        "# HELP t_lat_seconds Latency.",
+        "# TYPE t_lat_seconds histogram",
+        't_lat_seconds_bucket{le="0.001"} 0',
+        't_lat_seconds_bucket{le="0.002"} 1',
+        't_lat_seconds_bucket{le="0.004"} 1',
+        't_lat_seconds_bucket{le="+Inf"} 2',
+        "t_lat_seconds_sum 0.5015",
+        "t_lat_seconds_count 2",
+    ]) + "\n"
@@ -0,0 +1,99 @@
+# tests/test_router.py
+import asyncio
+import time
+
+import pytest
+
+from llm import cancel
+from llm.adapters.router import HEDGE_MIN_SAMPLES, RouterAdapter, _Backend
+
+from fakes import Echo, user
+
+
+def router(*clients, **kw):
+    return RouterAdapter([_Backend(f"b{i}", c) for i, c in enumerate(clients)], **kw)
+
+
+def warm(r, index, ms=10.0):
+    """Give backend `index` a latency history, so its p95 is trusted for hedging."""
+    for _ in range(HEDGE_MIN_SAMPLES):
+        r.backends[index].observe(ms)
+
+
+def test_failover_and_cooldown():
+    bad, good = Echo(error=ConnectionError("down")), Echo()
+    r = router(bad, good)
+    assert r.chat(user("a")).text == "1:a"
+    assert r.failovers == 1 and r.backends[0].errors == 1
+    r.chat(user("b"))
+    assert bad.calls == 1  # cooling down: ranked after the healthy backend
+
+
+def test_every_backend_failing_raises_the_last_error():
+    r = router(Echo(error=ConnectionError("one")), Echo(error=TimeoutError("two")))
+    with pytest.raises((ConnectionError, TimeoutError)):
+        r.chat(user("a"))
+
+
+def test_cancellation_is_not_failed_over():
+    second = Echo()
+    r = router(Echo(error=cancel.Cancelled()), second)
+    with pytest.raises(cancel.Cancelled):
+        r.chat(user("a"))
+    assert second.calls == 0 and r.backends[0].errors == 0
+
+
+def test_least_outstanding_policy():
+    r = router(Echo(), Echo())
+    r.backends[0].outstanding = 3
+    assert r._ranked()[0] is r.backends[1]
+
+
+def test_hedge_races_a_slow_primary():
+    slow, fast = Echo(delay=2.0), Echo()
+    r = router(slow, fast, hedge=True)
+    warm(r, 0)
+    warm(r, 1, ms=50.0)  # rank the slow one first
+    t0 = time.monotonic()
+    assert r.chat(user("a")).text == "1:a"
+    assert time.monotonic() - t0 < 1.0
+    assert (r.hedges, r.hedge_wins) == (1, 1)
+
+
+def test_async_hedge_and_failover():
+    async def main():
+        slow, fast = Echo(delay=2.0), Echo()
+        r = router(slow, fast, hedge=True)
+        warm(r, 0)
+        warm(r, 1, ms=50.0)
+        reply = await asyncio.wait_for(r.achat(user("a")), 1.0)
+        assert reply.text == "1:a" and r.hedge_wins == 1
+
+        r = router(Echo(error=ConnectionError("down")), Echo())
+        assert (await r.achat(user("b"))).text == "1:b"
+
+    asyncio.run(main())
+
+
+def test_stream_fails_over_only_before_the_first_chunk():
+    class Broken(Echo):
+        def stream_chat(self, messages, **opts):
+            yield "part"
+            raise ConnectionError("cut")
+
+    r = router(Echo(error=ConnectionError("down")), Echo())
+    assert list(r.stream_chat(user("a"))) == ["1:a"]
+    r = router(Broken(), Echo())
+    stream = r.stream_chat(user("a"))
+    assert next(stream) == "part"
+    with pytest.raises(ConnectionError):
+        next(stream)
+
+
+def test_hedge_pool_is_sized_from_config():
+    from llm.factory import create_llm
+    r = create_llm("router", router_backends="mock,mock", router_hedge=True, pool_size=7)
+    assert r._pool._max_workers == 14
+    r = create_llm("router", router_backends="mock,mock", router_hedge=True,
+                   router_hedge_threads=3)
+    assert r._pool._max_workers == 3
@@ -0,0 +1,30 @@
+# tests/test_service.py
+from llm.adapters.router import RouterAdapter, _Backend
+from llm.factory import create_llm
+from llm.layers.cache import CacheLayer
+from llm.layers.metrics import MetricsLayer
+from llm.port import ChatResponse, JSONResponse, LLMClient
+from relay.service import is_async
+
+
+class Blocking(LLMClient):
+    """Provider with only a blocking chat: achat runs it on a thread."""
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls()
+
+    def chat(self, messages, **opts):
+        return ChatResponse(text="ok")
+
+
+def test_is_async_looks_under_the_layers():
+    assert not is_async(CacheLayer(MetricsLayer(Blocking())))
+    assert is_async(create_llm("llama", layers="cache,singleflight"))
+    backends = [_Backend("a", MetricsLayer(Blocking())), _Backend("b", create_llm("mock"))]
+    assert not is_async(RouterAdapter(backends))
+    assert is_async(create_llm("router", router_backends="llama,mock"))
+
+
+def test_json_reply_text_is_utf8_not_escaped():
+    assert JSONResponse({"label": "défaut"}).text == '{"label": "défaut"}'
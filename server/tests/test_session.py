@@ -0,0 +1,114 @@
+# tests/test_session.py
+import pytest
+
+from relay.framing import Frame, FramingError, Kind, LengthFramer, LineFramer
+from relay.session import Session
+
+
+class Wire:
+    """Collects what a Session writes and decodes it as a client would."""
+
+    def __init__(self, framing):
+        self.framer = (LengthFramer() if framing == "length" else LineFramer(replies=True))
+        self.frames = []
+
+    def __call__(self, data):
+        self.frames += self.framer.feed(data)
+
+
+def session(framing="line"):
+    wire = Wire(framing)
+    return Session(wire, framing), wire
+
+
+def requests(s, *frames):
+    encoder = LengthFramer() if s.framer.mode == "length" else LineFramer()
+    return s.feed(b"".join(encoder.encode(kind, payload, request_id)
+                           for kind, payload, request_id in frames))
+
+
+def test_untagged_replies_are_written_in_request_order():
+    s, wire = session()
+    seqs = [seq for seq, _frame in s.feed(b"a\nb\nc\n")]
+    s.reply(seqs[2], Kind.TEXT, b"C")
+    s.reply(seqs[1], Kind.TEXT, b"B")
+    assert wire.frames == []
+    assert s.backlog(seqs[2]) == 2 and s.pending == 1  # B and C are answered, just held
+    s.reply(seqs[0], Kind.TEXT, b"A")
+    assert [f.payload for f in wire.frames] == [b"A", b"B", b"C"]
+    assert s.pending == 0
+
+
+def test_stream_at_the_head_goes_out_at_once_later_ones_wait():
+    s, wire = session("length")
+    (first, _), (second, _) = requests(s, (Kind.STREAM, b"x", None), (Kind.STREAM, b"y", None))
+    s.reply(second, Kind.CHUNK, b"y1", final=False)
+    s.reply(first, Kind.CHUNK, b"x1", final=False)
+    assert wire.frames == [Frame(Kind.CHUNK, b"x1")]
+    s.reply(second, Kind.END, b"")
+    s.reply(first, Kind.END, b"")
+    assert [(f.kind, f.payload) for f in wire.frames] == [
+        (Kind.CHUNK, b"x1"), (Kind.END, b""), (Kind.CHUNK, b"y1"), (Kind.END, b"")]
+
+
+def test_tagged_replies_are_written_when_ready_with_their_id():
+    s, wire = session("length")
+    (a, fa), (b, fb) = requests(s, (Kind.TEXT, b"a", 10), (Kind.TEXT, b"b", 11))
+    assert (fa.id, fb.id) == (10, 11)
+    s.reply(b, Kind.TEXT, b"B")
+    s.reply(a, Kind.TEXT, b"A")
+    assert wire.frames == [Frame(Kind.TEXT, b"B", 11), Frame(Kind.TEXT, b"A", 10)]
+
+
+def test_cancel_fires_the_token_and_drops_the_reply():
+    s, wire = session("length")
+    ((seq, _),) = requests(s, (Kind.STREAM, b"a", 5))
+    token = s.token(seq)
+    s.reply(seq, Kind.CHUNK, b"part", final=False)
+    assert requests(s, (Kind.CANCEL, b"", 5)) == []
+    assert token.cancelled and s.pending == 0
+    s.reply(seq, Kind.CHUNK, b"late", final=False)
+    s.reply(seq, Kind.END, b"")
+    assert wire.frames == [Frame(Kind.CHUNK, b"part", 5)]
+
+
+def test_cancel_of_an_unknown_id_is_ignored():
+    s, wire = session("length")
+    ((seq, _),) = requests(s, (Kind.TEXT, b"a", 1))
+    requests(s, (Kind.CANCEL, b"", 2))
+    s.reply(seq, Kind.TEXT, b"A")
+    assert wire.frames == [Frame(Kind.TEXT, b"A", 1)]
+
+
+def test_close_cancels_everything_and_drops_replies():
+    s, wire = session()
+    seqs = [seq for seq, _frame in s.feed(b"a\nb\n")]
+    tokens = [s.token(seq) for seq in seqs]
+    s.close()
+    assert all(t.cancelled for t in tokens)
+    s.reply(seqs[0], Kind.TEXT, b"A")
+    assert wire.frames == []
+
+
+def test_answered_request_has_a_fired_token():
+    s, _wire = session()
+    ((seq, _),) = s.feed(b"a\n")
+    s.reply(seq, Kind.TEXT, b"A")
+    assert s.token(seq).cancelled
+
+
+def test_ping_is_answered_ahead_of_queued_replies():
+    s, wire = session("length")
+    ((seq, _),) = requests(s, (Kind.TEXT, b"slow", None))
+    assert requests(s, (Kind.PING, b"42", None)) == []
+    assert wire.frames == [Frame(Kind.PONG, b"42")]
+    s.reply(seq, Kind.TEXT, b"done")
+    assert wire.frames[-1] == Frame(Kind.TEXT, b"done")
+
+
+def test_hello_sets_the_api_key():
+    s, _wire = session("length")
+    assert requests(s, (Kind.HELLO, b'{"api_key": "k1"}', None)) == []
+    assert s.api_key == "k1"
+    with pytest.raises(FramingError):
+        requests(s, (Kind.HELLO, b"[]", None))
@@ -0,0 +1,118 @@
+# tests/test_singleflight.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm import cancel
+from llm.layers.singleflight import SingleFlightLayer
+
+from fakes import Echo, user
+
+
+def call(layer, prompt, token=None, results=None, key=None):
+    """Run layer.chat in a thread under `token`; the outcome goes to results[key]."""
+    def run():
+        try:
+            with cancel.scope(token):
+                results[key] = layer.chat(user(prompt)).text
+        except BaseException as e:
+            results[key] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_identical_requests_share_one_call():
+    inner = Echo(delay=0.2)
+    layer = SingleFlightLayer(inner, provider="t")
+    results = {}
+    threads = [call(layer, "a", results=results, key=i) for i in range(5)]
+    for t in threads:
+        t.join()
+    assert inner.calls == 1 and set(results.values()) == {"1:a"}
+    assert layer.stats() == {"calls": 1, "shared": 4, "in_flight": 0}
+
+
+def test_different_requests_are_not_coalesced():
+    inner = Echo()
+    layer = SingleFlightLayer(inner)
+    assert layer.chat(user("a")).text == "1:a"
+    assert layer.chat(user("b")).text == "2:b"
+
+
+def test_followers_get_their_own_copy_of_the_error():
+    inner = Echo(delay=0.2, error=ValueError("backend down"))
+    layer = SingleFlightLayer(inner)
+    results = {}
+    threads = [call(layer, "a", results=results, key=i) for i in range(3)]
+    for t in threads:
+        t.join()
+    errors = list(results.values())
+    assert all(isinstance(e, ValueError) and str(e) == "backend down" for e in errors)
+    assert len({id(e) for e in errors}) == 3
+
+
+def test_cancelled_follower_stops_waiting_at_once():
+    inner = Echo(delay=1.0)
+    layer = SingleFlightLayer(inner)
+    results, token = {}, cancel.CancelToken()
+    leader = call(layer, "a", results=results, key="leader")
+    inner.started.wait(1)
+    follower = call(layer, "a", token, results, "follower")
+    time.sleep(0.05)
+    t0 = time.monotonic()
+    token.cancel()
+    follower.join()
+    assert time.monotonic() - t0 < 0.5
+    assert isinstance(results["follower"], cancel.Cancelled)
+    leader.join()
+    assert results["leader"] == "1:a"  # the call went on for the leader
+
+
+def test_cancelled_leader_finishes_the_call_for_its_followers():
+    inner = Echo(delay=0.3)
+    layer = SingleFlightLayer(inner)
+    results, token = {}, cancel.CancelToken()
+    leader = call(layer, "a", token, results, "leader")
+    inner.started.wait(1)
+    follower = call(layer, "a", results=results, key="follower")
+    time.sleep(0.05)
+    token.cancel()
+    leader.join()
+    follower.join()
+    assert isinstance(results["leader"], cancel.Cancelled)
+    assert results["follower"] == "1:a"
+
+
+def test_request_after_everyone_cancelled_starts_a_new_call():
+    inner = Echo(delay=0.3)
+    layer = SingleFlightLayer(inner)
+    results, token = {}, cancel.CancelToken()
+    first = call(layer, "a", token, results, "first")
+    time.sleep(0.05)
+    token.cancel()                          # the only waiter: upstream call aborted
+    second = call(layer, "a", results=results, key="second")
+    first.join()
+    second.join()
+    assert isinstance(results["first"], cancel.Cancelled)
+    assert results["second"].endswith(":a")
+
+
+def test_async_coalescing_and_abandoned_call():
+    async def main():
+        inner = Echo(delay=0.2)
+        layer = SingleFlightLayer(inner)
+        replies = await asyncio.gather(*(layer.achat(user("a")) for _ in range(4)))
+        assert inner.calls == 1 and {r.text for r in replies} == {"1:a"}
+
+        lone = asyncio.ensure_future(layer.achat(user("b")))
+        await asyncio.sleep(0.05)
+        lone.cancel()                       # last waiter gone: upstream task cancelled
+        again = await layer.achat(user("b"))  # joins nothing, gets a reply
+        with pytest.raises(asyncio.CancelledError):
+            await lone
+        assert again.text.endswith(":b")
+
+    asyncio.run(main())